@@ -1,6 +1,29 @@
 import pandas as pd
 import sys
 import os
+import argparse
+from review_io import DEFAULT_STREAM_CHUNK_SIZE, ResultWriter, iter_table_chunks, read_table, write_table
+from pipeline_metrics import add_metrics_arguments, stage, start_run
+
+# Columns read from the raw review and item files, with the types they are parsed into
+REVIEW_DTYPES = {
+    'asin': 'category',
+    'name': object,
+    'rating': 'Int8',
+    'date': 'category',
+    'verified': 'boolean',
+    'title': object,
+    'body': object,
+    'helpfulVotes': 'Int32',
+}
+ITEM_DTYPES = {
+    'asin': object,
+    'brand': 'category',
+    'title': object,
+    'price': 'float64',
+    'image': object,
+}
+ASIN_MASTER_COLUMNS = ['asin', 'brand', 'product_title', 'price', 'image']
 
 
 def analyze_gift_sample(gift_file):
@@ -12,84 +35,113 @@ def analyze_gift_sample(gift_file):
     return gift_df.columns.tolist()
 
 
-def create_phone_csv(review_file, item_file, gift_columns, output_file):
-    # Read the review and item data
-    review_df = pd.read_csv(review_file)
-    item_df = pd.read_csv(item_file)
-
-    # Merge review data with item data
-    phone_df = pd.merge(review_df, item_df[['asin', 'title', 'brand', 'price']], on='asin', how='left')
-
-    # Rename columns to match giftsample.csv structure
-    column_mapping = {
-        'asin': 'product_id',
-        'name': 'customer_id',
-        'rating': 'star_rating',
-        'date': 'review_date',
-        'title_x': 'review_headline',
-        'body': 'review_body',
-        'helpfulVotes': 'helpful_votes',
-        'title_y': 'product_title'
-    }
-    phone_df = phone_df.rename(columns=column_mapping)
-
-    # Add missing columns
-    phone_df['marketplace'] = 'US'
-    phone_df['review_id'] = 'R' + phone_df.index.astype(str).str.zfill(10)
-    phone_df['product_category'] = 'Wireless'
-    phone_df['product_parent'] = phone_df['product_id']  # Using product_id as parent for simplicity
-    phone_df['total_votes'] = phone_df['helpful_votes']
-    phone_df['vine'] = 'N'
-    phone_df['verified_purchase'] = phone_df['verified'].map({True: 'Y', False: 'N'})
-
-    # Ensure all columns from gift_columns are present, add empty ones if missing
-    for col in gift_columns:
-        if col not in phone_df.columns:
-            phone_df[col] = ''
-
-    # Reorder columns to match giftsample.csv
-    phone_df = phone_df[gift_columns]
-
-    # Save to CSV
-    phone_df.to_csv(output_file, index=False)
-    print(f"\nCreated {output_file} with the structure matching {gift_file}")
-    print(f"\nSample data from {output_file}:")
-    print(phone_df.head())
-
-
-def create_asin_master(item_file, output_file):
-    item_df = pd.read_csv(item_file)
-    asin_master = item_df[['asin', 'brand', 'title', 'price', 'image']]
-    asin_master.columns = ['asin', 'brand', 'product_title', 'price', 'image']
-
-    # Save to CSV
-    asin_master.to_csv(output_file, index=False)
-    print(f"\nCreated {output_file} with columns: asin, brand, product_title, price, image")
+def load_items(item_file):
+    # Read once for both outputs; an asin listed twice would otherwise duplicate its reviews in the merge
+    item_df = read_table(item_file, columns=list(ITEM_DTYPES), dtype=ITEM_DTYPES)
+    item_df = item_df.dropna(subset=['asin']).drop_duplicates('asin').reset_index(drop=True)
+    print(f"Loaded {len(item_df)} unique items from {item_file}")
+    return item_df
+
+
+def format_dates(dates):
+    # Reviews share a few thousand distinct dates, so each distinct string is parsed only once
+    categories = dates.cat.categories
+    raw = pd.Series(categories.astype(object))
+    # Each string is parsed on its own format; anything still unparseable keeps its original text
+    parsed = pd.to_datetime(raw, format='mixed', errors='coerce').dt.strftime('%Y-%m-%d').fillna(raw)
+    return dates.map(pd.Series(parsed.to_numpy(), index=categories)).astype(object)
+
+
+def format_reviews(review_df, product_titles, first_row, gift_columns):
+    # Map each product's title through the categorical asin, so the lookup runs per product instead of per review
+    product_id = review_df['asin'].astype(object)
+    helpful_votes = review_df['helpfulVotes']
+    phone_df = pd.DataFrame({
+        'marketplace': 'US',
+        'customer_id': review_df['name'],
+        'review_id': [f'R{i:010d}' for i in range(first_row, first_row + len(review_df))],
+        'product_id': product_id,
+        'product_parent': product_id,  # Using product_id as parent for simplicity
+        'product_title': review_df['asin'].map(product_titles).astype(object),
+        'product_category': 'Wireless',
+        'star_rating': review_df['rating'],
+        'helpful_votes': helpful_votes,
+        'total_votes': helpful_votes,
+        'vine': 'N',
+        'verified_purchase': review_df['verified'].map({True: 'Y', False: 'N'}),
+        'review_headline': review_df['title'],
+        'review_body': review_df['body'],
+        'review_date': format_dates(review_df['date']),
+    }, index=review_df.index)
+
+    # Match giftsample.csv's column order, with any columns the raw data lacks left empty
+    return phone_df.reindex(columns=gift_columns, fill_value='')
+
+
+def create_phone_csv(review_file, item_df, gift_columns, output_file, chunk_size=DEFAULT_STREAM_CHUNK_SIZE):
+    product_titles = item_df.set_index('asin')['title']
+
+    # Reviews are converted a chunk at a time, so the review file never has to fit in memory
+    sample = None
+    with ResultWriter(output_file, gift_columns) as writer:
+        for review_df in iter_table_chunks(review_file, list(REVIEW_DTYPES), chunk_size, dtype=REVIEW_DTYPES):
+            phone_df = format_reviews(review_df, product_titles, writer.rows_written, gift_columns)
+            writer.write(phone_df)
+            if sample is None:
+                sample = phone_df.head()
+            print(f"Formatted {writer.rows_written} reviews")
+
+    print(f"\nCreated {output_file} with the structure matching giftsample.csv")
+    if sample is not None:
+        print(f"\nSample data from {output_file}:")
+        print(sample)
+    return writer.rows_written
+
+
+def create_asin_master(item_df, output_file):
+    asin_master = item_df.rename(columns={'title': 'product_title'})[ASIN_MASTER_COLUMNS]
+
+    # Save to CSV, Parquet or Arrow depending on the output extension
+    write_table(asin_master, output_file)
+    print(f"\nCreated {output_file} with columns: {', '.join(ASIN_MASTER_COLUMNS)}")
     print(f"\nSample data from {output_file}:")
     print(asin_master.head())
 
 
-def main(gift_file, review_file, item_file, phone_output, asin_output):
-    gift_columns = analyze_gift_sample(gift_file)
-    create_phone_csv(review_file, item_file, gift_columns, phone_output)
-    create_asin_master(item_file, asin_output)
+def parse_args():
+    parser = argparse.ArgumentParser(description="Convert raw phone review and item files to the giftsample.csv "
+                                                 "layout and build the ASIN master list.")
+    parser.add_argument('gift_file', help='giftsample.csv, whose columns the output follows')
+    parser.add_argument('review_file', help='Raw review file (CSV, Parquet or Arrow)')
+    parser.add_argument('item_file', help='Raw item file (CSV, Parquet or Arrow)')
+    parser.add_argument('phone_output', help='Formatted reviews to write')
+    parser.add_argument('asin_output', help='ASIN master list to write')
+    parser.add_argument('--chunk-size', type=int, default=DEFAULT_STREAM_CHUNK_SIZE,
+                        help='Reviews converted per chunk (default: %(default)s)')
+    add_metrics_arguments(parser)
+    return parser.parse_args()
 
 
-if __name__ == "__main__":
-    if len(sys.argv) != 6:
-        print("Usage: python script_name.py <gift_file> <review_file> <item_file> <phone_output> <asin_output>")
-        sys.exit(1)
-
-    gift_file = sys.argv[1]
-    review_file = sys.argv[2]
-    item_file = sys.argv[3]
-    phone_output = sys.argv[4]
-    asin_output = sys.argv[5]
+def main():
+    args = parse_args()
 
     # Check if input files exist
-    for file in [gift_file, review_file, item_file]:
+    for file in [args.gift_file, args.review_file, args.item_file]:
         if not os.path.isfile(file):
             print(f"Error: File '{file}' does not exist.")
             sys.exit(1)
 
-    main(gift_file, review_file, item_file, phone_output, asin_output)
\ No newline at end of file
+    with start_run('FormatReviewData', args):
+        gift_columns = analyze_gift_sample(args.gift_file)
+        with stage('items') as metrics:
+            item_df = load_items(args.item_file)
+            metrics['rows'] = len(item_df)
+        with stage('reviews') as metrics:
+            metrics['rows'] = create_phone_csv(args.review_file, item_df, gift_columns, args.phone_output,
+                                               args.chunk_size)
+        with stage('asin_master', rows=len(item_df)):
+            create_asin_master(item_df, args.asin_output)
+
+
+if __name__ == "__main__":
+    main()
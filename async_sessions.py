@@ -0,0 +1,47 @@
+import asyncio
+from contextlib import asynccontextmanager
+
+# Set by keep_sessions_warm(): one event loop per process that every LLM request runs on, so the HTTP clients
+# opened on it (and their pooled connections) are reused by later runs instead of being set up again
+_loop = None
+_clients = {}
+
+
+def keep_sessions_warm():
+    global _loop
+    if _loop is None:
+        _loop = asyncio.new_event_loop()
+
+
+def run_async(coro):
+    if _loop is None:
+        return asyncio.run(coro)
+    return _loop.run_until_complete(coro)
+
+
+@asynccontextmanager
+async def client_session(key, open_client):
+    # open_client is an async function returning an open client with an async close(). Without warm sessions the
+    # client only lives for the block; with them it is kept under key for the rest of the process
+    if _loop is None:
+        client = await open_client()
+        try:
+            yield client
+        finally:
+            await client.close()
+        return
+
+    if key not in _clients:
+        _clients[key] = await open_client()
+    yield _clients[key]
+
+
+def close_sessions():
+    global _loop
+    if _loop is None:
+        return
+    for client in _clients.values():
+        _loop.run_until_complete(client.close())
+    _clients.clear()
+    _loop.close()
+    _loop = None
@@ -0,0 +1,250 @@
+import argparse
+import importlib
+import json
+import multiprocessing
+import os
+import queue
+import time
+from datetime import datetime
+
+from async_sessions import close_sessions, keep_sessions_warm
+from pipeline_metrics import DEFAULT_REPORT_DIR
+from review_io import args_from_options
+from text_preprocessing import ensure_nltk_resources, warm_up
+
+# Analysis name -> module whose build_parser/check_args/run it is driven through
+ANALYSES = {
+    'clustering': 'datacleaning',
+    'lda': 'lda_topic_modeling',
+    'ollama': 'ollama_topic_modeling',
+    'openai': 'openai_aspect_modeling_script',
+    'gauges': 'product_dial_guages',
+}
+
+# Gauges are drawn from the topic_name column written by these analyses
+TOPIC_ANALYSES = ['lda', 'ollama']
+
+# Analyses that preprocess review text, and so benefit from a warm tagger and lemmatizer
+TEXT_ANALYSES = ['clustering', 'lda', 'ollama', 'openai']
+
+# Options that would let two datasets of the same run overwrite each other's files, made per dataset
+DATASET_OPTIONS = {
+    'clustering': lambda name: {'model_dir': os.path.join('clustering_models', name)},
+    'lda': lambda name: {'model_path': f'lda_model_{name}.joblib'},
+    'gauges': lambda name: {'output_dir': os.path.join('gauges', name)},
+}
+
+
+def load_manifest(path):
+    # {"defaults": {"common": {...}, "lda": {...}},
+    #  "datasets": [{"input": "wireless.tsv", "name": "wireless", "analyses": ["lda", "gauges"],
+    #                "options": {"lda": {"max_iter": 20}}}]}
+    with open(path) as f:
+        manifest = json.load(f)
+
+    datasets = manifest.get('datasets') or []
+    if not datasets:
+        raise ValueError(f"{path} lists no datasets")
+
+    names = set()
+    for dataset in datasets:
+        if 'input' not in dataset:
+            raise ValueError(f"Dataset without an input file: {dataset}")
+        dataset.setdefault('name', os.path.splitext(os.path.basename(dataset['input']))[0])
+        if dataset['name'] in names:
+            raise ValueError(f"Two datasets are named {dataset['name']}; give them distinct names")
+        names.add(dataset['name'])
+
+        analyses = dataset.get('analyses') or []
+        for i, analysis in enumerate(analyses):
+            if analysis not in ANALYSES:
+                raise ValueError(f"Unknown analysis '{analysis}' for {dataset['name']}; "
+                                 f"choose from {', '.join(ANALYSES)}")
+            if analysis == 'gauges' and not any(earlier in TOPIC_ANALYSES for earlier in analyses[:i]):
+                raise ValueError(f"gauges for {dataset['name']} need one of {', '.join(TOPIC_ANALYSES)} before it")
+        if not analyses:
+            raise ValueError(f"No analyses given for {dataset['name']}")
+
+    return manifest.get('defaults', {}), datasets
+
+
+def analysis_options(analysis, parser, dataset, defaults, report_dir, single_threaded):
+    known = vars(parser.parse_args([dataset['input']]))
+    options = {'run_report_dir': os.path.join(report_dir, dataset['name'])}
+    if single_threaded:
+        # Datasets already run in parallel, so each one keeps to a single core
+        options.update(workers=1, n_jobs=1)
+    if analysis in DATASET_OPTIONS:
+        options.update(DATASET_OPTIONS[analysis](dataset['name']))
+    if analysis == 'gauges':
+        options['all'] = True
+    # Common options only apply to the analyses that have them
+    options.update(defaults.get('common', {}))
+    options.update(dataset.get('options', {}).get('common', {}))
+    options = {key: value for key, value in options.items() if key in known}
+
+    options.update(defaults.get(analysis, {}))
+    options.update(dataset.get('options', {}).get(analysis, {}))
+    return options
+
+
+def run_analysis(module, input_filename, options):
+    parser = module.build_parser()
+    return module.run(module.check_args(parser, args_from_options(parser, input_filename, options)))
+
+
+def run_dataset(dataset, defaults, report_dir, single_threaded):
+    # Runs the dataset's analyses in order; a failed analysis is recorded and the rest still run
+    results = []
+    topic_results = None
+    for analysis in dataset['analyses']:
+        input_filename = topic_results if analysis == 'gauges' else dataset['input']
+        record = {'analysis': analysis, 'input': input_filename, 'output': None, 'status': 'ok', 'error': None}
+        start_time = time.perf_counter()
+        try:
+            if input_filename is None:
+                raise ValueError("No topic results to draw gauges from")
+            module = importlib.import_module(ANALYSES[analysis])
+            options = analysis_options(analysis, module.build_parser(), dataset, defaults, report_dir,
+                                       single_threaded)
+            # Gauges return the number of products rendered, the other analyses their results file
+            output = run_analysis(module, input_filename, options)
+            record['output'] = output
+            if not output:
+                record['status'] = 'failed'
+            elif analysis in TOPIC_ANALYSES:
+                topic_results = output
+        except (Exception, SystemExit) as e:
+            # argparse and the scripts report fatal errors with sys.exit
+            record['status'] = 'failed'
+            record['error'] = f"{type(e).__name__}: {e}"
+        record['seconds'] = time.perf_counter() - start_time
+        results.append(record)
+    return {'dataset': dataset['name'], 'pid': os.getpid(), 'analyses': results}
+
+
+def _uses_text(datasets):
+    return any(analysis in TEXT_ANALYSES for dataset in datasets for analysis in dataset['analyses'])
+
+
+def _warm_process(datasets):
+    # The tagger, lemmatizer and HTTP sessions are loaded once per process and shared by all of its datasets
+    if _uses_text(datasets):
+        warm_up()
+    keep_sessions_warm()
+
+
+def _worker(task_queue, result_queue, datasets, defaults, report_dir, single_threaded):
+    _warm_process(datasets)
+    try:
+        for index in iter(task_queue.get, None):
+            result_queue.put(run_dataset(datasets[index], defaults, report_dir, single_threaded))
+    finally:
+        close_sessions()
+
+
+def schedule(datasets):
+    # Largest inputs first, so a big dataset is not left running alone at the end
+    def size(index):
+        path = datasets[index]['input']
+        return os.path.getsize(path) if os.path.exists(path) else 0
+    return sorted(range(len(datasets)), key=size, reverse=True)
+
+
+def run_batch(datasets, defaults, jobs, report_dir):
+    if _uses_text(datasets):
+        # Checked here so the workers don't all race to download missing NLTK data
+        ensure_nltk_resources()
+    order = schedule(datasets)
+
+    if jobs == 1:
+        _warm_process(datasets)
+        try:
+            return [run_dataset(datasets[index], defaults, report_dir, False) for index in order]
+        finally:
+            close_sessions()
+
+    # Plain (non-daemon) processes, so an analysis can still start its own pool if a dataset asks for workers
+    task_queue = multiprocessing.Queue()
+    result_queue = multiprocessing.Queue()
+    for index in order:
+        task_queue.put(index)
+    for _ in range(jobs):
+        task_queue.put(None)
+
+    workers = [multiprocessing.Process(target=_worker,
+                                       args=(task_queue, result_queue, datasets, defaults, report_dir, True))
+               for _ in range(jobs)]
+    for worker in workers:
+        worker.start()
+
+    results = []
+    while len(results) < len(datasets):
+        try:
+            result = result_queue.get(timeout=5)
+        except queue.Empty:
+            # A worker that died outright never reports back, so stop waiting once none are left
+            if not any(worker.is_alive() for worker in workers):
+                print(f"Worker processes exited with {len(datasets) - len(results)} datasets unfinished")
+                break
+            continue
+        print(f"Finished {result['dataset']} ({len(results) + 1}/{len(datasets)})")
+        results.append(result)
+    for worker in workers:
+        worker.join()
+    return results
+
+
+def print_results(results):
+    print(f"\n{'dataset':<20}{'analysis':<12}{'status':<8}{'seconds':>9}  output")
+    for result in results:
+        for record in result['analyses']:
+            detail = record['error'] or record['output']
+            print(f"{result['dataset']:<20}{record['analysis']:<12}{record['status']:<8}{record['seconds']:>9.1f}  "
+                  f"{'' if detail is None else detail}")
+
+
+def write_results(results, report_dir):
+    os.makedirs(report_dir, exist_ok=True)
+    path = os.path.join(report_dir, f"batch_driver_{datetime.now().strftime('%Y%m%d_%H%M%S')}.json")
+    with open(path, 'w') as f:
+        json.dump(results, f, indent=2, default=str)
+    print(f"Saved batch results to {path}")
+    return path
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(description="Run the review analyses for many datasets in warm processes.")
+    parser.add_argument('manifest', help='JSON manifest of datasets and the analyses to run on each')
+    parser.add_argument('--jobs', type=int, default=None,
+                        help='Datasets processed at once (default: number of CPUs, at most one per dataset)')
+    parser.add_argument('--run-report-dir', default=DEFAULT_REPORT_DIR,
+                        help='Directory for the per-dataset run reports and the batch results (default: %(default)s)')
+    return parser
+
+
+def main(argv=None):
+    parser = build_parser()
+    args = parser.parse_args(argv)
+    try:
+        defaults, datasets = load_manifest(args.manifest)
+    except (OSError, ValueError) as e:
+        parser.error(str(e))
+
+    jobs = max(1, min(args.jobs or multiprocessing.cpu_count(), len(datasets)))
+    print(f"Running {len(datasets)} datasets with {jobs} worker process{'es' if jobs > 1 else ''}")
+
+    start_time = time.perf_counter()
+    results = run_batch(datasets, defaults, jobs, args.run_report_dir)
+    print_results(results)
+    write_results(results, args.run_report_dir)
+    print(f"\nTotal execution time: {time.perf_counter() - start_time:.2f} seconds")
+
+    failed = sum(record['status'] != 'ok' for result in results for record in result['analyses'])
+    if failed:
+        print(f"{failed} analyses failed")
+        raise SystemExit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,107 @@
+import argparse
+import json
+import time
+import tracemalloc
+
+from sklearn.cluster import MiniBatchKMeans
+from sklearn.feature_extraction.text import TfidfVectorizer
+
+from cluster_naming import NAMING_METHODS, name_clusters
+from review_io import load_reviews
+from text_preprocessing import ADJECTIVES, add_preprocessing_arguments, open_cache, preprocess_series
+
+NUM_CLUSTERS = 10
+
+
+def cluster_coverage(texts, clusters, cluster_names):
+    # Share of each cluster's reviews that contain at least one word of its name, averaged over clusters
+    coverages = []
+    for cluster, name in cluster_names.items():
+        name_words = set(name.split())
+        cluster_texts = [text for text, c in zip(texts, clusters) if c == cluster]
+        if cluster_texts:
+            covered = sum(1 for text in cluster_texts if name_words & set(text.split()))
+            coverages.append(covered / len(cluster_texts))
+    return sum(coverages) / len(coverages) if coverages else 0.0
+
+
+def name_agreement(names, reference_names):
+    # Mean Jaccard overlap of the name words with the reference method's names
+    scores = []
+    for cluster, name in names.items():
+        words, reference = set(name.split()), set(reference_names.get(cluster, '').split())
+        scores.append(len(words & reference) / len(words | reference) if words | reference else 1.0)
+    return sum(scores) / len(scores) if scores else 0.0
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Compare the runtime and output of the cluster naming methods.")
+    parser.add_argument('input_filename', help='Input review file (TSV, CSV, Parquet or Arrow)')
+    parser.add_argument('--methods', nargs='+', choices=NAMING_METHODS, default=['word2vec', 'cooccurrence'],
+                        help='Naming methods to compare (default: %(default)s)')
+    parser.add_argument('--pretrained-vectors', default=None, help='Vectors file for the pretrained method')
+    parser.add_argument('--reference', choices=NAMING_METHODS, default='word2vec',
+                        help='Method the others are compared against (default: %(default)s)')
+    parser.add_argument('--output', default=None, help='Also write the results to this JSON file')
+    add_preprocessing_arguments(parser)
+    args = parser.parse_args()
+    if 'pretrained' in args.methods and not args.pretrained_vectors:
+        parser.error('the pretrained method needs --pretrained-vectors')
+    return args
+
+
+def main():
+    args = parse_args()
+
+    print("Loading and preprocessing data...")
+    df = load_reviews(args.input_filename)
+    with open_cache(args) as cache:
+        texts = preprocess_series(df['review_body'], ADJECTIVES, workers=args.workers, chunk_size=args.chunk_size,
+                                  cache=cache)
+
+    # Same model setup as datacleaning.py, fitted once and shared by every method
+    print("Fitting TF-IDF and clusters...")
+    tfidf_model = TfidfVectorizer(max_df=0.99, max_features=1000, min_df=0.01, stop_words='english', use_idf=True,
+                                  ngram_range=(1, 1))
+    tfidf_matrix = tfidf_model.fit_transform(texts)
+    km = MiniBatchKMeans(n_clusters=NUM_CLUSTERS, random_state=42, batch_size=1000)
+    clusters = km.fit_predict(tfidf_matrix)
+    feature_names = tfidf_model.get_feature_names_out()
+    texts = texts.tolist()
+
+    results = {}
+    for method in args.methods:
+        print(f"Naming clusters with {method}...")
+        tracemalloc.start()
+        start_time = time.perf_counter()
+        cluster_names, _ = name_clusters(method, km, feature_names, tfidf_matrix=tfidf_matrix, texts=texts,
+                                         vectors_path=args.pretrained_vectors, workers=args.workers)
+        elapsed = time.perf_counter() - start_time
+        peak_mb = tracemalloc.get_traced_memory()[1] / 1024 ** 2
+        tracemalloc.stop()
+        results[method] = {'seconds': elapsed, 'peak_mb': peak_mb,
+                           'coverage': cluster_coverage(texts, clusters, cluster_names),
+                           'names': cluster_names}
+
+    reference = results.get(args.reference)
+    print(f"\n{'method':<14}{'seconds':>10}{'peak MB':>10}{'coverage':>10}{'agreement':>11}")
+    for method, result in results.items():
+        if reference is not None:
+            result['agreement'] = name_agreement(result['names'], reference['names'])
+        agreement = f"{result['agreement']:.2f}" if 'agreement' in result else '-'
+        print(f"{method:<14}{result['seconds']:>10.2f}{result['peak_mb']:>10.1f}{result['coverage']:>10.2f}"
+              f"{agreement:>11}")
+
+    for method, result in results.items():
+        print(f"\n{method} names:")
+        for cluster, name in result['names'].items():
+            print(f"  {cluster}: {name}")
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump({'input': args.input_filename, 'n_reviews': len(texts), 'results': results}, f, indent=2)
+        print(f"\nSaved results to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,201 @@
+import argparse
+import glob
+import json
+import os
+import platform
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime
+
+import pandas as pd
+
+from pipeline_metrics import RunMetrics
+from synthetic_reviews import load_products, parse_rows, write_format_inputs, write_reviews
+
+BENCHMARK_DIR = 'benchmarks'
+DEFAULT_RESULTS_FILE = os.path.join(BENCHMARK_DIR, 'results.jsonl')
+DEFAULT_DATA_DIR = os.path.join(BENCHMARK_DIR, 'data')
+STEPS = ['datacleaning', 'lda', 'keywords', 'format', 'gauges']
+
+# Keyword lists shaped like the aspects the LLM scripts return
+BENCHMARK_KEYWORDS = [['battery', 'charge', 'charger', 'power', 'life'], ['screen', 'display', 'bright', 'dim'],
+                      ['camera', 'photo', 'picture'], ['signal', 'call', 'reception'], ['price', 'money', 'cheap'],
+                      ['sound', 'speaker', 'noisy', 'loud'], ['case', 'design', 'color', 'sturdy', 'flimsy'],
+                      ['delivery', 'packaging', 'shipping'], ['software', 'slow', 'fast'], ['gift', 'card']]
+
+
+def git_revision():
+    try:
+        commit = subprocess.run(['git', 'rev-parse', 'HEAD'], capture_output=True, text=True, check=True).stdout
+        status = subprocess.run(['git', 'status', '--porcelain', '--untracked-files=no'], capture_output=True,
+                                text=True, check=True).stdout
+    except (OSError, subprocess.CalledProcessError):
+        return None, None
+    return commit.strip(), bool(status.strip())
+
+
+def dataset_paths(data_dir, rows, seed):
+    base = os.path.join(data_dir, f'reviews_{rows}_{seed}')
+    return {'reviews': f'{base}.tsv', 'raw_reviews': f'{base}_raw.csv', 'items': f'{base}_items.csv'}
+
+
+def ensure_dataset(data_dir, rows, seed, asin_master):
+    # Generated once per size and seed, then reused by every later benchmark run
+    os.makedirs(data_dir, exist_ok=True)
+    paths = dataset_paths(data_dir, rows, seed)
+    if not all(os.path.exists(path) for path in paths.values()):
+        products = load_products(asin_master)
+        write_reviews(paths['reviews'], rows, products, seed=seed)
+        write_format_inputs(paths['raw_reviews'], paths['items'], rows, products, seed=seed)
+    return paths
+
+
+def run_script(command, work_dir):
+    # Each script runs in a fresh interpreter, as it does in production; stage metrics come from its run report
+    report_dir = os.path.join(work_dir, 'run_reports')
+    children_before = resource.getrusage(resource.RUSAGE_CHILDREN)
+    start_time = time.perf_counter()
+    completed = subprocess.run([sys.executable] + command + ['--run-report-dir', report_dir], cwd=work_dir,
+                               capture_output=True, text=True)
+    wall = time.perf_counter() - start_time
+    children_after = resource.getrusage(resource.RUSAGE_CHILDREN)
+
+    result = {'command': command, 'returncode': completed.returncode, 'wall_seconds': wall,
+              'cpu_seconds': (children_after.ru_utime + children_after.ru_stime)
+              - (children_before.ru_utime + children_before.ru_stime),
+              'stages': []}
+    reports = sorted(glob.glob(os.path.join(report_dir, '*.json')), key=os.path.getmtime)
+    if reports:
+        with open(reports[-1]) as f:
+            result['stages'] = json.load(f)['stages']
+        os.remove(reports[-1])
+    if completed.returncode != 0:
+        result['error'] = completed.stderr[-2000:]
+    return result
+
+
+def benchmark_keywords(reviews_file):
+    # In-process: the vectorized keyword matrix and argmax used by the LLM scripts
+    from keyword_assignment import best_keyword_match
+
+    texts = pd.read_csv(reviews_file, sep='\t', usecols=['review_body'])['review_body'].str.lower()
+    metrics = RunMetrics('benchmark_keywords', save_report=False)
+    with metrics.stage('assign', rows=len(texts)):
+        best_keyword_match(texts, BENCHMARK_KEYWORDS)
+    return {'command': ['keyword_assignment.best_keyword_match'], 'returncode': 0,
+            'wall_seconds': metrics.stages[0]['wall_seconds'], 'stages': metrics.stages}
+
+
+def run_step(step, paths, work_dir, repo_dir):
+    def script(name):
+        return os.path.join(repo_dir, name)
+
+    # The scripts name their outputs after the input path, so they are given a link in the work directory
+    reviews = 'reviews.tsv'
+    if not os.path.exists(os.path.join(work_dir, reviews)):
+        os.symlink(os.path.abspath(paths['reviews']), os.path.join(work_dir, reviews))
+
+    if step == 'datacleaning':
+        return run_script([script('datacleaning.py'), reviews, '--no-cache', '--model-dir', 'models'], work_dir)
+    if step == 'lda':
+        return run_script([script('lda_topic_modeling.py'), reviews, '--no-cache', '--model-path', 'lda.joblib'],
+                          work_dir)
+    if step == 'keywords':
+        return benchmark_keywords(paths['reviews'])
+    if step == 'format':
+        return run_script([script('FormatReviewData.py'), script('giftsample.csv'),
+                           os.path.abspath(paths['raw_reviews']), os.path.abspath(paths['items']),
+                           'formatted_reviews.csv', 'asin_master.csv'], work_dir)
+    if step == 'gauges':
+        # Needs the topic results written by the lda step in the same work directory
+        results = 'topic_modeling_results_reviews.csv'
+        if not os.path.exists(os.path.join(work_dir, results)):
+            lda = run_script([script('lda_topic_modeling.py'), reviews, '--no-cache', '--no-run-report',
+                              '--model-path', 'lda.joblib'], work_dir)
+            if lda['returncode'] != 0:
+                return lda
+        return run_script([script('product_dial_guages.py'), results, '--all', '--format', 'json',
+                           '--rebuild-index'], work_dir)
+    raise ValueError(f"Unknown benchmark step: {step}")
+
+
+def load_results(results_file):
+    if not os.path.exists(results_file):
+        return []
+    with open(results_file) as f:
+        return [json.loads(line) for line in f if line.strip()]
+
+
+def previous_result(history, record):
+    # The latest result for the same step and size measured at a different commit
+    for old in reversed(history):
+        if old['step'] == record['step'] and old['rows'] == record['rows'] and old['commit'] != record['commit']:
+            return old
+    return None
+
+
+def print_result(record, baseline):
+    change = ''
+    if baseline is not None and baseline['wall_seconds']:
+        ratio = record['wall_seconds'] / baseline['wall_seconds']
+        change = f" ({ratio:.2f}x vs {str(baseline['commit'])[:8]})"
+    status = 'ok' if record['returncode'] == 0 else 'FAILED'
+    print(f"{record['step']:<14}{record['rows']:>10}{record['wall_seconds']:>10.2f}s {status}{change}")
+    for stage in record['stages']:
+        rate = f"{stage['rows_per_second']:.0f} rows/s" if stage.get('rows_per_second') else ''
+        peak = f"{stage['peak_rss_mb']:.1f}" if stage.get('peak_rss_mb') is not None else '-'
+        print(f"    {stage['stage']:<12}{stage['wall_seconds']:>10.2f}s {peak:>9} MB  {rate}")
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Benchmark the review pipeline on synthetic data.")
+    parser.add_argument('--scales', nargs='+', type=parse_rows, default=[10000],
+                        help='Dataset sizes to benchmark, e.g. 10k 1m 10m (default: 10k)')
+    parser.add_argument('--steps', nargs='+', choices=STEPS, default=STEPS, help='Steps to run (default: all)')
+    parser.add_argument('--seed', type=int, default=42, help='Seed for the synthetic data (default: %(default)s)')
+    parser.add_argument('--asin-master', default=os.path.join('productmanager', 'asinmaster.csv'),
+                        help='Products to generate reviews for (default: %(default)s)')
+    parser.add_argument('--data-dir', default=DEFAULT_DATA_DIR,
+                        help='Where generated datasets are kept (default: %(default)s)')
+    parser.add_argument('--results-file', default=DEFAULT_RESULTS_FILE,
+                        help='JSON lines file the results are appended to (default: %(default)s)')
+    return parser.parse_args()
+
+
+def main():
+    args = parse_args()
+    repo_dir = os.path.dirname(os.path.abspath(__file__))
+    commit, dirty = git_revision()
+    history = load_results(args.results_file)
+    os.makedirs(os.path.dirname(args.results_file) or '.', exist_ok=True)
+
+    print(f"Benchmarking commit {commit or 'unknown'}{' (with local changes)' if dirty else ''}")
+    failed = 0
+    for rows in args.scales:
+        paths = ensure_dataset(args.data_dir, rows, args.seed, args.asin_master)
+        with tempfile.TemporaryDirectory(prefix='benchmark_') as work_dir:
+            for step in args.steps:
+                result = run_step(step, paths, work_dir, repo_dir)
+                record = {'commit': commit, 'dirty': dirty, 'timestamp': datetime.now().isoformat(timespec='seconds'),
+                          'step': step, 'rows': rows, 'seed': args.seed, 'python': platform.python_version(),
+                          'platform': platform.platform(), 'cpu_count': os.cpu_count(), **result}
+                print_result(record, previous_result(history, record))
+                if result['returncode'] != 0:
+                    failed += 1
+                    print(result.get('error', ''))
+
+                with open(args.results_file, 'a') as f:
+                    f.write(json.dumps(record, default=str) + '\n')
+                history.append(record)
+
+    print(f"\nResults appended to {args.results_file}")
+    if failed:
+        print(f"{failed} steps failed")
+        raise SystemExit(1)
+
+
+if __name__ == "__main__":
+    main()
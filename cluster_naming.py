@@ -0,0 +1,96 @@
+import multiprocessing
+
+import numpy as np
+
+NAMING_METHODS = ['cooccurrence', 'word2vec', 'pretrained']
+N_NAME_WORDS = 5
+
+
+def top_cluster_features(km, feature_names, n_terms=N_NAME_WORDS):
+    # Hashed features that no seen term maps to have an empty name and are skipped
+    return [[feature_names[j] for j in center.argsort()[::-1] if feature_names[j]][:n_terms]
+            for center in km.cluster_centers_]
+
+
+def combine_cluster_name(top_features, neighbours, n_words=N_NAME_WORDS):
+    # Each top term followed by its nearest neighbour, so the name mixes both
+    words = []
+    for word in top_features:
+        for candidate in (word, neighbours.get(word)):
+            if candidate and candidate not in words:
+                words.append(candidate)
+    return ' '.join(words[:n_words])
+
+
+def cooccurrence_neighbours(words, tfidf_matrix, feature_names):
+    # Cosine similarity between term columns of the TF-IDF matrix, only for the handful of query terms
+    index = {name: i for i, name in enumerate(feature_names)}
+    query = [index[word] for word in dict.fromkeys(words) if word in index]
+    if not query:
+        return {}
+
+    matrix = tfidf_matrix.tocsc()
+    similarity = (matrix[:, query].T @ matrix).toarray()
+    norms = np.sqrt(matrix.multiply(matrix).sum(axis=0)).A1
+    norms[norms == 0] = 1
+    similarity /= norms[query][:, None] * norms[None, :]
+    similarity[np.arange(len(query)), query] = -1
+
+    best = similarity.argmax(axis=1)
+    return {feature_names[term]: feature_names[neighbour]
+            for row, (term, neighbour) in enumerate(zip(query, best)) if similarity[row, neighbour] > 0}
+
+
+def train_word2vec(texts, workers=None):
+    from gensim.models import Word2Vec
+    all_words = [text.split() for text in texts if text]
+    return Word2Vec(all_words, vector_size=100, window=5, min_count=1, workers=workers or multiprocessing.cpu_count())
+
+
+def vector_neighbours(words, word_vectors):
+    neighbours = {}
+    for word in dict.fromkeys(words):
+        if word in word_vectors.key_to_index:
+            neighbours[word] = word_vectors.most_similar(word, topn=1)[0][0]
+    return neighbours
+
+
+def load_pretrained_vectors(vectors_path):
+    from gensim.models import KeyedVectors
+    # Vectors saved with KeyedVectors.save are memory-mapped; word2vec text/binary files have to be read in
+    if vectors_path.endswith(('.bin', '.txt', '.vec')):
+        return KeyedVectors.load_word2vec_format(vectors_path, binary=vectors_path.endswith('.bin'))
+    return KeyedVectors.load(vectors_path, mmap='r')
+
+
+def name_clusters(method, km, feature_names, tfidf_matrix=None, texts=None, vectors_path=None, workers=None):
+    # Returns the cluster names and, for word2vec, the model that was trained for them
+    top_features = top_cluster_features(km, feature_names)
+    query = [word for features in top_features for word in features]
+
+    word2vec_model = None
+    if method == 'cooccurrence':
+        neighbours = cooccurrence_neighbours(query, tfidf_matrix, feature_names)
+    elif method == 'word2vec':
+        word2vec_model = train_word2vec(texts, workers)
+        neighbours = vector_neighbours(query, word2vec_model.wv)
+    elif method == 'pretrained':
+        neighbours = vector_neighbours(query, load_pretrained_vectors(vectors_path))
+    else:
+        raise ValueError(f"Unknown naming method: {method}")
+
+    cluster_names = {i: combine_cluster_name(features, neighbours) for i, features in enumerate(top_features)}
+    return cluster_names, word2vec_model
+
+
+def add_naming_arguments(parser):
+    parser.add_argument('--naming', choices=NAMING_METHODS, default='cooccurrence',
+                        help='How neighbours of the top cluster terms are found: co-occurrence in the TF-IDF matrix, '
+                             'a Word2Vec model trained on the reviews, or pre-trained vectors (default: %(default)s)')
+    parser.add_argument('--pretrained-vectors', default=None,
+                        help='KeyedVectors file (memory-mapped) or word2vec .bin/.txt file for --naming pretrained')
+
+
+def check_naming_arguments(parser, args):
+    if args.naming == 'pretrained' and not args.pretrained_vectors:
+        parser.error('--naming pretrained needs --pretrained-vectors')
@@ -1,125 +1,333 @@
 import sys
 import os
+import json
 import time
-import pandas as pd
-from sklearn.feature_extraction.text import TfidfVectorizer
-from sklearn.cluster import MiniBatchKMeans
-from sklearn.decomposition import LatentDirichletAllocation
-import nltk
-from nltk.stem import WordNetLemmatizer
+import argparse
 import numpy as np
-from gensim.models import Word2Vec
 import multiprocessing
-from functools import partial
+from text_preprocessing import (ADJECTIVES, DEFAULT_CHUNK_SIZE, PREPROCESSING_VERSION, add_preprocessing_arguments,
+                                open_cache, preprocess_batch, preprocess_series)
+from review_io import (ResultWriter, add_output_format_argument, add_streaming_arguments, args_from_options,
+                       iter_review_chunks, load_reviews, write_table)
+from vectorization import HashedTermIndex, add_vectorizer_arguments, make_hashing_vectorizer, matrix_dtype
+from pipeline_metrics import add_metrics_arguments, stage, start_run
+from cluster_naming import add_naming_arguments, check_naming_arguments, name_clusters
 
-# Download necessary NLTK data
-nltk.download('punkt', quiet=True)
-nltk.download('averaged_perceptron_tagger', quiet=True)
-nltk.download('wordnet', quiet=True)
-
-# Initialize lemmatizer
-lemmatizer = WordNetLemmatizer()
+OUTPUT_COLUMNS = ['review_body', 'star_rating', 'product_id', 'product_title', 'cluster', 'cluster_name']
+NUM_CLUSTERS = 10
+DEFAULT_MODEL_DIR = 'clustering_models'
 
 
 def extract_adjectives(text):
-    if pd.isna(text):
-        return ""
-    words = nltk.word_tokenize(str(text).lower())
-    tagged_words = nltk.pos_tag(words)
-    adjectives = [lemmatizer.lemmatize(word) for word, tag in tagged_words if tag.startswith('JJ')]
-    return ' '.join(adjectives)
+    return preprocess_batch([text], ADJECTIVES)[0]
+
+
+_worker_models = None
+
+
+def _load_worker_models(version_dir):
+    global _worker_models
+    _worker_models = load_models(version_dir)
+
+
+def predict_clusters(processed_text, tfidf_model, km):
+    return km.predict(tfidf_model.transform(processed_text))
+
+
+def _predict_chunk(processed_text):
+    return predict_clusters(processed_text, *_worker_models)
+
+
+def assign_in_parallel(processed_text, version_dir, tfidf_model, km, workers=None, chunk_size=DEFAULT_CHUNK_SIZE):
+    # Assign clusters for each chunk of reviews in a separate process; every worker loads the models from the
+    # version directory once instead of having them pickled into each task
+    texts = list(processed_text)
+    chunks = [texts[start:start + chunk_size] for start in range(0, len(texts), chunk_size)]
+    workers = min(workers or multiprocessing.cpu_count(), len(chunks))
+    if workers <= 1:
+        return predict_clusters(texts, tfidf_model, km)
+    with multiprocessing.Pool(workers, initializer=_load_worker_models, initargs=(version_dir,)) as pool:
+        return np.concatenate(pool.map(_predict_chunk, chunks))
+
+
+def top_term_cluster_names(km, feature_names, n_terms=5):
+    cluster_names = {}
+    for i, cluster_center in enumerate(km.cluster_centers_):
+        top_features = [feature_names[j] for j in cluster_center.argsort()[::-1] if feature_names[j]]
+        cluster_names[i] = ' '.join(top_features[:n_terms])
+    return cluster_names
+
 
+def save_artifacts(model_dir, tfidf_model, km, cluster_names, n_reviews, word2vec_model=None):
+    import joblib
 
-def process_chunk(chunk, tfidf_model, km):
-    chunk = chunk.copy()
-    chunk['processed_text'] = chunk['review_body'].apply(extract_adjectives)
-    tfidf_matrix = tfidf_model.transform(chunk['processed_text'])
-    chunk['cluster'] = km.predict(tfidf_matrix)
-    return chunk[['review_body', 'star_rating', 'product_id', 'product_title', 'cluster', 'processed_text']]
+    # Each fit gets its own version directory; LATEST is only switched once everything is written. Creating the
+    # directory fails if it exists, so two fits in the same second get distinct versions instead of sharing one
+    os.makedirs(model_dir, exist_ok=True)
+    timestamp = time.strftime('%Y%m%d-%H%M%S')
+    version, attempt = timestamp, 1
+    while True:
+        version_dir = os.path.join(model_dir, version)
+        try:
+            os.mkdir(version_dir)
+            break
+        except FileExistsError:
+            attempt += 1
+            version = f'{timestamp}-{attempt}'
 
+    joblib.dump(tfidf_model, os.path.join(version_dir, 'tfidf.joblib'))
+    joblib.dump(km, os.path.join(version_dir, 'kmeans.joblib'))
+    if word2vec_model is not None:
+        # Store the vectors as separate .npy files so they can be memory-mapped on load
+        word2vec_model.wv.save(os.path.join(version_dir, 'word2vec.kv'), sep_limit=0)
+    with open(os.path.join(version_dir, 'cluster_names.json'), 'w') as f:
+        json.dump({str(cluster): name for cluster, name in cluster_names.items()}, f, indent=2)
+    with open(os.path.join(version_dir, 'metadata.json'), 'w') as f:
+        json.dump({'version': version, 'n_reviews': n_reviews, 'n_clusters': km.n_clusters,
+                   'preprocessing_version': PREPROCESSING_VERSION, 'created_at': time.time()}, f, indent=2)
 
-def main():
-    # Get the input filename from the user
-    input_filename = input("Please enter the name of your input TSV file (including .tsv extension): ")
+    with open(os.path.join(model_dir, 'LATEST.tmp'), 'w') as f:
+        f.write(version)
+    os.replace(os.path.join(model_dir, 'LATEST.tmp'), os.path.join(model_dir, 'LATEST'))
+    print(f"Saved clustering model version {version} to {version_dir}")
+    return version_dir
 
-    # Start overall timing
-    overall_start_time = time.time()
+
+def resolve_model_version(model_dir, version=None):
+    if version is None:
+        latest_path = os.path.join(model_dir, 'LATEST')
+        if not os.path.exists(latest_path):
+            sys.exit(f"No saved clustering model in {model_dir}; run once without --score to create it.")
+        with open(latest_path) as f:
+            version = f.read().strip()
+    version_dir = os.path.join(model_dir, version)
+    if not os.path.isdir(version_dir):
+        sys.exit(f"Clustering model version {version} not found in {model_dir}")
+    return version_dir
+
+
+def load_models(version_dir):
+    import joblib
+    tfidf_model = joblib.load(os.path.join(version_dir, 'tfidf.joblib'))
+    km = joblib.load(os.path.join(version_dir, 'kmeans.joblib'))
+    return tfidf_model, km
+
+
+def load_artifacts(version_dir, load_vectors=False):
+    with open(os.path.join(version_dir, 'metadata.json')) as f:
+        metadata = json.load(f)
+    if metadata['preprocessing_version'] != PREPROCESSING_VERSION:
+        print(f"Warning: model was fitted with preprocessing version {metadata['preprocessing_version']}, "
+              f"current version is {PREPROCESSING_VERSION}")
+
+    tfidf_model, km = load_models(version_dir)
+    with open(os.path.join(version_dir, 'cluster_names.json')) as f:
+        cluster_names = {int(cluster): name for cluster, name in json.load(f).items()}
+
+    word_vectors = None
+    vectors_path = os.path.join(version_dir, 'word2vec.kv')
+    if load_vectors and os.path.exists(vectors_path):
+        from gensim.models import KeyedVectors
+        word_vectors = KeyedVectors.load(vectors_path, mmap='r')
+    return metadata, tfidf_model, km, cluster_names, word_vectors
+
+
+def run_scoring(args, input_filename):
+    version_dir = resolve_model_version(args.model_dir, args.model_version)
+    metadata, tfidf_model, km, cluster_names, _ = load_artifacts(version_dir)
+    print(f"Loaded clustering model version {metadata['version']} (fitted on {metadata['n_reviews']} reviews)")
+
+    with stage('load') as metrics:
+        print("Loading data...")
+        df = load_reviews(input_filename)
+        print(f"Data loaded and cleaned. Shape: {df.shape}")
+        metrics['rows'] = len(df)
+
+    with stage('preprocess', rows=len(df)):
+        print("Processing text data...")
+        with open_cache(args) as cache:
+            processed_text = preprocess_series(df['review_body'], ADJECTIVES, workers=args.workers,
+                                               chunk_size=args.chunk_size, cache=cache)
+
+    # Assign clusters chunk by chunk across processes; nothing is refitted
+    with stage('assign', rows=len(df)):
+        print("Assigning clusters...")
+        df['cluster'] = assign_in_parallel(processed_text, version_dir, tfidf_model, km, workers=args.workers,
+                                           chunk_size=args.chunk_size)
+        df['cluster_name'] = df['cluster'].map(cluster_names)
+
+    input_base = os.path.splitext(input_filename)[0]
+    output_filename = f'clustering_results_{input_base}.{args.output_format}'
+    with stage('save', rows=len(df)):
+        print("Saving results...")
+        write_table(df[OUTPUT_COLUMNS], output_filename)
+    print(f"Saved {len(df)} rows to {output_filename}")
+    return output_filename
+
+
+def run_streaming(args, input_filename):
+    from sklearn.cluster import MiniBatchKMeans
+
+    # TF-IDF needs the whole corpus, so the stream is clustered on l2-normalised hashed term counts instead
+    vectorizer = make_hashing_vectorizer(args.n_features, dtype=matrix_dtype(args))
+    term_index = HashedTermIndex(vectorizer)
+    km = MiniBatchKMeans(n_clusters=NUM_CLUSTERS, random_state=42, batch_size=1000)
+
+    input_base = os.path.splitext(input_filename)[0]
+    output_filename = f'clustering_results_{input_base}.{args.output_format}'
+
+    with open_cache(args) as cache:
+        # First pass: learn the clusters from the stream
+        with stage('fit') as metrics:
+            print("Fitting clusters from stream...")
+            rows_seen = 0
+            for chunk in iter_review_chunks(input_filename, args.stream_chunk_size):
+                processed_text = preprocess_series(chunk['review_body'], ADJECTIVES, workers=args.workers,
+                                                   chunk_size=args.chunk_size, cache=cache)
+                km.partial_fit(term_index.transform(processed_text, workers=args.workers))
+                rows_seen += len(chunk)
+                print(f"Fitted {rows_seen} reviews")
+            metrics['rows'] = rows_seen
+
+        print("Naming clusters...")
+        cluster_names = top_term_cluster_names(km, term_index.feature_names())
+
+        # Second pass: assign clusters and append results; preprocessing is served from the cache
+        print("Assigning clusters and saving results...")
+        with stage('assign', rows=rows_seen), ResultWriter(output_filename, OUTPUT_COLUMNS) as writer:
+            for chunk in iter_review_chunks(input_filename, args.stream_chunk_size):
+                processed_text = preprocess_series(chunk['review_body'], ADJECTIVES, workers=args.workers,
+                                                   chunk_size=args.chunk_size, cache=cache)
+                chunk['cluster'] = km.predict(vectorizer.transform(processed_text))
+                chunk['cluster_name'] = chunk['cluster'].map(cluster_names)
+                writer.write(chunk)
+
+    print(f"Saved {writer.rows_written} rows to {output_filename}")
+    save_artifacts(args.model_dir, vectorizer, km, cluster_names, rows_seen)
+    return output_filename
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(description="Cluster reviews by the adjectives they use.")
+    parser.add_argument('input_filename', help='Input review file (TSV, CSV, Parquet or Arrow)')
+    add_preprocessing_arguments(parser)
+    add_streaming_arguments(parser)
+    add_output_format_argument(parser)
+    add_naming_arguments(parser)
+    add_vectorizer_arguments(parser)
+    add_metrics_arguments(parser)
+    parser.add_argument('--model-dir', default=DEFAULT_MODEL_DIR,
+                        help='Directory holding the versioned clustering models (default: %(default)s)')
+    parser.add_argument('--score', action='store_true',
+                        help='Label the input with a saved model instead of fitting a new one')
+    parser.add_argument('--model-version', default=None,
+                        help='Model version to score with in --score mode (default: the latest)')
+    return parser
+
+
+def check_args(parser, args):
+    if args.score and args.stream:
+        parser.error('--score cannot be combined with --stream')
+    check_naming_arguments(parser, args)
+    return args
+
+
+def parse_args(argv=None):
+    parser = build_parser()
+    return check_args(parser, parser.parse_args(argv))
+
+
+def run_full(args, input_filename):
+    from sklearn.cluster import MiniBatchKMeans
+    from sklearn.feature_extraction.text import TfidfTransformer, TfidfVectorizer
+    from sklearn.pipeline import make_pipeline
 
     # Load data into DataFrame
-    print("Loading data...")
-    df = pd.read_csv(input_filename, sep='\t', usecols=['review_body', 'star_rating', 'product_id', 'product_title'])
-    df = df.dropna(subset=['review_body', 'product_id', 'product_title']).reset_index(drop=True)
-    print(f"Data loaded and cleaned. Shape: {df.shape}")
+    with stage('load') as metrics:
+        print("Loading data...")
+        df = load_reviews(input_filename)
+        print(f"Data loaded and cleaned. Shape: {df.shape}")
+        metrics['rows'] = len(df)
 
     # Process all text data at once
-    print("Processing text data...")
-    df['processed_text'] = df['review_body'].apply(extract_adjectives)
+    with stage('preprocess', rows=len(df)):
+        print("Processing text data...")
+        with open_cache(args) as cache:
+            processed_text = preprocess_series(df['review_body'], ADJECTIVES, workers=args.workers,
+                                               chunk_size=args.chunk_size, cache=cache)
 
     # Initialize and fit TF-IDF model
-    print("Fitting TF-IDF model...")
-    tfidf_model = TfidfVectorizer(max_df=0.99, max_features=1000, min_df=0.01, stop_words='english', use_idf=True,
-                                  ngram_range=(1, 1))
-    tfidf_matrix = tfidf_model.fit_transform(df['processed_text'])
+    with stage('vectorize', rows=len(df)):
+        print(f"Fitting TF-IDF model ({args.vectorizer} vectorizer)...")
+        if args.vectorizer == 'hashing':
+            # Hashed counts need no vocabulary dict and are built chunk by chunk across processes
+            hashing_vectorizer = make_hashing_vectorizer(args.n_features, norm=None, dtype=matrix_dtype(args))
+            term_index = HashedTermIndex(hashing_vectorizer)
+            tfidf_transformer = TfidfTransformer(use_idf=True)
+            tfidf_matrix = tfidf_transformer.fit_transform(term_index.transform(processed_text, workers=args.workers))
+            tfidf_model = make_pipeline(hashing_vectorizer, tfidf_transformer)
+            feature_names = term_index.feature_names()
+        else:
+            tfidf_model = TfidfVectorizer(max_df=0.99, max_features=1000, min_df=0.01, stop_words='english',
+                                          use_idf=True, ngram_range=(1, 1), dtype=matrix_dtype(args))
+            tfidf_matrix = tfidf_model.fit_transform(processed_text)
+            feature_names = tfidf_model.get_feature_names_out()
+
+        # Only Word2Vec naming still needs the processed text once the matrix is built
+        if args.naming != 'word2vec':
+            processed_text = None
 
     # Perform clustering
-    print("Performing clustering...")
-    num_clusters = 10
-    km = MiniBatchKMeans(n_clusters=num_clusters, random_state=42, batch_size=1000)
-    km.fit(tfidf_matrix)
-
-    # Assign clusters
-    df['cluster'] = km.predict(tfidf_matrix)
-
-    # Train Word2Vec model
-    print("Training Word2Vec model...")
-    all_words = [text.split() for text in df['processed_text'] if text]
-    word2vec_model = Word2Vec(all_words, vector_size=100, window=5, min_count=1, workers=multiprocessing.cpu_count())
-
-    # Improved cluster naming function
-    def improved_cluster_naming(km, tfidf_model, word2vec_model):
-        feature_names = tfidf_model.get_feature_names_out()
-        cluster_names = {}
-
-        for i in range(km.n_clusters):
-            cluster_center = km.cluster_centers_[i]
-            sorted_indices = cluster_center.argsort()[::-1]
-            top_feature_indices = sorted_indices[:20]
-            top_features = [feature_names[j] for j in top_feature_indices]
-
-            combined_words = set(top_features[:5])
-            for word in top_features[:5]:
-                try:
-                    similar_words = word2vec_model.wv.most_similar(word, topn=1)
-                    combined_words.update([similar_word for similar_word, _ in similar_words])
-                except KeyError:
-                    continue
-
-            cluster_name = ' '.join(list(combined_words)[:5])
-            cluster_names[i] = cluster_name
-
-        return cluster_names
-
-    # Find the top terms per cluster and create improved cluster names
-    print("Naming clusters...")
-    cluster_names = improved_cluster_naming(km, tfidf_model, word2vec_model)
-    df['cluster_name'] = df['cluster'].map(cluster_names)
+    with stage('fit', rows=len(df)):
+        print("Performing clustering...")
+        km = MiniBatchKMeans(n_clusters=NUM_CLUSTERS, random_state=42, batch_size=1000)
+        km.fit(tfidf_matrix)
+
+    # Assign clusters and name them from the top terms and their nearest neighbours
+    with stage('assign', rows=len(df)):
+        df['cluster'] = km.predict(tfidf_matrix)
+
+        print(f"Naming clusters ({args.naming})...")
+        cluster_names, word2vec_model = name_clusters(args.naming, km, feature_names, tfidf_matrix=tfidf_matrix,
+                                                      texts=processed_text, vectors_path=args.pretrained_vectors,
+                                                      workers=args.workers)
+        df['cluster_name'] = df['cluster'].map(cluster_names)
+        del tfidf_matrix, processed_text
 
     # Generate output filename
     input_base = os.path.splitext(input_filename)[0]
-    output_filename = f'clustering_results_{input_base}.csv'
-
-    # Save results to CSV
-    print("Saving results...")
-    df[['review_body', 'star_rating', 'product_id', 'product_title', 'cluster', 'cluster_name']].to_csv(output_filename,
-                                                                                                        index=False)
+    output_filename = f'clustering_results_{input_base}.{args.output_format}'
 
-    # Overall execution time
-    overall_end_time = time.time()
-    print(f"Total execution time: {overall_end_time - overall_start_time:.2f} seconds")
+    # Save results
+    with stage('save', rows=len(df)):
+        print("Saving results...")
+        write_table(df[OUTPUT_COLUMNS], output_filename)
+        save_artifacts(args.model_dir, tfidf_model, km, cluster_names, len(df), word2vec_model)
 
     # Display a sample of the results
-    print(df[['review_body', 'star_rating', 'product_id', 'product_title', 'cluster', 'cluster_name']].head())
+    print(df[OUTPUT_COLUMNS].head())
+    return output_filename
+
+
+def run(args):
+    # Returns the results file
+    with start_run('datacleaning', args):
+        if args.score:
+            return run_scoring(args, args.input_filename)
+        if args.stream:
+            return run_streaming(args, args.input_filename)
+        return run_full(args, args.input_filename)
+
+
+def cluster_reviews(input_filename, **options):
+    # Python entry point; options use the command line flag names, e.g. cluster_reviews('x.tsv', workers=4)
+    parser = build_parser()
+    return run(check_args(parser, args_from_options(parser, input_filename, options)))
+
+
+def main(argv=None):
+    run(parse_args(argv))
 
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    main()
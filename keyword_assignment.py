@@ -0,0 +1,68 @@
+import itertools
+import re
+
+import numpy as np
+
+
+def _trie_pattern(keywords):
+    # Alternation factored into a prefix tree, so the regex engine tries each character once per position
+    # rather than once per keyword; longer continuations are greedy, so the longest keyword at a position wins
+    trie = {}
+    for keyword in keywords:
+        node = trie
+        for char in keyword:
+            node = node.setdefault(char, {})
+        node[''] = {}
+
+    def build(node):
+        branches = [re.escape(char) + build(child) for char, child in node.items() if char]
+        if not branches:
+            return ''
+        body = branches[0] if len(branches) == 1 else f"(?:{'|'.join(branches)})"
+        return f'(?:{body})?' if '' in node else body
+
+    return build(trie)
+
+
+def keyword_overlap_scores(texts, keyword_lists, lowercase=False):
+    # scores[i, j] counts the keywords of list j that occur as a substring of text i
+    if lowercase:
+        texts = texts.str.lower()
+        keyword_lists = [[keyword.lower() for keyword in keywords] for keywords in keyword_lists]
+
+    keywords = list(dict.fromkeys(keyword for keywords in keyword_lists for keyword in keywords))
+    keyword_ids = {keyword: i for i, keyword in enumerate(keywords)}
+    # hits[i, k] is set when keyword k occurs in text i; the empty keyword occurs in every text
+    hits = np.zeros((len(texts), len(keywords)), dtype=bool)
+    if '' in keyword_ids:
+        hits[:, keyword_ids['']] = True
+
+    searchable = [keyword for keyword in keywords if keyword]
+    if searchable:
+        # A single pass over the column: the lookahead reports the longest keyword starting at every position,
+        # including positions inside an earlier match
+        matches = texts.str.findall(f'(?=({_trie_pattern(searchable)}))')
+        counts = matches.str.len().fillna(0).to_numpy(dtype=np.intp)
+        found = [keyword_ids[keyword] for keyword in itertools.chain.from_iterable(matches[counts > 0])]
+        hits[np.repeat(np.arange(len(texts)), counts), found] = True
+
+        # Shorter keywords starting at the same position are prefixes of the reported one, so they occur too
+        for keyword in searchable:
+            for prefix in searchable:
+                if prefix != keyword and keyword.startswith(prefix):
+                    hits[:, keyword_ids[prefix]] |= hits[:, keyword_ids[keyword]]
+
+    # A keyword listed twice in the same list counts twice, as in the per-review loop
+    memberships = np.zeros((len(keywords), len(keyword_lists)), dtype=np.int32)
+    for column, keywords_in_list in enumerate(keyword_lists):
+        for keyword in keywords_in_list:
+            memberships[keyword_ids[keyword], column] += 1
+    return hits.astype(np.int32) @ memberships
+
+
+def best_keyword_match(texts, keyword_lists, lowercase=False):
+    # argmax keeps the first of several equal scores, matching the strict '>' of the per-review loop
+    if not keyword_lists:
+        return np.zeros(len(texts), dtype=np.intp), np.zeros(len(texts), dtype=np.int32)
+    scores = keyword_overlap_scores(texts, keyword_lists, lowercase)
+    return scores.argmax(axis=1), scores.max(axis=1)
@@ -1,104 +1,302 @@
 import sys
 import os
 import time
-import pandas as pd
-from sklearn.feature_extraction.text import CountVectorizer
-from sklearn.decomposition import LatentDirichletAllocation
-import nltk
-from nltk.corpus import stopwords
-from nltk.stem import WordNetLemmatizer
-import numpy as np
+import argparse
+from text_preprocessing import (ADJECTIVES_AND_NOUNS, add_preprocessing_arguments, open_cache, preprocess_batch,
+                                preprocess_series)
+from review_io import (ResultWriter, add_output_format_argument, add_streaming_arguments, args_from_options,
+                       iter_review_chunks, load_reviews, write_table)
+from vectorization import HashedTermIndex, add_vectorizer_arguments, make_hashing_vectorizer, matrix_dtype
+from pipeline_metrics import add_metrics_arguments, stage, start_run
 
-# Download necessary NLTK data
-nltk.download('punkt', quiet=True)
-nltk.download('averaged_perceptron_tagger', quiet=True)
-nltk.download('wordnet', quiet=True)
-nltk.download('stopwords', quiet=True)
-
-# Initialize lemmatizer and stopwords
-lemmatizer = WordNetLemmatizer()
-stop_words = set(stopwords.words('english'))
+OUTPUT_COLUMNS = ['review_body', 'star_rating', 'product_id', 'product_title', 'topic', 'topic_name']
+NUM_TOPICS = 10
+DEFAULT_MODEL_PATH = 'lda_model.joblib'
+LEARNING_METHODS = ['batch', 'online']
 
 
 def preprocess_text(text):
-    if pd.isna(text):
-        return ""
-    words = nltk.word_tokenize(str(text).lower())
-    tagged_words = nltk.pos_tag(words)
-    processed_words = [lemmatizer.lemmatize(word) for word, tag in tagged_words
-                       if (tag.startswith('JJ') or tag.startswith('NN')) and word not in stop_words]
-    return ' '.join(processed_words)
+    return preprocess_batch([text], ADJECTIVES_AND_NOUNS)[0]
+
+
+def top_words(topic, feature_names, n_top_words):
+    # Hashed features that no seen term maps to have an empty name and are skipped
+    words = (feature_names[i] for i in topic.argsort()[::-1])
+    return [word for word in words if word][:n_top_words]
 
 
 def print_top_words(model, feature_names, n_top_words):
     for topic_idx, topic in enumerate(model.components_):
-        top_words = [feature_names[i] for i in topic.argsort()[:-n_top_words - 1:-1]]
-        print(f"Topic {topic_idx + 1}: {', '.join(top_words)}")
+        print(f"Topic {topic_idx + 1}: {', '.join(top_words(topic, feature_names, n_top_words))}")
+
+
+def name_topics(model, feature_names):
+    return {i: ', '.join(top_words(topic, feature_names, 5)) for i, topic in enumerate(model.components_)}
+
+
+def make_lda(args, total_samples=1e6):
+    from sklearn.decomposition import LatentDirichletAllocation
+    return LatentDirichletAllocation(n_components=NUM_TOPICS, random_state=42, learning_method=args.learning_method,
+                                     max_iter=args.max_iter, batch_size=args.batch_size,
+                                     evaluate_every=args.evaluate_every, perp_tol=args.perp_tol,
+                                     total_samples=total_samples, n_jobs=args.n_jobs)
+
+
+def fit_online(lda, dtm, max_iter, evaluate_every, perp_tol):
+    # Mini-batch epochs with a perplexity check every evaluate_every of them, stopping once it levels off
+    last_perplexity = None
+    for epoch in range(1, max_iter + 1):
+        lda.partial_fit(dtm)
+        if evaluate_every <= 0 or (epoch % evaluate_every and epoch != max_iter):
+            continue
+
+        perplexity = lda.perplexity(dtm)
+        print(f"Epoch {epoch}/{max_iter}: perplexity {perplexity:.4f}")
+        if last_perplexity is not None and abs(last_perplexity - perplexity) < perp_tol:
+            print("Perplexity converged, stopping early")
+            break
+        last_perplexity = perplexity
+    return lda
+
+
+def save_model(model_path, vectorizer, lda, feature_names, topic_name_mapping, n_documents):
+    model = {'vectorizer': vectorizer, 'lda': lda, 'feature_names': feature_names, 'topic_names': topic_name_mapping,
+             'n_documents': n_documents, 'updated_at': time.time()}
+    # Write next to the old model and swap it in, so a failed run never leaves a half-written store
+    import joblib
+    temp_path = f'{model_path}.tmp'
+    joblib.dump(model, temp_path)
+    os.replace(temp_path, model_path)
+    print(f"Saved model to {model_path}")
 
 
-def main():
-    # Get the input filename from the user
-    input_filename = input("Please enter the name of your input TSV file (including .tsv extension): ")
+def load_model(model_path):
+    if not os.path.exists(model_path):
+        sys.exit(f"No model found at {model_path}; run once without --update to create it.")
+    import joblib
+    return joblib.load(model_path)
+
+
+def run_update(args, input_filename):
+    model = load_model(args.model_path)
+    vectorizer, lda, topic_name_mapping = model['vectorizer'], model['lda'], model['topic_names']
+    lda.set_params(n_jobs=args.n_jobs, batch_size=args.batch_size)
+    print(f"Loaded model trained on {model['n_documents']} reviews from {args.model_path}")
+
+    with stage('load') as metrics:
+        print("Loading new reviews...")
+        df = load_reviews(input_filename)
+        print(f"Data loaded and cleaned. Shape: {df.shape}")
+        metrics['rows'] = len(df)
+
+    with stage('preprocess', rows=len(df)):
+        print("Processing text data...")
+        with open_cache(args) as cache:
+            processed_text = preprocess_series(df['review_body'], ADJECTIVES_AND_NOUNS, workers=args.workers,
+                                               chunk_size=args.chunk_size, cache=cache)
+
+    # The stored vocabulary is kept as is so every topic keeps its columns; unseen words are ignored
+    with stage('vectorize', rows=len(df)):
+        dtm = vectorizer.transform(processed_text)
+        del processed_text
+
+    # Online variational Bayes step over the new reviews only
+    with stage('fit', rows=len(df)):
+        print("Updating LDA with new reviews...")
+        lda.partial_fit(dtm)
+
+    print("\nTop words for each topic after the update:")
+    print_top_words(lda, model['feature_names'], n_top_words=10)
+
+    # Topic ids and names come from the stored model so downstream dashboards see the same labels
+    with stage('assign', rows=len(df)):
+        df['topic'] = lda.transform(dtm).argmax(axis=1)
+        df['topic_name'] = df['topic'].map(topic_name_mapping)
+
+    input_base = os.path.splitext(input_filename)[0]
+    output_filename = f'topic_modeling_results_{input_base}.{args.output_format}'
+    with stage('save', rows=len(df)):
+        print("Saving results...")
+        write_table(df[OUTPUT_COLUMNS], output_filename)
+        save_model(args.model_path, vectorizer, lda, model['feature_names'], topic_name_mapping,
+                   model['n_documents'] + len(df))
+    return output_filename
+
 
-    # Start overall timing
-    overall_start_time = time.time()
+def run_streaming(args, input_filename):
+    # CountVectorizer needs the whole corpus for its vocabulary, so the stream uses hashed term counts
+    vectorizer = make_hashing_vectorizer(args.n_features, norm=None, dtype=matrix_dtype(args))
+    term_index = HashedTermIndex(vectorizer)
+    lda = make_lda(args)
+    lda.set_params(learning_method='online')
+
+    input_base = os.path.splitext(input_filename)[0]
+    output_filename = f'topic_modeling_results_{input_base}.{args.output_format}'
+
+    with open_cache(args) as cache:
+        # First pass: learn the topics from the stream with online variational Bayes
+        with stage('fit') as metrics:
+            print("Performing LDA on stream...")
+            rows_seen = 0
+            for chunk in iter_review_chunks(input_filename, args.stream_chunk_size):
+                processed_text = preprocess_series(chunk['review_body'], ADJECTIVES_AND_NOUNS, workers=args.workers,
+                                                   chunk_size=args.chunk_size, cache=cache)
+                lda.partial_fit(term_index.transform(processed_text, workers=args.workers))
+                rows_seen += len(chunk)
+                print(f"Fitted {rows_seen} reviews")
+            metrics['rows'] = rows_seen
+
+        feature_names = term_index.feature_names()
+        print("\nTop words for each topic:")
+        print_top_words(lda, feature_names, n_top_words=10)
+        topic_name_mapping = name_topics(lda, feature_names)
+
+        # Second pass: assign topics and append results; preprocessing is served from the cache
+        print("Assigning topics and saving results...")
+        with stage('assign', rows=rows_seen), ResultWriter(output_filename, OUTPUT_COLUMNS) as writer:
+            for chunk in iter_review_chunks(input_filename, args.stream_chunk_size):
+                processed_text = preprocess_series(chunk['review_body'], ADJECTIVES_AND_NOUNS, workers=args.workers,
+                                                   chunk_size=args.chunk_size, cache=cache)
+                chunk['topic'] = lda.transform(vectorizer.transform(processed_text)).argmax(axis=1)
+                chunk['topic_name'] = chunk['topic'].map(topic_name_mapping)
+                writer.write(chunk)
+
+    print(f"Saved {writer.rows_written} rows to {output_filename}")
+    save_model(args.model_path, vectorizer, lda, feature_names, topic_name_mapping, rows_seen)
+    return output_filename
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(description="Discover review topics with LDA.")
+    parser.add_argument('input_filename', help='Input review file (TSV, CSV, Parquet or Arrow)')
+    add_preprocessing_arguments(parser)
+    add_streaming_arguments(parser)
+    add_output_format_argument(parser)
+    add_vectorizer_arguments(parser)
+    add_metrics_arguments(parser)
+    parser.add_argument('--n-jobs', type=int, default=None,
+                        help='Processes used by the LDA E-step; -1 uses every CPU (default: 1)')
+    parser.add_argument('--learning-method', choices=LEARNING_METHODS, default='batch',
+                        help='Full-batch or online mini-batch variational Bayes (default: %(default)s)')
+    parser.add_argument('--max-iter', type=int, default=10,
+                        help='Maximum passes over the reviews (default: %(default)s)')
+    parser.add_argument('--batch-size', type=int, default=128,
+                        help='Documents per mini-batch in online learning (default: %(default)s)')
+    parser.add_argument('--evaluate-every', type=int, default=-1,
+                        help='Check perplexity every N passes and stop once it changes less than --perp-tol; '
+                             '0 or less disables early stopping (default: %(default)s)')
+    parser.add_argument('--perp-tol', type=float, default=1e-1,
+                        help='Perplexity change treated as converged (default: %(default)s)')
+    parser.add_argument('--model-path', default=DEFAULT_MODEL_PATH,
+                        help='Where the vectorizer, LDA model and topic names are stored (default: %(default)s)')
+    parser.add_argument('--update', action='store_true',
+                        help='Update the stored model with the new reviews in the input and label only those')
+    return parser
+
+
+def check_args(parser, args):
+    if args.update and args.stream:
+        parser.error('--update cannot be combined with --stream')
+    return args
+
+
+def parse_args(argv=None):
+    parser = build_parser()
+    return check_args(parser, parser.parse_args(argv))
+
+
+def run_full(args, input_filename):
+    from sklearn.feature_extraction.text import CountVectorizer
 
     # Load data into DataFrame
-    print("Loading data...")
-    df = pd.read_csv(input_filename, sep='\t', usecols=['review_body', 'star_rating', 'product_id', 'product_title'])
-    df = df.dropna(subset=['review_body', 'product_id', 'product_title']).reset_index(drop=True)
-    print(f"Data loaded and cleaned. Shape: {df.shape}")
+    with stage('load') as metrics:
+        print("Loading data...")
+        df = load_reviews(input_filename)
+        print(f"Data loaded and cleaned. Shape: {df.shape}")
+        metrics['rows'] = len(df)
 
     # Process all text data at once
-    print("Processing text data...")
-    df['processed_text'] = df['review_body'].apply(preprocess_text)
+    with stage('preprocess', rows=len(df)):
+        print("Processing text data...")
+        with open_cache(args) as cache:
+            processed_text = preprocess_series(df['review_body'], ADJECTIVES_AND_NOUNS, workers=args.workers,
+                                               chunk_size=args.chunk_size, cache=cache)
 
-    # Initialize and fit CountVectorizer
-    print("Fitting CountVectorizer...")
-    vectorizer = CountVectorizer(max_df=0.95, min_df=2, stop_words='english', max_features=1000)
-    dtm = vectorizer.fit_transform(df['processed_text'])
+    # Build the document-term matrix
+    with stage('vectorize', rows=len(df)):
+        print(f"Vectorizing ({args.vectorizer})...")
+        if args.vectorizer == 'hashing':
+            # Raw hashed counts: no vocabulary dict, and the chunks are transformed across processes
+            vectorizer = make_hashing_vectorizer(args.n_features, norm=None, dtype=matrix_dtype(args))
+            term_index = HashedTermIndex(vectorizer)
+            dtm = term_index.transform(processed_text, workers=args.workers)
+            feature_names = term_index.feature_names()
+        else:
+            vectorizer = CountVectorizer(max_df=0.95, min_df=2, stop_words='english', max_features=1000,
+                                         dtype=matrix_dtype(args))
+            dtm = vectorizer.fit_transform(processed_text)
+            feature_names = vectorizer.get_feature_names_out()
+        # The text is not needed again once it is in the matrix
+        del processed_text
 
     # Perform LDA
-    print("Performing LDA...")
-    num_topics = 10
-    lda = LatentDirichletAllocation(n_components=num_topics, random_state=42, max_iter=10)
-    lda.fit(dtm)
+    with stage('fit', rows=len(df)):
+        print(f"Performing LDA ({args.learning_method})...")
+        lda = make_lda(args, total_samples=dtm.shape[0])
+        if args.learning_method == 'online':
+            fit_online(lda, dtm, args.max_iter, args.evaluate_every, args.perp_tol)
+        else:
+            lda.fit(dtm)
 
     # Print top words for each topic
     print("\nTop words for each topic:")
-    print_top_words(lda, vectorizer.get_feature_names_out(), n_top_words=10)
+    print_top_words(lda, feature_names, n_top_words=10)
 
     # Assign topics to reviews
-    topic_probs = lda.transform(dtm)
-    df['topic'] = topic_probs.argmax(axis=1)
+    with stage('assign', rows=len(df)):
+        doc_topic = lda.transform(dtm)
+        df['topic'] = doc_topic.argmax(axis=1)
 
-    # Create topic names
-    feature_names = vectorizer.get_feature_names_out()
-    topic_names = []
-    for topic_idx, topic in enumerate(lda.components_):
-        top_words = [feature_names[i] for i in topic.argsort()[:-5 - 1:-1]]
-        topic_names.append(', '.join(top_words))
-
-    topic_name_mapping = {i: name for i, name in enumerate(topic_names)}
-    df['topic_name'] = df['topic'].map(topic_name_mapping)
+        # Create topic names
+        topic_name_mapping = name_topics(lda, feature_names)
+        df['topic_name'] = df['topic'].map(topic_name_mapping)
+        del dtm, doc_topic
 
     # Generate output filename
     input_base = os.path.splitext(input_filename)[0]
-    output_filename = f'topic_modeling_results_{input_base}.csv'
-
-    # Save results to CSV
-    print("Saving results...")
-    df[['review_body', 'star_rating', 'product_id', 'product_title', 'topic', 'topic_name']].to_csv(output_filename,
-                                                                                                    index=False)
+    output_filename = f'topic_modeling_results_{input_base}.{args.output_format}'
 
-    # Overall execution time
-    overall_end_time = time.time()
-    print(f"\nTotal execution time: {overall_end_time - overall_start_time:.2f} seconds")
+    # Save results
+    with stage('save', rows=len(df)):
+        print("Saving results...")
+        write_table(df[OUTPUT_COLUMNS], output_filename)
+        save_model(args.model_path, vectorizer, lda, feature_names, topic_name_mapping, len(df))
 
     # Display a sample of the results
     print("\nSample results:")
-    print(df[['review_body', 'star_rating', 'product_id', 'product_title', 'topic', 'topic_name']].head())
+    print(df[OUTPUT_COLUMNS].head())
+    return output_filename
+
+
+def run(args):
+    # Returns the results file
+    with start_run('lda_topic_modeling', args):
+        if args.update:
+            return run_update(args, args.input_filename)
+        if args.stream:
+            return run_streaming(args, args.input_filename)
+        return run_full(args, args.input_filename)
+
+
+def model_topics(input_filename, **options):
+    # Python entry point; options use the command line flag names, e.g. model_topics('x.tsv', update=True)
+    parser = build_parser()
+    return run(check_args(parser, args_from_options(parser, input_filename, options)))
+
+
+def main(argv=None):
+    run(parse_args(argv))
 
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    main()
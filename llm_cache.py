@@ -0,0 +1,119 @@
+import hashlib
+import json
+import sqlite3
+import time
+from contextlib import nullcontext
+
+DEFAULT_LLM_CACHE_PATH = 'llm_cache.sqlite3'
+DEFAULT_TTL_HOURS = 24 * 30
+DEFAULT_MAX_ENTRIES = 10000
+
+
+class ReplayMiss(LookupError):
+    pass
+
+
+def prompt_hash(prompt):
+    return hashlib.sha256(prompt.encode('utf-8')).hexdigest()
+
+
+class LLMCache:
+    # Prompt -> response cache shared by the Ollama and OpenAI calls, with TTL and LRU eviction
+    def __init__(self, path=DEFAULT_LLM_CACHE_PATH, ttl_hours=DEFAULT_TTL_HOURS, max_entries=DEFAULT_MAX_ENTRIES,
+                 replay=False):
+        self.path = path
+        self.ttl_seconds = ttl_hours * 3600
+        self.max_entries = max_entries
+        self.replay = replay
+        self.hits = 0
+        self.misses = 0
+        self.conn = sqlite3.connect(path)
+        self.conn.execute('PRAGMA journal_mode=WAL')
+        self.conn.execute("""
+            CREATE TABLE IF NOT EXISTS llm_responses (
+                key TEXT PRIMARY KEY,
+                provider TEXT NOT NULL,
+                model TEXT NOT NULL,
+                temperature REAL,
+                prompt_hash TEXT NOT NULL,
+                response TEXT NOT NULL,
+                created_at REAL NOT NULL,
+                last_used REAL NOT NULL
+            )
+        """)
+        self.conn.execute('CREATE INDEX IF NOT EXISTS idx_llm_responses_last_used ON llm_responses (last_used)')
+
+    @staticmethod
+    def key(provider, model, temperature, prompt):
+        return json.dumps([provider, model, temperature, prompt_hash(prompt)])
+
+    def get(self, provider, model, temperature, prompt):
+        key = self.key(provider, model, temperature, prompt)
+        row = self.conn.execute('SELECT response, created_at FROM llm_responses WHERE key = ?', (key,)).fetchone()
+
+        # Replay runs use whatever was recorded, however old
+        if row is not None and (self.replay or time.time() - row[1] <= self.ttl_seconds):
+            self.hits += 1
+            self.conn.execute('UPDATE llm_responses SET last_used = ? WHERE key = ?', (time.time(), key))
+            self.conn.commit()
+            return row[0]
+
+        self.misses += 1
+        if self.replay:
+            raise ReplayMiss(f"No cached {provider}/{model} response for this prompt (replay mode)")
+        return None
+
+    def put(self, provider, model, temperature, prompt, response):
+        now = time.time()
+        self.conn.execute(
+            'INSERT OR REPLACE INTO llm_responses '
+            '(key, provider, model, temperature, prompt_hash, response, created_at, last_used) '
+            'VALUES (?, ?, ?, ?, ?, ?, ?, ?)',
+            (self.key(provider, model, temperature, prompt), provider, model, temperature, prompt_hash(prompt),
+             response, now, now))
+        self.conn.commit()
+
+    def evict(self):
+        # Expired entries go first, then the least recently used beyond max_entries
+        expired = self.conn.execute('DELETE FROM llm_responses WHERE created_at < ?',
+                                    (time.time() - self.ttl_seconds,)).rowcount
+        overflow = self.conn.execute(
+            'DELETE FROM llm_responses WHERE key IN '
+            '(SELECT key FROM llm_responses ORDER BY last_used DESC LIMIT -1 OFFSET ?)', (self.max_entries,)).rowcount
+        self.conn.commit()
+        return expired + overflow
+
+    def report(self):
+        print(f"LLM response cache: {self.hits} hits, {self.misses} misses")
+
+    def close(self):
+        # Never drop recordings while replaying them
+        if not self.replay:
+            self.evict()
+        self.conn.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.report()
+        self.close()
+
+
+def open_llm_cache(args):
+    if args.no_llm_cache and not args.replay:
+        return nullcontext()
+    return LLMCache(args.llm_cache_path, ttl_hours=args.llm_cache_ttl_hours, max_entries=args.llm_cache_max_entries,
+                    replay=args.replay)
+
+
+def add_llm_cache_arguments(parser):
+    parser.add_argument('--llm-cache-path', default=DEFAULT_LLM_CACHE_PATH,
+                        help='SQLite file caching LLM responses (default: %(default)s)')
+    parser.add_argument('--llm-cache-ttl-hours', type=float, default=DEFAULT_TTL_HOURS,
+                        help='Re-ask the LLM once a cached response is older than this (default: %(default)s)')
+    parser.add_argument('--llm-cache-max-entries', type=int, default=DEFAULT_MAX_ENTRIES,
+                        help='Evict least recently used responses above this count (default: %(default)s)')
+    parser.add_argument('--no-llm-cache', action='store_true', help='Always send prompts to the LLM')
+    parser.add_argument('--replay', action='store_true',
+                        help='Run fully offline from the LLM cache; prompts that were never cached fail')
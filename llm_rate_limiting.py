@@ -0,0 +1,48 @@
+import asyncio
+import random
+import time
+
+
+class TokenBucket:
+    # Allows bursts of up to `capacity` requests and `rate` requests per second on average
+    def __init__(self, rate, capacity=None):
+        self.rate = rate
+        self.capacity = capacity or max(1, rate)
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+        self._lock = asyncio.Lock()
+
+    def _refill(self):
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    async def acquire(self, tokens=1):
+        async with self._lock:
+            self._refill()
+            while self.tokens < tokens:
+                await asyncio.sleep((tokens - self.tokens) / self.rate)
+                self._refill()
+            self.tokens -= tokens
+
+
+def backoff_delay(attempt, base_delay=1.0, max_delay=60.0):
+    # Exponential backoff with jitter so concurrent retries do not arrive together
+    return min(max_delay, base_delay * 2 ** attempt) * random.uniform(0.5, 1.0)
+
+
+async def retry_with_backoff(request, is_retryable, max_retries=5, base_delay=1.0, max_delay=60.0,
+                             retry_after=None):
+    for attempt in range(max_retries + 1):
+        try:
+            return await request()
+        except Exception as e:
+            if attempt == max_retries or not is_retryable(e):
+                raise
+            delay = backoff_delay(attempt, base_delay, max_delay)
+            # Respect a server-provided Retry-After when it asks for a longer wait
+            hinted = retry_after(e) if retry_after else None
+            if hinted:
+                delay = max(delay, min(hinted, max_delay))
+            print(f"Request failed ({e}); retry {attempt + 1}/{max_retries} in {delay:.1f} seconds")
+            await asyncio.sleep(delay)
@@ -0,0 +1,144 @@
+import asyncio
+import json
+
+from llm_rate_limiting import retry_with_backoff
+
+DEFAULT_OLLAMA_URL = 'http://localhost:11434'
+DEFAULT_MODEL = 'mistral'
+DEFAULT_TIMEOUT = 300
+
+
+class OllamaError(Exception):
+    def __init__(self, status, message):
+        super().__init__(f"Received status code {status} from Ollama: {message}")
+        self.status = status
+
+
+class IncrementalJSONParser:
+    # Finds the first complete top-level JSON object in text that arrives a few tokens at a time
+    def __init__(self):
+        self.buffer = []
+        self.depth = 0
+        self.in_string = False
+        self.escaped = False
+        self.started = False
+
+    def feed(self, text):
+        for char in text:
+            if not self.started:
+                if char != '{':
+                    continue
+                self.started = True
+            self.buffer.append(char)
+
+            if self.in_string:
+                if self.escaped:
+                    self.escaped = False
+                elif char == '\\':
+                    self.escaped = True
+                elif char == '"':
+                    self.in_string = False
+            elif char == '"':
+                self.in_string = True
+            elif char == '{':
+                self.depth += 1
+            elif char == '}':
+                self.depth -= 1
+                if self.depth == 0:
+                    return json.loads(''.join(self.buffer))
+        return None
+
+
+def _is_retryable(error):
+    import aiohttp
+    if isinstance(error, OllamaError):
+        return error.status == 429 or error.status >= 500
+    return isinstance(error, (aiohttp.ClientConnectionError, aiohttp.ClientPayloadError, asyncio.TimeoutError))
+
+
+class AsyncOllamaClient:
+    # One pooled HTTP session shared by every request made through the client
+    def __init__(self, base_url=DEFAULT_OLLAMA_URL, model=DEFAULT_MODEL, max_connections=8, timeout=DEFAULT_TIMEOUT,
+                 max_retries=3, cache=None):
+        self.base_url = base_url.rstrip('/')
+        self.cache = cache
+        self.model = model
+        self.max_connections = max_connections
+        self.timeout = timeout
+        self.max_retries = max_retries
+        self.session = None
+
+    async def open(self):
+        import aiohttp
+        self.session = aiohttp.ClientSession(
+            connector=aiohttp.TCPConnector(limit=self.max_connections),
+            timeout=aiohttp.ClientTimeout(total=self.timeout))
+        return self
+
+    async def close(self):
+        await self.session.close()
+        self.session = None
+
+    async def __aenter__(self):
+        return await self.open()
+
+    async def __aexit__(self, exc_type, exc_value, traceback):
+        await self.close()
+
+    async def stream_generate(self, prompt, **options):
+        # Yields the response text token by token as Ollama produces it
+        payload = {"model": self.model, "prompt": prompt, "stream": True, **options}
+        async with self.session.post(f'{self.base_url}/api/generate', json=payload) as response:
+            if response.status != 200:
+                raise OllamaError(response.status, await response.text())
+            async for line in response.content:
+                if not line.strip():
+                    continue
+                chunk = json.loads(line)
+                if 'error' in chunk:
+                    raise OllamaError(500, chunk['error'])
+                yield chunk.get('response', '')
+                if chunk.get('done'):
+                    return
+
+    async def _generate_json_once(self, prompt, **options):
+        parser = IncrementalJSONParser()
+        text = []
+        tokens = self.stream_generate(prompt, **options)
+        try:
+            async for token in tokens:
+                text.append(token)
+                result = parser.feed(token)
+                if result is not None:
+                    # Stop reading as soon as the object is complete; closing the stream ends the generation
+                    return result
+        finally:
+            await tokens.aclose()
+        raise ValueError(f"Couldn't parse Ollama's response as JSON: {''.join(text)[:200]}")
+
+    async def generate_json(self, prompt, accept=None, **options):
+        # accept(result) decides whether a response is worth caching; rejected ones are asked for again next time
+        temperature = options.get('options', {}).get('temperature')
+        if self.cache is not None:
+            cached = self.cache.get('ollama', self.model, temperature, prompt)
+            if cached is not None:
+                return json.loads(cached)
+
+        result = await retry_with_backoff(lambda: self._generate_json_once(prompt, **options), _is_retryable,
+                                          max_retries=self.max_retries)
+        if self.cache is not None and (accept is None or accept(result)):
+            self.cache.put('ollama', self.model, temperature, prompt, json.dumps(result))
+        return result
+
+    async def generate_json_many(self, prompts, concurrency=None, accept=None, **options):
+        # Run many prompts at once; failures are returned in place of results instead of cancelling the rest
+        semaphore = asyncio.Semaphore(concurrency or self.max_connections)
+
+        async def run(prompt):
+            async with semaphore:
+                try:
+                    return await self.generate_json(prompt, accept, **options)
+                except Exception as e:
+                    return e
+
+        return await asyncio.gather(*(run(prompt) for prompt in prompts))
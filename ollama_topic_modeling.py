@@ -1,37 +1,26 @@
-import sys
 import os
-import time
+import argparse
 import pandas as pd
-import nltk
-from nltk.corpus import stopwords
-from nltk.stem import WordNetLemmatizer
+from text_preprocessing import (ADJECTIVES_AND_NOUNS, add_preprocessing_arguments, open_cache, preprocess_batch,
+                                preprocess_series)
+from keyword_assignment import best_keyword_match
+from review_io import (ResultWriter, add_output_format_argument, add_streaming_arguments, args_from_options,
+                       iter_review_chunks, load_reviews, write_table)
+from ollama_client import DEFAULT_OLLAMA_URL, DEFAULT_TIMEOUT, AsyncOllamaClient, OllamaError
+from llm_cache import ReplayMiss, add_llm_cache_arguments, open_llm_cache
+from pipeline_metrics import add_metrics_arguments, stage, start_run
+from async_sessions import client_session, run_async
 import numpy as np
-import requests
-import json
 
-# Download necessary NLTK data
-nltk.download('punkt', quiet=True)
-nltk.download('averaged_perceptron_tagger', quiet=True)
-nltk.download('wordnet', quiet=True)
-nltk.download('stopwords', quiet=True)
-
-# Initialize lemmatizer and stopwords
-lemmatizer = WordNetLemmatizer()
-stop_words = set(stopwords.words('english'))
+OUTPUT_COLUMNS = ['review_body', 'star_rating', 'product_id', 'product_title', 'topic', 'topic_name']
 
 
 def preprocess_text(text):
-    if pd.isna(text):
-        return ""
-    words = nltk.word_tokenize(str(text).lower())
-    tagged_words = nltk.pos_tag(words)
-    processed_words = [lemmatizer.lemmatize(word) for word, tag in tagged_words
-                       if (tag.startswith('JJ') or tag.startswith('NN')) and word not in stop_words]
-    return ' '.join(processed_words)
+    return preprocess_batch([text], ADJECTIVES_AND_NOUNS)[0]
 
 
-def get_topics_from_ollama(reviews, num_topics=10):
-    prompt = f"""
+def build_topic_prompt(reviews, num_topics=10):
+    return f"""
     You are an expert in analyzing product reviews and extracting key topics. 
     I have a collection of product reviews, and I need you to identify the {num_topics} most prominent topics discussed in these reviews.
     For each topic, provide a short, descriptive name and list the top 5 keywords associated with that topic.
@@ -51,24 +40,59 @@ def get_topics_from_ollama(reviews, num_topics=10):
     }}
     """
 
-    response = requests.post('http://localhost:11434/api/generate',
-                             json={
-                                 "model": "mistral",
-                                 "prompt": prompt,
-                                 "stream": False
-                             })
-
-    if response.status_code == 200:
-        result = response.json()['response']
-        try:
-            topics = json.loads(result)
-            return topics['topics']
-        except json.JSONDecodeError:
-            print("Error: Couldn't parse Ollama's response as JSON.")
-            return []
-    else:
-        print(f"Error: Received status code {response.status_code} from Ollama.")
+
+def topics_from_response(result):
+    # result is the parsed JSON object, or the exception raised while requesting it
+    if isinstance(result, (OllamaError, ReplayMiss)):
+        print(f"Error: {result}")
+        return []
+    if isinstance(result, ValueError):
+        print("Error: Couldn't parse Ollama's response as JSON.")
         return []
+    if isinstance(result, Exception):
+        print(f"Error: Couldn't reach Ollama: {result}")
+        return []
+    if 'topics' not in result:
+        print("Error: 'topics' key not found in Ollama's response.")
+        return []
+    return result['topics']
+
+
+def has_topics(result):
+    topics = result.get('topics')
+    return isinstance(topics, list) and len(topics) > 0
+
+
+async def _request_topics(prompts, concurrency, ollama_url, timeout, max_retries, cache):
+    async def open_client():
+        return await AsyncOllamaClient(ollama_url, max_connections=concurrency, timeout=timeout,
+                                       max_retries=max_retries).open()
+
+    async with client_session(('ollama', ollama_url, concurrency, timeout, max_retries), open_client) as client:
+        client.cache = cache
+        # Only responses with topics are cached, so a malformed one is asked for again next time
+        return await client.generate_json_many(prompts, concurrency, accept=has_topics)
+
+
+def get_topics_from_ollama(reviews, num_topics=10, ollama_url=DEFAULT_OLLAMA_URL, timeout=DEFAULT_TIMEOUT,
+                           max_retries=3, cache=None):
+    results = run_async(_request_topics([build_topic_prompt(reviews, num_topics)], 1, ollama_url, timeout,
+                                        max_retries, cache))
+    return topics_from_response(results[0])
+
+
+def get_topics_per_product(df, num_topics=10, concurrency=8, ollama_url=DEFAULT_OLLAMA_URL, timeout=DEFAULT_TIMEOUT,
+                           max_retries=3, cache=None):
+    # One prompt per product, sent concurrently over a pooled connection
+    product_ids = []
+    prompts = []
+    for product_id, group in df.groupby('product_id', observed=True, sort=False):
+        product_ids.append(product_id)
+        prompts.append(build_topic_prompt(group['processed_text'].tolist(), num_topics))
+
+    print(f"Requesting topics for {len(prompts)} products with up to {concurrency} concurrent requests...")
+    results = run_async(_request_topics(prompts, concurrency, ollama_url, timeout, max_retries, cache))
+    return {product_id: topics_from_response(result) for product_id, result in zip(product_ids, results)}
 
 
 def assign_topic_to_review(review, topics):
@@ -82,60 +106,180 @@ def assign_topic_to_review(review, topics):
     return assigned_topic
 
 
-def main():
-    # Get the input filename from the user
-    input_filename = input("Please enter the name of your input TSV file (including .tsv extension): ")
+def print_topics(topics):
+    print("\nIdentified Topics:")
+    for i, topic in enumerate(topics):
+        print(f"Topic {i + 1}: {topic['name']}")
+        print(f"Keywords: {', '.join(topic['keywords'])}")
+        print()
+
+
+def assign_topics(df, topics):
+    # Vectorized equivalent of assign_topic_to_review over the whole column
+    topic_ids, _ = best_keyword_match(df['processed_text'], [topic['keywords'] for topic in topics])
+    topic_names = np.array([topic['name'] for topic in topics], dtype=object)
+    df['topic'] = topic_ids
+    df['topic_name'] = topic_names[topic_ids]
+
+
+def assign_topics_per_product(df, product_topics):
+    # Each product's reviews are matched against that product's own topics
+    assigned = []
+    for product_id, group in df.groupby('product_id', observed=True, sort=False):
+        topics = product_topics.get(product_id)
+        if not topics:
+            continue
+        group = group.copy()
+        assign_topics(group, topics)
+        assigned.append(group)
+    return pd.concat(assigned, ignore_index=True) if assigned else df.iloc[0:0]
+
 
-    # Start overall timing
-    overall_start_time = time.time()
+def run_streaming(args, input_filename):
+    input_base = os.path.splitext(input_filename)[0]
+    output_filename = f'ollama_topic_modeling_results_{input_base}.{args.output_format}'
+
+    topics = None
+    with stage('stream') as metrics, open_cache(args) as cache, open_llm_cache(args) as llm_cache, \
+            ResultWriter(output_filename, OUTPUT_COLUMNS) as writer:
+        for chunk in iter_review_chunks(input_filename, args.stream_chunk_size):
+            chunk['processed_text'] = preprocess_series(chunk['review_body'], ADJECTIVES_AND_NOUNS,
+                                                        workers=args.workers, chunk_size=args.chunk_size, cache=cache)
+
+            # The prompt only samples the first reviews, so topics come from the first chunk
+            if topics is None:
+                with stage('llm', rows=len(chunk)):
+                    print("Getting topics from Ollama...")
+                    topics = get_topics_from_ollama(chunk['processed_text'].tolist(), ollama_url=args.ollama_url,
+                                                    timeout=args.timeout, max_retries=args.max_retries,
+                                                    cache=llm_cache)
+                if not topics:
+                    print("Failed to get topics from Ollama. Exiting.")
+                    return
+                print_topics(topics)
+
+            assign_topics(chunk, topics)
+            writer.write(chunk)
+            metrics['rows'] = writer.rows_written
+            print(f"Processed {writer.rows_written} reviews")
+
+    print(f"Saved {writer.rows_written} rows to {output_filename}")
+    return output_filename
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(description="Discover review topics with a local Ollama model.")
+    parser.add_argument('input_filename', help='Input review file (TSV, CSV, Parquet or Arrow)')
+    add_preprocessing_arguments(parser)
+    add_streaming_arguments(parser)
+    add_output_format_argument(parser)
+    add_llm_cache_arguments(parser)
+    add_metrics_arguments(parser)
+    parser.add_argument('--per-product', action='store_true',
+                        help='Extract topics separately for every product, concurrently')
+    parser.add_argument('--concurrency', type=int, default=8,
+                        help='Maximum concurrent Ollama requests in --per-product mode (default: %(default)s)')
+    parser.add_argument('--ollama-url', default=DEFAULT_OLLAMA_URL, help='Ollama server (default: %(default)s)')
+    parser.add_argument('--timeout', type=float, default=DEFAULT_TIMEOUT,
+                        help='Seconds allowed per Ollama request (default: %(default)s)')
+    parser.add_argument('--max-retries', type=int, default=3,
+                        help='Retries on connection errors, timeouts and 429/5xx responses (default: %(default)s)')
+    return parser
 
+
+def check_args(parser, args):
+    if args.stream and args.per_product:
+        parser.error('--per-product needs every review of a product at once and cannot be combined with --stream')
+    return args
+
+
+def parse_args(argv=None):
+    parser = build_parser()
+    return check_args(parser, parser.parse_args(argv))
+
+
+def run_full(args, input_filename):
     # Load data into DataFrame
-    print("Loading data...")
-    df = pd.read_csv(input_filename, sep='\t', usecols=['review_body', 'star_rating', 'product_id', 'product_title'])
-    df = df.dropna(subset=['review_body', 'product_id', 'product_title']).reset_index(drop=True)
-    print(f"Data loaded and cleaned. Shape: {df.shape}")
+    with stage('load') as metrics:
+        print("Loading data...")
+        df = load_reviews(input_filename)
+        print(f"Data loaded and cleaned. Shape: {df.shape}")
+        metrics['rows'] = len(df)
 
     # Process all text data at once
-    print("Processing text data...")
-    df['processed_text'] = df['review_body'].apply(preprocess_text)
+    with stage('preprocess', rows=len(df)):
+        print("Processing text data...")
+        with open_cache(args) as cache:
+            df['processed_text'] = preprocess_series(df['review_body'], ADJECTIVES_AND_NOUNS, workers=args.workers,
+                                                     chunk_size=args.chunk_size, cache=cache)
+
+    if args.per_product:
+        # Get topics for every product from Ollama
+        with stage('llm', rows=len(df)), open_llm_cache(args) as llm_cache:
+            product_topics = get_topics_per_product(df, concurrency=args.concurrency, ollama_url=args.ollama_url,
+                                                    timeout=args.timeout, max_retries=args.max_retries,
+                                                    cache=llm_cache)
+        failed = sum(1 for topics in product_topics.values() if not topics)
+        if failed == len(product_topics):
+            print("Failed to get topics from Ollama. Exiting.")
+            return
+        if failed:
+            print(f"Skipping {failed} products without topics")
 
-    # Get topics from Ollama
-    print("Getting topics from Ollama...")
-    topics = get_topics_from_ollama(df['processed_text'].tolist())
+        with stage('assign', rows=len(df)):
+            print("Assigning topics to reviews...")
+            df = assign_topics_per_product(df, product_topics)
+    else:
+        # Get topics from Ollama
+        with stage('llm', rows=len(df)), open_llm_cache(args) as llm_cache:
+            print("Getting topics from Ollama...")
+            topics = get_topics_from_ollama(df['processed_text'].tolist(), ollama_url=args.ollama_url,
+                                            timeout=args.timeout, max_retries=args.max_retries, cache=llm_cache)
 
-    if not topics:
-        print("Failed to get topics from Ollama. Exiting.")
-        return
+        if not topics:
+            print("Failed to get topics from Ollama. Exiting.")
+            return
 
-    # Print topics
-    print("\nIdentified Topics:")
-    for i, topic in enumerate(topics):
-        print(f"Topic {i + 1}: {topic['name']}")
-        print(f"Keywords: {', '.join(topic['keywords'])}")
-        print()
+        # Print topics
+        print_topics(topics)
 
-    # Assign topics to reviews
-    print("Assigning topics to reviews...")
-    df['topic'] = df['processed_text'].apply(lambda x: assign_topic_to_review(x, topics))
-    df['topic_name'] = df['topic'].apply(lambda x: topics[x]['name'])
+        # Assign topics to reviews
+        with stage('assign', rows=len(df)):
+            print("Assigning topics to reviews...")
+            assign_topics(df, topics)
 
     # Generate output filename
     input_base = os.path.splitext(input_filename)[0]
-    output_filename = f'ollama_topic_modeling_results_{input_base}.csv'
-
-    # Save results to CSV
-    print("Saving results...")
-    df[['review_body', 'star_rating', 'product_id', 'product_title', 'topic', 'topic_name']].to_csv(output_filename,
-                                                                                                    index=False)
+    output_filename = f'ollama_topic_modeling_results_{input_base}.{args.output_format}'
 
-    # Overall execution time
-    overall_end_time = time.time()
-    print(f"\nTotal execution time: {overall_end_time - overall_start_time:.2f} seconds")
+    # Save results
+    with stage('save', rows=len(df)):
+        print("Saving results...")
+        write_table(df[OUTPUT_COLUMNS], output_filename)
 
     # Display a sample of the results
     print("\nSample results:")
-    print(df[['review_body', 'star_rating', 'product_id', 'product_title', 'topic', 'topic_name']].head())
+    print(df[OUTPUT_COLUMNS].head())
+    return output_filename
+
+
+def run(args):
+    # Returns the results file, or None when no topics could be obtained
+    with start_run('ollama_topic_modeling', args):
+        if args.stream:
+            return run_streaming(args, args.input_filename)
+        return run_full(args, args.input_filename)
+
+
+def ollama_topics(input_filename, **options):
+    # Python entry point; options use the command line flag names, e.g. ollama_topics('x.tsv', per_product=True)
+    parser = build_parser()
+    return run(check_args(parser, args_from_options(parser, input_filename, options)))
+
+
+def main(argv=None):
+    run(parse_args(argv))
 
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    main()
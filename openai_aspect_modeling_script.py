@@ -1,40 +1,52 @@
-import sys
 import os
-import time
+import argparse
 import pandas as pd
-import nltk
-from nltk.corpus import stopwords
-from nltk.stem import WordNetLemmatizer
-from openai import OpenAI
+from text_preprocessing import (ADJECTIVES_AND_NOUNS, add_preprocessing_arguments, open_cache, preprocess_batch,
+                                preprocess_series)
+import numpy as np
+from keyword_assignment import best_keyword_match, keyword_overlap_scores
+from review_io import (ResultWriter, add_output_format_argument, add_streaming_arguments, args_from_options,
+                       iter_review_chunks, load_reviews, write_table)
+from llm_rate_limiting import TokenBucket, retry_with_backoff
+from llm_cache import add_llm_cache_arguments, open_llm_cache
+from pipeline_metrics import add_metrics_arguments, stage, start_run
+from async_sessions import client_session, run_async
+import asyncio
 import json
+from collections import Counter
+from contextlib import AsyncExitStack
 from datetime import datetime
 
-# Download necessary NLTK data
-nltk.download('punkt', quiet=True)
-nltk.download('averaged_perceptron_tagger', quiet=True)
-nltk.download('wordnet', quiet=True)
-nltk.download('stopwords', quiet=True)
+OUTPUT_COLUMNS = ['review_body', 'star_rating', 'product_id', 'product_title', 'aspect', 'keywords', 'sentiment']
 
-# Initialize lemmatizer and stopwords
-lemmatizer = WordNetLemmatizer()
-stop_words = set(stopwords.words('english'))
+POSITIVE_WORDS = ['good', 'great', 'excellent', 'amazing', 'love', 'best']
+NEGATIVE_WORDS = ['bad', 'poor', 'terrible', 'awful', 'hate', 'worst']
+
+OPENAI_MODEL = "gpt-3.5-turbo"  # You can change this to "gpt-4" if you have access
+OPENAI_TEMPERATURE = 0.3
+BATCH_MODES = ['sample', 'fixed', 'product']
+# Reviews included in one prompt; batched prompts are never larger, so no review is left out
+PROMPT_SAMPLE_SIZE = 100
 
 VALID_ASPECTS = ['phone', 'price', 'camera', 'battery', 'display', 'design', 'software', 'cpu/gpu', 'memory', 'network']
 
-# Initialize OpenAI client
-client = OpenAI()  # Replace with your actual API key
+# OpenAI clients by base URL, each created on first use; None uses OPENAI_BASE_URL or the OpenAI API
+_clients = {}
+
+
+def get_client(base_url=None):
+    if base_url not in _clients:
+        from openai import OpenAI
+        _clients[base_url] = OpenAI(base_url=base_url)
+    return _clients[base_url]
+
 
 def preprocess_text(text):
-    if pd.isna(text):
-        return ""
-    words = nltk.word_tokenize(str(text).lower())
-    tagged_words = nltk.pos_tag(words)
-    processed_words = [lemmatizer.lemmatize(word) for word, tag in tagged_words
-                       if (tag.startswith('JJ') or tag.startswith('NN')) and word not in stop_words]
-    return ' '.join(processed_words)
-
-def get_aspects_from_openai(reviews):
-    prompt = f"""
+    return preprocess_batch([text], ADJECTIVES_AND_NOUNS)[0]
+
+
+def build_aspect_prompt(reviews):
+    return f"""
     You are an expert in analyzing product reviews and extracting key aspects of products. 
     I have a collection of product reviews, and I need you to identify the aspects discussed in these reviews.
     You MUST ONLY use the following aspect categories:
@@ -55,7 +67,7 @@ def get_aspects_from_openai(reviews):
 
     Here's a sample of the reviews:
 
-    {' '.join(reviews[:100])}  # Sending a sample of 100 reviews to keep the prompt manageable
+    {' '.join(reviews[:PROMPT_SAMPLE_SIZE])}  # Sending a sample of 100 reviews to keep the prompt manageable
 
     Please format your response ONLY as a JSON object with the following structure, without any additional text:
     {{
@@ -71,38 +83,169 @@ def get_aspects_from_openai(reviews):
     Ensure that all aspects from the provided list are included in your response, even if they have neutral sentiment and generic keywords.
     """
 
+
+def chat_request(prompt):
+    return dict(
+        model=OPENAI_MODEL,
+        messages=[
+            {"role": "system", "content": "You are a product review analysis expert."},
+            {"role": "user", "content": prompt}
+        ],
+        temperature=OPENAI_TEMPERATURE,
+        max_tokens=1000
+    )
+
+
+def parse_aspects_response(result):
     try:
-        response = client.chat.completions.create(
-            model="gpt-3.5-turbo",  # You can change this to "gpt-4" if you have access
-            messages=[
-                {"role": "system", "content": "You are a product review analysis expert."},
-                {"role": "user", "content": prompt}
-            ],
-            temperature=0.3,
-            max_tokens=1000
-        )
-
-        result = response.choices[0].message.content
-        print("Raw response from OpenAI:")
+        aspects_data = json.loads(result)
+        if 'aspects' in aspects_data:
+            return aspects_data['aspects']
+        else:
+            print("Error: 'aspects' key not found in the JSON response.")
+            print("JSON content:")
+            print(aspects_data)
+    except json.JSONDecodeError as e:
+        print(f"JSON Decode Error: {str(e)}")
+        print("Full response:")
         print(result)
+    return []
+
+
+def get_aspects_from_openai(reviews, cache=None, base_url=None):
+    prompt = build_aspect_prompt(reviews)
+    try:
+        result = cache.get('openai', OPENAI_MODEL, OPENAI_TEMPERATURE, prompt) if cache is not None else None
+        if result is None:
+            response = get_client(base_url).chat.completions.create(**chat_request(prompt))
+            result = response.choices[0].message.content
 
-        try:
-            aspects_data = json.loads(result)
-            if 'aspects' in aspects_data:
-                return aspects_data['aspects']
-            else:
-                print("Error: 'aspects' key not found in the JSON response.")
-                print("JSON content:")
-                print(aspects_data)
-        except json.JSONDecodeError as e:
-            print(f"JSON Decode Error: {str(e)}")
-            print("Full response:")
-            print(result)
+        print("Raw response from OpenAI:")
+        print(result)
+        aspects = parse_aspects_response(result)
+        # Only keep answers we could use, so a malformed one is asked for again next time
+        if aspects and cache is not None:
+            cache.put('openai', OPENAI_MODEL, OPENAI_TEMPERATURE, prompt, result)
+        return aspects
     except Exception as e:
         print(f"OpenAI API Error: {str(e)}")
 
     return []
 
+
+def partition_reviews(df, batch_mode, batch_size):
+    # Split the whole dataset into prompts of at most batch_size reviews, optionally never mixing products
+    if batch_mode == 'product':
+        groups = (group['processed_text'].tolist() for _, group in df.groupby('product_id', observed=True, sort=False))
+    else:
+        groups = [df['processed_text'].tolist()]
+    return [reviews[start:start + batch_size] for reviews in groups for start in range(0, len(reviews), batch_size)]
+
+
+def merge_aspects(batch_results):
+    # Reconcile per-batch answers: most frequent keywords and a review-weighted sentiment vote per aspect
+    keyword_counts = {}
+    sentiment_votes = {}
+    for aspects, n_reviews in batch_results:
+        for aspect in aspects:
+            name = str(aspect.get('name', '')).lower()
+            if name not in VALID_ASPECTS:
+                continue
+            keyword_counts.setdefault(name, Counter()).update(
+                keyword.lower() for keyword in aspect.get('keywords', []))
+            sentiment_votes.setdefault(name, Counter())[aspect.get('sentiment', 'neutral')] += n_reviews
+
+    return [{'name': name,
+             'keywords': [keyword for keyword, _ in keyword_counts[name].most_common(5)],
+             'sentiment': sentiment_votes[name].most_common(1)[0][0]}
+            for name in VALID_ASPECTS if name in keyword_counts]
+
+
+def _is_retryable(error):
+    import openai
+    return isinstance(error, (openai.RateLimitError, openai.InternalServerError, openai.APIConnectionError))
+
+
+def _retry_after(error):
+    response = getattr(error, 'response', None)
+    try:
+        return float(response.headers.get('retry-after'))
+    except (AttributeError, TypeError, ValueError):
+        return None
+
+
+async def _request_batch_aspects(get_async_client, reviews, bucket, semaphore, max_retries, cache):
+    prompt = build_aspect_prompt(reviews)
+
+    async def request():
+        await bucket.acquire()
+        response = await (await get_async_client()).chat.completions.create(**chat_request(prompt))
+        return response.choices[0].message.content
+
+    try:
+        result = cache.get('openai', OPENAI_MODEL, OPENAI_TEMPERATURE, prompt) if cache is not None else None
+        if result is None:
+            async with semaphore:
+                result = await retry_with_backoff(request, _is_retryable, max_retries=max_retries,
+                                                  retry_after=_retry_after)
+    except Exception as e:
+        print(f"OpenAI API Error: {str(e)}")
+        return [], len(reviews)
+
+    aspects = parse_aspects_response(result)
+    if aspects and cache is not None:
+        cache.put('openai', OPENAI_MODEL, OPENAI_TEMPERATURE, prompt, result)
+    return aspects, len(reviews)
+
+
+async def _get_batched_aspects(batches, concurrency, requests_per_minute, max_retries, base_url, cache):
+    async def open_client():
+        from openai import AsyncOpenAI
+
+        # max_retries=0 leaves retrying to our own backoff, which shares the rate limiter
+        return AsyncOpenAI(base_url=base_url, max_retries=0)
+
+    bucket = TokenBucket(requests_per_minute / 60, capacity=concurrency)
+    semaphore = asyncio.Semaphore(concurrency)
+    async with AsyncExitStack() as stack:
+        # The client is only created on the first cache miss, so a run served from the cache (e.g. --replay)
+        # needs no API key
+        client = None
+        lock = asyncio.Lock()
+
+        async def get_async_client():
+            nonlocal client
+            async with lock:
+                if client is None:
+                    client = await stack.enter_async_context(client_session(('openai', base_url), open_client))
+            return client
+
+        return await asyncio.gather(*(_request_batch_aspects(get_async_client, reviews, bucket, semaphore,
+                                                             max_retries, cache)
+                                      for reviews in batches))
+
+
+def get_aspects_from_openai_batched(df, batch_mode='fixed', batch_size=100, concurrency=8, requests_per_minute=500,
+                                    max_retries=5, base_url=None, cache=None):
+    batches = partition_reviews(df, batch_mode, batch_size)
+    print(f"Sending {len(batches)} batches to OpenAI with up to {concurrency} concurrent requests...")
+    batch_results = run_async(_get_batched_aspects(batches, concurrency, requests_per_minute, max_retries, base_url,
+                                                   cache))
+    failed = sum(1 for aspects, _ in batch_results if not aspects)
+    if failed:
+        print(f"{failed} of {len(batches)} batches returned no aspects")
+    return merge_aspects(batch_results)
+
+
+def extract_aspects(df, args):
+    with open_llm_cache(args) as cache:
+        if args.batch_mode == 'sample':
+            return get_aspects_from_openai(df['processed_text'].tolist(), cache, args.openai_base_url)
+        return get_aspects_from_openai_batched(df, args.batch_mode, args.batch_size, args.concurrency,
+                                               args.requests_per_minute, args.max_retries, args.openai_base_url,
+                                               cache)
+
+
 def assign_aspect_to_review(review, aspects):
     max_overlap = 0
     assigned_aspect = VALID_ASPECTS[0]  # Default to first aspect
@@ -118,10 +261,8 @@ def assign_aspect_to_review(review, aspects):
 
     # Determine sentiment based on review content if no clear sentiment was assigned
     if assigned_sentiment == 'neutral':
-        positive_words = ['good', 'great', 'excellent', 'amazing', 'love', 'best']
-        negative_words = ['bad', 'poor', 'terrible', 'awful', 'hate', 'worst']
-        positive_count = sum(1 for word in positive_words if word in review.lower())
-        negative_count = sum(1 for word in negative_words if word in review.lower())
+        positive_count = sum(1 for word in POSITIVE_WORDS if word in review.lower())
+        negative_count = sum(1 for word in NEGATIVE_WORDS if word in review.lower())
         if positive_count > negative_count:
             assigned_sentiment = 'positive'
         elif negative_count > positive_count:
@@ -129,82 +270,181 @@ def assign_aspect_to_review(review, aspects):
 
     return assigned_aspect, assigned_keywords, assigned_sentiment
 
-def main():
-    # Get the input filename from the user
-    input_filename = input("Please enter the name of your input TSV file (including .tsv extension): ")
 
-    # Start overall timing
-    overall_start_time = time.time()
+def print_aspects(aspects):
+    print("\nIdentified Aspects:")
+    for i, aspect in enumerate(aspects):
+        print(f"Aspect: {aspect['name']}")
+        print(f"Keywords: {', '.join(aspect['keywords'])}")
+        print(f"Sentiment: {aspect['sentiment']}")
+        print()
+
+
+def assign_aspects(df, aspects):
+    # Vectorized equivalent of assign_aspect_to_review over the whole column
+    texts = df['processed_text']
+    best, max_overlap = best_keyword_match(texts, [aspect['keywords'] for aspect in aspects], lowercase=True)
+    matched = max_overlap > 0
+
+    default_keywords = ', '.join(aspects[0]['keywords'])  # Use default keywords if none assigned
+    names = np.array([aspect['name'] for aspect in aspects], dtype=object)
+    keywords = np.array([', '.join(aspect['keywords']) if aspect['keywords'] else default_keywords
+                         for aspect in aspects], dtype=object)
+    sentiments = np.array([aspect['sentiment'] for aspect in aspects], dtype=object)
+
+    aspect = np.where(matched, names[best], VALID_ASPECTS[0])
+    sentiment = np.where(matched, sentiments[best], 'neutral').astype(object)
 
+    # Determine sentiment from the review wording where no clear sentiment was assigned
+    word_counts = keyword_overlap_scores(texts, [POSITIVE_WORDS, NEGATIVE_WORDS], lowercase=True)
+    neutral = sentiment == 'neutral'
+    sentiment[neutral & (word_counts[:, 0] > word_counts[:, 1])] = 'positive'
+    sentiment[neutral & (word_counts[:, 1] > word_counts[:, 0])] = 'negative'
+
+    df['aspect'] = aspect
+    df['keywords'] = np.where(matched, keywords[best], default_keywords)
+    df['sentiment'] = sentiment
+
+
+def print_sentiment_distribution(sentiment_counts, total):
+    print("\nSentiment Distribution:")
+    for sentiment, count in sentiment_counts.items():
+        print(f"{sentiment}: {count} ({count/total*100:.2f}%)")
+
+
+def run_streaming(args, input_filename, output_filename):
+    aspects = None
+    sentiment_counts = pd.Series(dtype='int64')
+    with stage('stream') as metrics, open_cache(args) as cache, \
+            ResultWriter(output_filename, OUTPUT_COLUMNS) as writer:
+        for chunk in iter_review_chunks(input_filename, args.stream_chunk_size):
+            chunk['processed_text'] = preprocess_series(chunk['review_body'], ADJECTIVES_AND_NOUNS,
+                                                        workers=args.workers, chunk_size=args.chunk_size, cache=cache)
+
+            # The prompt only samples the first reviews, so aspects come from the first chunk
+            if aspects is None:
+                with stage('llm', rows=len(chunk)):
+                    print("Getting aspects from OpenAI...")
+                    aspects = extract_aspects(chunk, args)
+                if not aspects:
+                    print("Failed to get aspects from OpenAI. Exiting.")
+                    return
+                print_aspects(aspects)
+
+            assign_aspects(chunk, aspects)
+            writer.write(chunk)
+            sentiment_counts = sentiment_counts.add(chunk['sentiment'].value_counts(), fill_value=0)
+            metrics['rows'] = writer.rows_written
+            print(f"Processed {writer.rows_written} reviews")
+
+    print(f"Saved {writer.rows_written} rows to {output_filename}")
+    if writer.rows_written:
+        print_sentiment_distribution(sentiment_counts.astype(int), writer.rows_written)
+    return output_filename
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(description="Assign product aspects to reviews with OpenAI.")
+    parser.add_argument('input_filename', help='Input review file (TSV, CSV, Parquet or Arrow)')
+    add_preprocessing_arguments(parser)
+    add_streaming_arguments(parser)
+    add_output_format_argument(parser)
+    add_llm_cache_arguments(parser)
+    add_metrics_arguments(parser)
+    parser.add_argument('--batch-mode', choices=BATCH_MODES, default='sample',
+                        help="'sample' sends the first 100 reviews in one prompt; 'fixed' and 'product' send every "
+                             "review in concurrent batches and merge the answers (default: %(default)s)")
+    parser.add_argument('--batch-size', type=int, default=PROMPT_SAMPLE_SIZE,
+                        help=f'Reviews per batched prompt, at most {PROMPT_SAMPLE_SIZE} (default: %(default)s)')
+    parser.add_argument('--concurrency', type=int, default=8,
+                        help='Maximum concurrent OpenAI requests (default: %(default)s)')
+    parser.add_argument('--requests-per-minute', type=float, default=500,
+                        help='Rate limit for batched requests (default: %(default)s)')
+    parser.add_argument('--max-retries', type=int, default=5,
+                        help='Retries with exponential backoff on 429/5xx/connection errors (default: %(default)s)')
+    parser.add_argument('--openai-base-url', default=None,
+                        help='OpenAI-compatible endpoint to send requests to, e.g. a local stub server')
+    return parser
+
+
+def check_args(parser, args):
+    if not 1 <= args.batch_size <= PROMPT_SAMPLE_SIZE:
+        parser.error(f'--batch-size must be between 1 and {PROMPT_SAMPLE_SIZE}, the number of reviews a prompt holds')
+    return args
+
+
+def parse_args(argv=None):
+    parser = build_parser()
+    return check_args(parser, parser.parse_args(argv))
+
+
+def run_full(args, input_filename, output_filename):
     # Load data into DataFrame
-    print("Loading data...")
-    load_start_time = time.time()
-    df = pd.read_csv(input_filename, sep='\t', usecols=['review_body', 'star_rating', 'product_id', 'product_title'])
-    df = df.dropna(subset=['review_body', 'product_id', 'product_title']).reset_index(drop=True)
-    load_end_time = time.time()
-    print(f"Data loaded and cleaned. Shape: {df.shape}")
-    print(f"Time taken to load data: {load_end_time - load_start_time:.2f} seconds")
+    with stage('load') as metrics:
+        print("Loading data...")
+        df = load_reviews(input_filename)
+        print(f"Data loaded and cleaned. Shape: {df.shape}")
+        metrics['rows'] = len(df)
 
     # Process all text data at once
-    print("Processing text data...")
-    preprocess_start_time = time.time()
-    df['processed_text'] = df['review_body'].apply(preprocess_text)
-    preprocess_end_time = time.time()
-    print(f"Time taken to preprocess text: {preprocess_end_time - preprocess_start_time:.2f} seconds")
+    with stage('preprocess', rows=len(df)):
+        print("Processing text data...")
+        with open_cache(args) as cache:
+            df['processed_text'] = preprocess_series(df['review_body'], ADJECTIVES_AND_NOUNS, workers=args.workers,
+                                                     chunk_size=args.chunk_size, cache=cache)
 
     # Get aspects from OpenAI
-    print("Getting aspects from OpenAI...")
-    openai_start_time = time.time()
-    aspects = get_aspects_from_openai(df['processed_text'].tolist())
-    openai_end_time = time.time()
-    print(f"Time taken to get aspects from OpenAI: {openai_end_time - openai_start_time:.2f} seconds")
+    with stage('llm', rows=len(df)):
+        print("Getting aspects from OpenAI...")
+        aspects = extract_aspects(df, args)
 
     if not aspects:
         print("Failed to get aspects from OpenAI. Exiting.")
         return
 
     # Print aspects
-    print("\nIdentified Aspects:")
-    for i, aspect in enumerate(aspects):
-        print(f"Aspect: {aspect['name']}")
-        print(f"Keywords: {', '.join(aspect['keywords'])}")
-        print(f"Sentiment: {aspect['sentiment']}")
-        print()
+    print_aspects(aspects)
+
+    with stage('assign', rows=len(df)):
+        print("Assigning aspects to reviews...")
+        assign_aspects(df, aspects)
+
+    # Save results
+    with stage('save', rows=len(df)):
+        print("Saving results...")
+        write_table(df[OUTPUT_COLUMNS], output_filename)
 
-    print("Assigning aspects to reviews...")
-    assign_start_time = time.time()
-    df['aspect'], df['keywords'], df['sentiment'] = zip(
-        *df['processed_text'].apply(lambda x: assign_aspect_to_review(x, aspects)))
-    df['keywords'] = df['keywords'].apply(
-        lambda x: ', '.join(x) if x else ', '.join(aspects[0]['keywords']))  # Use default keywords if none assigned
-    assign_end_time = time.time()
-    print(f"Time taken to assign aspects: {assign_end_time - assign_start_time:.2f} seconds")
+    # Display a sample of the results
+    print("\nSample results:")
+    print(df[OUTPUT_COLUMNS].head())
+
+    # Print sentiment distribution
+    print_sentiment_distribution(df['sentiment'].value_counts(), len(df))
+    return output_filename
 
+
+def run(args):
     # Generate output filename with timestamp
-    input_base = os.path.splitext(input_filename)[0]
+    input_base = os.path.splitext(args.input_filename)[0]
     timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-    output_filename = f'openai_aspect_modeling_results_{input_base}_{timestamp}.csv'
+    output_filename = f'openai_aspect_modeling_results_{input_base}_{timestamp}.{args.output_format}'
 
-    # Save results to CSV
-    print("Saving results...")
-    save_start_time = time.time()
-    df[['review_body', 'star_rating', 'product_id', 'product_title', 'aspect', 'keywords', 'sentiment']].to_csv(output_filename, index=False)
-    save_end_time = time.time()
-    print(f"Time taken to save results: {save_end_time - save_start_time:.2f} seconds")
+    # Returns the results file, or None when no aspects could be obtained
+    with start_run('openai_aspect_modeling', args):
+        if args.stream:
+            return run_streaming(args, args.input_filename, output_filename)
+        return run_full(args, args.input_filename, output_filename)
 
-    # Overall execution time
-    overall_end_time = time.time()
-    print(f"\nTotal execution time: {overall_end_time - overall_start_time:.2f} seconds")
 
-    # Display a sample of the results
-    print("\nSample results:")
-    print(df[['review_body', 'star_rating', 'product_id', 'product_title', 'aspect', 'keywords', 'sentiment']].head())
+def extract_review_aspects(input_filename, **options):
+    # Python entry point; options use the flag names, e.g. extract_review_aspects('x.tsv', batch_mode='fixed')
+    parser = build_parser()
+    return run(check_args(parser, args_from_options(parser, input_filename, options)))
+
+
+def main(argv=None):
+    run(parse_args(argv))
 
-    # Print sentiment distribution
-    print("\nSentiment Distribution:")
-    sentiment_counts = df['sentiment'].value_counts()
-    for sentiment, count in sentiment_counts.items():
-        print(f"{sentiment}: {count} ({count/len(df)*100:.2f}%)")
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    main()
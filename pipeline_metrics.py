@@ -0,0 +1,200 @@
+import cProfile
+import glob
+import json
+import os
+import resource
+import sys
+import threading
+import time
+from contextlib import contextmanager
+from datetime import datetime
+
+DEFAULT_REPORT_DIR = 'run_reports'
+RSS_SAMPLE_SECONDS = 0.05
+
+# The run the module-level stage() helper records into; None when the caller did not start one
+_current_run = None
+
+
+def peak_rss_mb(who=resource.RUSAGE_SELF):
+    # ru_maxrss is in kilobytes on Linux and in bytes on macOS
+    peak = resource.getrusage(who).ru_maxrss
+    return peak / 1024 ** 2 if sys.platform == 'darwin' else peak / 1024
+
+
+def _rss_mb(pid='self'):
+    # Current resident set size from /proc; None once the process is gone, or where there is no /proc
+    try:
+        with open(f'/proc/{pid}/statm') as f:
+            return int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE') / 1024 ** 2
+    except (OSError, ValueError, IndexError):
+        return None
+
+
+def _workers_rss_mb():
+    # Combined resident size of every process started below this one, e.g. a preprocessing or LDA pool
+    total = 0
+    pending = [os.getpid()]
+    while pending:
+        for path in glob.glob(f'/proc/{pending.pop()}/task/*/children'):
+            try:
+                with open(path) as f:
+                    children = f.read().split()
+            except OSError:
+                continue
+            for child in children:
+                total += _rss_mb(child) or 0
+                pending.append(child)
+    return total
+
+
+class RssSampler(threading.Thread):
+    # Samples resident memory while a stage runs, since ru_maxrss only gives the peak of the whole process so far
+    def __init__(self, interval=RSS_SAMPLE_SECONDS):
+        super().__init__(daemon=True)
+        self.interval = interval
+        self.peak_mb = 0
+        self.worker_peak_mb = 0
+        self._done = threading.Event()
+
+    @staticmethod
+    def available():
+        return _rss_mb() is not None
+
+    def sample(self):
+        self.peak_mb = max(self.peak_mb, _rss_mb() or 0)
+        self.worker_peak_mb = max(self.worker_peak_mb, _workers_rss_mb())
+
+    def run(self):
+        while not self._done.wait(self.interval):
+            self.sample()
+
+    def start(self):
+        self.sample()
+        super().start()
+
+    def stop(self):
+        self._done.set()
+        self.join()
+        self.sample()
+        return self.peak_mb, self.worker_peak_mb
+
+
+def _cpu_seconds(who):
+    usage = resource.getrusage(who)
+    return usage.ru_utime + usage.ru_stime
+
+
+class RunMetrics:
+    # Wall time, CPU time, peak memory and throughput for each named stage of one script run
+    def __init__(self, script, args=None, report_dir=DEFAULT_REPORT_DIR, save_report=True, profile_stage=None):
+        self.script = script
+        self.args = dict(vars(args)) if args is not None else {}
+        self.report_dir = report_dir
+        self.save_report = save_report
+        self.profile_stage = profile_stage
+        self.run_id = datetime.now().strftime('%Y%m%d_%H%M%S')
+        self.started_at = time.time()
+        self.start_time = time.perf_counter()
+        self.stages = []
+        self.status = 'ok'
+
+    @contextmanager
+    def stage(self, name, rows=None):
+        # Yields the stage record, so the row count can be filled in once it is known
+        record = {'stage': name, 'rows': rows}
+        profiler = cProfile.Profile() if name == self.profile_stage else None
+        sampler = RssSampler() if RssSampler.available() else None
+        if sampler is not None:
+            sampler.start()
+        cpu_start = _cpu_seconds(resource.RUSAGE_SELF)
+        worker_cpu_start = _cpu_seconds(resource.RUSAGE_CHILDREN)
+        wall_start = time.perf_counter()
+        if profiler is not None:
+            profiler.enable()
+        try:
+            yield record
+        finally:
+            if profiler is not None:
+                profiler.disable()
+            wall = time.perf_counter() - wall_start
+            record['wall_seconds'] = wall
+            record['cpu_seconds'] = _cpu_seconds(resource.RUSAGE_SELF) - cpu_start
+            record['worker_cpu_seconds'] = _cpu_seconds(resource.RUSAGE_CHILDREN) - worker_cpu_start
+            # Sampled during the stage; None where there is no /proc, leaving only the high-water mark of the
+            # whole run so far
+            record['peak_rss_mb'], record['worker_peak_rss_mb'] = sampler.stop() if sampler else (None, None)
+            record['cumulative_peak_rss_mb'] = peak_rss_mb()
+            record['rows_per_second'] = record['rows'] / wall if record['rows'] and wall > 0 else None
+            if profiler is not None:
+                record['profile'] = self._dump_profile(profiler, name)
+            self.stages.append(record)
+
+    def _dump_profile(self, profiler, name):
+        os.makedirs(self.report_dir, exist_ok=True)
+        path = os.path.join(self.report_dir, f'{self.script}_{self.run_id}_{name}.prof')
+        profiler.dump_stats(path)
+        print(f"Saved profile of stage '{name}' to {path}")
+        return path
+
+    def summary(self):
+        return {'script': self.script, 'run_id': self.run_id, 'status': self.status, 'started_at': self.started_at,
+                'total_wall_seconds': time.perf_counter() - self.start_time, 'peak_rss_mb': peak_rss_mb(),
+                'worker_peak_rss_mb': peak_rss_mb(resource.RUSAGE_CHILDREN), 'args': self.args,
+                'stages': self.stages}
+
+    def print_summary(self):
+        print(f"\n{'stage':<14}{'wall s':>9}{'cpu s':>9}{'worker s':>10}{'peak MB':>10}{'rows/s':>12}")
+        for record in self.stages:
+            rate = f"{record['rows_per_second']:.0f}" if record['rows_per_second'] else '-'
+            peak = f"{record['peak_rss_mb']:.1f}" if record['peak_rss_mb'] is not None else '-'
+            print(f"{record['stage']:<14}{record['wall_seconds']:>9.2f}{record['cpu_seconds']:>9.2f}"
+                  f"{record['worker_cpu_seconds']:>10.2f}{peak:>10}{rate:>12}")
+        print(f"\nTotal execution time: {time.perf_counter() - self.start_time:.2f} seconds")
+
+    def write_report(self):
+        os.makedirs(self.report_dir, exist_ok=True)
+        path = os.path.join(self.report_dir, f'{self.script}_{self.run_id}.json')
+        with open(path, 'w') as f:
+            json.dump(self.summary(), f, indent=2, default=str)
+        print(f"Saved run report to {path}")
+        return path
+
+    def __enter__(self):
+        global _current_run
+        _current_run = self
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        global _current_run
+        _current_run = None
+        if exc_type is not None:
+            self.status = 'failed' if exc_type is not SystemExit else 'exited'
+        self.print_summary()
+        if self.save_report:
+            self.write_report()
+        return False
+
+
+@contextmanager
+def stage(name, rows=None):
+    # Records into the active run, or just runs the block when there is none
+    if _current_run is None:
+        yield {'stage': name, 'rows': rows}
+    else:
+        with _current_run.stage(name, rows) as record:
+            yield record
+
+
+def start_run(script, args):
+    return RunMetrics(script, args, report_dir=args.run_report_dir, save_report=not args.no_run_report,
+                      profile_stage=args.profile_stage)
+
+
+def add_metrics_arguments(parser):
+    parser.add_argument('--run-report-dir', default=DEFAULT_REPORT_DIR,
+                        help='Directory for the JSON run report and profiles (default: %(default)s)')
+    parser.add_argument('--no-run-report', action='store_true', help="Don't write the JSON run report")
+    parser.add_argument('--profile-stage', default=None,
+                        help='Run this stage (e.g. preprocess, fit) under cProfile and save a .prof file; for a '
+                             'sampling profile of the whole run use py-spy record instead')
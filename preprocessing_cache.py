@@ -0,0 +1,94 @@
+import hashlib
+import sqlite3
+import time
+
+DEFAULT_CACHE_PATH = 'preprocessing_cache.sqlite3'
+DEFAULT_MAX_MB = 1024
+
+# Stay below SQLite's limit on bound parameters per statement
+_QUERY_BATCH_SIZE = 500
+
+
+def cache_key(text, config):
+    return hashlib.sha1(f"{config}\0{text}".encode('utf-8')).hexdigest()
+
+
+class PreprocessingCache:
+    def __init__(self, path=DEFAULT_CACHE_PATH, max_mb=DEFAULT_MAX_MB):
+        self.path = path
+        self.max_bytes = int(max_mb * 1024 * 1024)
+        self.hits = 0
+        self.misses = 0
+        self.conn = sqlite3.connect(path)
+        self.conn.execute('PRAGMA journal_mode=WAL')
+        self.conn.execute('PRAGMA synchronous=NORMAL')
+        self.conn.execute("""
+            CREATE TABLE IF NOT EXISTS processed_text (
+                key TEXT PRIMARY KEY,
+                value TEXT NOT NULL,
+                size INTEGER NOT NULL,
+                last_used REAL NOT NULL
+            )
+        """)
+        self.conn.execute('CREATE INDEX IF NOT EXISTS idx_processed_text_last_used ON processed_text (last_used)')
+
+    def get_many(self, keys):
+        found = {}
+        for start in range(0, len(keys), _QUERY_BATCH_SIZE):
+            batch = keys[start:start + _QUERY_BATCH_SIZE]
+            placeholders = ','.join('?' * len(batch))
+            rows = self.conn.execute(f'SELECT key, value FROM processed_text WHERE key IN ({placeholders})', batch)
+            found.update(rows)
+
+        # Refresh the access time of everything we served so eviction is least-recently-used
+        now = time.time()
+        self.conn.executemany('UPDATE processed_text SET last_used = ? WHERE key = ?', ((now, key) for key in found))
+        self.conn.commit()
+
+        self.hits += len(found)
+        self.misses += len(keys) - len(found)
+        return found
+
+    def put_many(self, items):
+        now = time.time()
+        self.conn.executemany('INSERT OR REPLACE INTO processed_text (key, value, size, last_used) VALUES (?, ?, ?, ?)',
+                              ((key, value, len(key) + len(value.encode('utf-8')), now) for key, value in items))
+        self.conn.commit()
+
+    def size_bytes(self):
+        return self.conn.execute('SELECT COALESCE(SUM(size), 0) FROM processed_text').fetchone()[0]
+
+    def evict(self):
+        excess = self.size_bytes() - self.max_bytes
+        if excess <= 0:
+            return 0
+
+        # Drop the least recently used entries until we are back under the limit
+        freed = 0
+        keys = []
+        for key, size in self.conn.execute('SELECT key, size FROM processed_text ORDER BY last_used').fetchall():
+            if freed >= excess:
+                break
+            keys.append((key,))
+            freed += size
+        self.conn.executemany('DELETE FROM processed_text WHERE key = ?', keys)
+        self.conn.commit()
+        return len(keys)
+
+    def report(self):
+        total = self.hits + self.misses
+        hit_rate = self.hits / total * 100 if total else 0
+        print(f"Preprocessing cache: {self.hits} hits, {self.misses} misses ({hit_rate:.2f}% hit rate)")
+
+    def close(self):
+        evicted = self.evict()
+        if evicted:
+            print(f"Preprocessing cache: evicted {evicted} entries to stay under {self.max_bytes // (1024 * 1024)} MB")
+        self.conn.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.report()
+        self.close()
@@ -1,6 +1,7 @@
 import React, { useState, useEffect } from 'react';
 import { useAuth } from '../context/AuthContext';
 import axios from 'axios';
+import { fetchAllPages } from '../fetchAllPages';
 import {
   Button, Box, Typography, List, ListItem, ListItemText, TextField
 } from '@mui/material';
@@ -19,11 +20,11 @@ function AdminDashboard() {
   const fetchProducts = async () => {
     console.log("Fetching all products");
     try {
-      const response = await axios.get('http://localhost:8000/api/products/', {
+      const products = await fetchAllPages('http://localhost:8000/api/products/', {
         headers: { Authorization: `Bearer ${localStorage.getItem('token')}` }
       });
-      console.log("Products fetched:", response.data);
-      setProducts(response.data);
+      console.log("Products fetched:", products);
+      setProducts(products);
     } catch (error) {
       console.error('Error fetching products', error);
     }
@@ -85,4 +86,4 @@ function AdminDashboard() {
   );
 }
 
-export default AdminDashboard;
\ No newline at end of file
+export default AdminDashboard;
@@ -1,5 +1,6 @@
 import React, { useState, useEffect } from 'react';
 import axios from 'axios';
+import { fetchAllPages } from '../fetchAllPages';
 import { List, ListItem, ListItemText, Button, TextField, Box } from '@mui/material';
 
 function ProductList() {
@@ -12,10 +13,10 @@ function ProductList() {
 
   const fetchProducts = async () => {
     try {
-      const response = await axios.get('http://localhost:8000/api/products/', {
+      const products = await fetchAllPages('http://localhost:8000/api/products/', {
         headers: { Authorization: `Bearer ${localStorage.getItem('token')}` }
       });
-      setProducts(response.data);
+      setProducts(products);
     } catch (error) {
       console.error('Error fetching products', error);
     }
@@ -67,4 +68,4 @@ function ProductList() {
   );
 }
 
-export default ProductList;
\ No newline at end of file
+export default ProductList;
@@ -2,6 +2,7 @@ import React, { useState, useEffect } from 'react';
 import { useAuth } from '../context/AuthContext';
 import { useApiKey } from '../context/ApiKeyContext';
 import axios from 'axios';
+import { fetchAllPages } from '../fetchAllPages';
 import { OpenAI } from 'openai';
 import {
   Button, Box, Typography, List, ListItem, ListItemText, Dialog,
@@ -39,10 +40,10 @@ function UserDashboard() {
 
   const fetchAllProducts = async () => {
     try {
-      const response = await axios.get('http://localhost:8000/api/products/', {
+      const products = await fetchAllPages('http://localhost:8000/api/products/?fields=id,name&page_size=1000', {
         headers: { Authorization: `Bearer ${localStorage.getItem('token')}` }
       });
-      setAllProducts(response.data);
+      setAllProducts(products);
     } catch (error) {
       console.error('Error fetching all products', error);
     }
@@ -281,4 +282,4 @@ const handleSaveEdit = async () => {
   );
 }
 
-export default UserDashboard;
\ No newline at end of file
+export default UserDashboard;
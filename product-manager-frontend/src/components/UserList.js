@@ -1,5 +1,6 @@
 import React, { useState, useEffect } from 'react';
 import axios from 'axios';
+import { fetchAllPages } from '../fetchAllPages';
 import { List, ListItem, ListItemText, Button, TextField, Box } from '@mui/material';
 
 function UserList() {
@@ -12,10 +13,10 @@ function UserList() {
 
   const fetchUsers = async () => {
     try {
-      const response = await axios.get('http://localhost:8000/api/users/', {
+      const users = await fetchAllPages('http://localhost:8000/api/users/', {
         headers: { Authorization: `Bearer ${localStorage.getItem('token')}` }
       });
-      setUsers(response.data);
+      setUsers(users);
     } catch (error) {
       console.error('Error fetching users', error);
     }
@@ -71,4 +72,4 @@ function UserList() {
   );
 }
 
-export default UserList;
\ No newline at end of file
+export default UserList;
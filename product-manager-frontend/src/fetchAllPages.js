@@ -0,0 +1,13 @@
+import axios from 'axios';
+
+// The list endpoints are cursor paginated; follow `next` until the last page and return every result
+export async function fetchAllPages(url, config) {
+  const results = [];
+  let nextUrl = url;
+  while (nextUrl) {
+    const response = await axios.get(nextUrl, config);
+    results.push(...response.data.results);
+    nextUrl = response.data.next;
+  }
+  return results;
+}
@@ -1,61 +1,118 @@
 import pandas as pd
+import matplotlib
+matplotlib.use('Agg')
 import matplotlib.pyplot as plt
+from matplotlib.figure import Figure
 import numpy as np
 import sys
+import os
+import argparse
+import json
+import multiprocessing
+import sqlite3
+from functools import partial
+from review_io import args_from_options, read_table
+from pipeline_metrics import add_metrics_arguments, stage, start_run
 
+GAUGE_FORMATS = ['png', 'svg', 'json']
+N_COLS = 3
+NEEDLE_WIDTH = np.deg2rad(2)
 
-def calculate_product_topic_scores(csv_file_path, product_id):
-    df = pd.read_csv(csv_file_path)
+# The colored dial background is the same for every gauge, so compute it once
+BACKGROUND_THETA = np.deg2rad(np.linspace(0, 180, 100))
+BACKGROUND_COLORS = plt.cm.RdYlGn(plt.Normalize(1, 5)(np.linspace(1, 5, 100)))
 
-    # Filter for the specific product
-    df_product = df[df['product_id'] == product_id]
 
-    if df_product.empty:
-        print(f"No data found for product ID: {product_id}")
-        sys.exit(1)
+def calculate_topic_scores(df):
+    # One groupby pass over all products instead of one scan per product
+    topic_scores = df.groupby(['product_id', 'topic_name'], observed=True)['star_rating'].agg(
+        ['mean', 'count']).reset_index()
+    topic_scores.columns = ['product_id', 'topic_name', 'avg_rating', 'review_count']
 
-    # Group by topic_name and calculate mean star_rating
-    product_topic_scores = df_product.groupby('topic_name')['star_rating'].agg(['mean', 'count']).reset_index()
+    # Calculate overall average rating per product
+    overall_scores = df.groupby('product_id', observed=True)['star_rating'].agg(['mean', 'count']).reset_index()
+    overall_scores.columns = ['product_id', 'avg_rating', 'review_count']
+    overall_scores['topic_name'] = 'Overall'
 
-    # Rename columns for clarity
-    product_topic_scores.columns = ['topic_name', 'avg_rating', 'review_count']
+    # Topics keep their sorted order within each product and Overall goes after all of them
+    topic_scores['position'] = topic_scores.groupby('product_id', observed=True).cumcount()
+    overall_scores['position'] = len(topic_scores)
+
+    scores = pd.concat([topic_scores.astype({'product_id': object, 'topic_name': object}),
+                        overall_scores.astype({'product_id': object})], ignore_index=True)
 
     # Round average rating to 2 decimal places
-    product_topic_scores['avg_rating'] = product_topic_scores['avg_rating'].round(2)
+    scores['avg_rating'] = scores['avg_rating'].round(2)
 
-    # Calculate overall average rating
-    overall_score = df_product['star_rating'].mean().round(2)
-    overall_count = df_product['star_rating'].count()
+    titles = df.groupby('product_id', observed=True)['product_title'].first()
+    scores['product_title'] = scores['product_id'].map(titles.astype(object))
 
-    # Add overall score to the dataframe
-    overall_df = pd.DataFrame({
-        'topic_name': ['Overall'],
-        'avg_rating': [overall_score],
-        'review_count': [overall_count]
-    })
+    return scores[['product_id', 'product_title', 'topic_name', 'avg_rating', 'review_count', 'position']]
 
-    product_topic_scores = pd.concat([product_topic_scores, overall_df], ignore_index=True)
 
-    return product_topic_scores, df_product['product_title'].iloc[0]
+def build_score_index(results_file_path, index_path):
+    # Only load the columns the gauges need; Parquet/Arrow results are read column-wise
+    df = read_table(results_file_path, columns=['product_id', 'product_title', 'topic_name', 'star_rating'])
+    scores = calculate_topic_scores(df)
 
+    conn = sqlite3.connect(index_path)
+    try:
+        scores.to_sql('topic_scores', conn, if_exists='replace', index=False)
+        conn.execute('CREATE INDEX idx_topic_scores_product ON topic_scores (product_id, position)')
+        conn.commit()
+    finally:
+        conn.close()
+    print(f"Indexed {scores['product_id'].nunique()} products from {results_file_path} into {index_path}")
 
-def create_dial_gauge(ax, rating, topic, count):
+
+def default_index_path(results_file_path):
+    return f'{os.path.splitext(results_file_path)[0]}_topic_scores.sqlite3'
+
+
+def ensure_score_index(results_file_path, index_path=None, rebuild=False):
+    index_path = index_path or default_index_path(results_file_path)
+
+    # Rebuild when the results file is newer than the index
+    stale = not os.path.exists(index_path) or os.path.getmtime(index_path) < os.path.getmtime(results_file_path)
+    if rebuild or stale:
+        build_score_index(results_file_path, index_path)
+    return index_path
+
+
+def indexed_product_ids(index_path):
+    conn = sqlite3.connect(index_path)
+    try:
+        return [row[0] for row in conn.execute('SELECT DISTINCT product_id FROM topic_scores ORDER BY product_id')]
+    finally:
+        conn.close()
+
+
+def load_product_topic_scores(conn, product_id):
+    product_topic_scores = pd.read_sql_query(
+        'SELECT product_title, topic_name, avg_rating, review_count FROM topic_scores '
+        'WHERE product_id = ? ORDER BY position', conn, params=(product_id,))
+
+    if product_topic_scores.empty:
+        return None, None
+
+    product_title = product_topic_scores['product_title'].iloc[0]
+    return product_topic_scores[['topic_name', 'avg_rating', 'review_count']], product_title
+
+
+def rating_to_angle(rating):
+    return np.deg2rad(180 * (rating - 1) / 4)
+
+
+def draw_dial_background(ax):
     # Set up the dial
     ax.set_theta_offset(np.pi / 2)
     ax.set_theta_direction(-1)
     ax.set_thetamin(0)
     ax.set_thetamax(180)
 
-    # Create the colormap
-    cmap = plt.cm.RdYlGn
-    norm = plt.Normalize(1, 5)
-
     # Draw the dial background
-    ax.bar(np.deg2rad(np.linspace(0, 180, 100)), [1] * 100, width=np.deg2rad(180 / 99), bottom=1,
-           color=cmap(norm(np.linspace(1, 5, 100))))
-
-    # Draw the dial needle
-    ax.bar(np.deg2rad(180 * (rating - 1) / 4), 0.95, width=np.deg2rad(2), bottom=1, color='black')
+    ax.bar(BACKGROUND_THETA, [1] * len(BACKGROUND_THETA), width=np.deg2rad(180 / 99), bottom=1,
+           color=BACKGROUND_COLORS)
 
     # Set up the ticks
     ax.set_xticks(np.deg2rad([0, 45, 90, 135, 180]))
@@ -63,47 +120,172 @@ def create_dial_gauge(ax, rating, topic, count):
     ax.tick_params(axis='x', colors='black', labelsize=8)
     ax.set_yticks([])
 
+
+def create_dial_gauge(ax, rating, topic, count):
+    draw_dial_background(ax)
+
+    # Draw the dial needle
+    ax.bar(rating_to_angle(rating), 0.95, width=NEEDLE_WIDTH, bottom=1, color='black')
+
     # Add the topic name and rating
     ax.text(0, 0, f"{topic}\n{rating}\n({count} reviews)", ha='center', va='center', fontweight='bold')
 
 
-def create_dial_gauges(data, product_title, output_file):
-    n_topics = len(data)
-    n_cols = 3
-    n_rows = (n_topics + n_cols - 1) // n_cols
+class GaugeFigureTemplate:
+    # A grid of dials whose static background is drawn once; rendering only moves needles and relabels
+    def __init__(self, n_rows):
+        self.fig = Figure(figsize=(15, 5 * n_rows))
+        axs = self.fig.subplots(n_rows, N_COLS, subplot_kw=dict(projection='polar'))
+        self.axes = np.atleast_1d(axs).flatten()
+        self.title = self.fig.suptitle("", fontsize=16, wrap=True)
+        self.needles = []
+        self.labels = []
+        for ax in self.axes:
+            draw_dial_background(ax)
+            self.needles.append(ax.bar(0, 0.95, width=NEEDLE_WIDTH, bottom=1, color='black')[0])
+            self.labels.append(ax.text(0, 0, "", ha='center', va='center', fontweight='bold'))
+        self.fig.tight_layout(rect=[0, 0.03, 1, 0.95])
+
+    def render(self, data, product_title, output_file):
+        self.title.set_text(f"Ratings for:\n{product_title}")
+
+        # Hide any unused subplots
+        for i, ax in enumerate(self.axes):
+            ax.set_visible(i < len(data))
 
-    fig, axs = plt.subplots(n_rows, n_cols, figsize=(15, 5 * n_rows), subplot_kw=dict(projection='polar'))
-    fig.suptitle(f"Ratings for:\n{product_title}", fontsize=16, wrap=True)
+        for needle, label, (_, row) in zip(self.needles, self.labels, data.iterrows()):
+            needle.set_x(rating_to_angle(row['avg_rating']) - NEEDLE_WIDTH / 2)
+            label.set_text(f"{row['topic_name']}\n{row['avg_rating']}\n({row['review_count']} reviews)")
 
-    axs_flat = axs.flatten() if n_rows > 1 else axs
+        self.fig.savefig(output_file)
 
-    for i, (_, row) in enumerate(data.iterrows()):
-        create_dial_gauge(axs_flat[i], row['avg_rating'], row['topic_name'], row['review_count'])
 
-    # Remove any unused subplots
-    for i in range(n_topics, n_rows * n_cols):
-        fig.delaxes(axs_flat[i])
+# One template per grid height, reused for every product rendered by this process
+_templates = {}
 
-    plt.tight_layout(rect=[0, 0.03, 1, 0.95])
-    plt.savefig(output_file)
-    plt.close()
+
+def create_dial_gauges(data, product_title, output_file):
+    n_rows = (len(data) + N_COLS - 1) // N_COLS
+    if n_rows not in _templates:
+        _templates[n_rows] = GaugeFigureTemplate(n_rows)
+    _templates[n_rows].render(data, product_title, output_file)
     print(f"Saved dial gauges: {output_file}")
 
 
-def main(csv_file_path, product_id):
-    # Calculate product topic scores
-    product_topic_scores, product_title = calculate_product_topic_scores(csv_file_path, product_id)
+def write_gauge_spec(data, product_id, product_title, output_file):
+    # A compact description of the gauges for the frontend to draw itself
+    gauges = [{
+        'topic': row['topic_name'],
+        'rating': None if pd.isna(row['avg_rating']) else float(row['avg_rating']),
+        'review_count': int(row['review_count']),
+        'needle_degrees': None if pd.isna(row['avg_rating']) else float(180 * (row['avg_rating'] - 1) / 4),
+    } for _, row in data.iterrows()]
+    spec = {'product_id': product_id, 'product_title': product_title, 'scale': {'min': 1, 'max': 5},
+            'gauges': gauges}
 
-    # Create dial gauges
-    output_file = f'product_{product_id}_dial_gauges.png'
-    create_dial_gauges(product_topic_scores, product_title, output_file)
+    with open(output_file, 'w') as f:
+        json.dump(spec, f)
+    print(f"Saved gauge spec: {output_file}")
 
 
-if __name__ == "__main__":
-    if len(sys.argv) != 3:
-        print("Usage: python script_name.py <path_to_csv_file> <product_id>")
+# Each rendering process keeps its own connection to the score index
+_index_conn = None
+
+
+def _init_render_worker(index_path):
+    global _index_conn
+    _index_conn = sqlite3.connect(index_path)
+
+
+def _render_product(product_id, output_format, output_dir='.'):
+    product_topic_scores, product_title = load_product_topic_scores(_index_conn, product_id)
+    if product_topic_scores is None:
+        print(f"No data found for product ID: {product_id}")
+        return False
+
+    output_file = os.path.join(output_dir, f'product_{product_id}_dial_gauges.{output_format}')
+    if output_format == 'json':
+        write_gauge_spec(product_topic_scores, product_id, product_title, output_file)
+    else:
+        create_dial_gauges(product_topic_scores, product_title, output_file)
+    return True
+
+
+def render_products(index_path, product_ids, output_format='png', workers=None, output_dir='.'):
+    os.makedirs(output_dir, exist_ok=True)
+    render = partial(_render_product, output_format=output_format, output_dir=output_dir)
+    workers = workers or multiprocessing.cpu_count()
+
+    if workers == 1 or len(product_ids) == 1:
+        _init_render_worker(index_path)
+        return sum(map(render, product_ids))
+
+    with multiprocessing.Pool(workers, initializer=_init_render_worker, initargs=(index_path,)) as pool:
+        return sum(pool.imap_unordered(render, product_ids, chunksize=8))
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(description="Render per-topic rating dial gauges for products.")
+    parser.add_argument('results_file', help='Topic modeling results file (CSV, Parquet or Arrow)')
+    parser.add_argument('product_ids', nargs='*', help='Product IDs to render')
+    parser.add_argument('--all', action='store_true', help='Render every product in the results')
+    parser.add_argument('--products-file', help='Render every asin listed in this file (e.g. asinmaster.csv)')
+    parser.add_argument('--index', help='Topic score index to use (default: next to the results file)')
+    parser.add_argument('--rebuild-index', action='store_true', help='Rebuild the topic score index')
+    parser.add_argument('--format', choices=GAUGE_FORMATS, default='png',
+                        help='png/svg images, or a json gauge spec for the frontend (default: %(default)s)')
+    parser.add_argument('--workers', type=int, default=None,
+                        help='Number of rendering processes (default: number of CPUs)')
+    parser.add_argument('--output-dir', default='.',
+                        help='Directory the gauge files are written to (default: the current directory)')
+    add_metrics_arguments(parser)
+    return parser
+
+
+def check_args(parser, args):
+    if not (args.product_ids or args.products_file or args.all):
+        parser.error('No products given. Pass product IDs, --products-file or --all.')
+    return args
+
+
+def parse_args(argv=None):
+    parser = build_parser()
+    return check_args(parser, parser.parse_args(argv))
+
+
+def run(args):
+    # Returns the number of products rendered
+    with start_run('product_dial_guages', args):
+        with stage('index'):
+            index_path = ensure_score_index(args.results_file, args.index, rebuild=args.rebuild_index)
+        if args.all:
+            product_ids = indexed_product_ids(index_path)
+        else:
+            product_ids = list(args.product_ids)
+            if args.products_file:
+                product_ids += read_table(args.products_file, columns=['asin'])['asin'].dropna().tolist()
+
+        if not product_ids:
+            print("No products found to render.")
+            return 0
+
+        with stage('render', rows=len(product_ids)):
+            rendered = render_products(index_path, product_ids, args.format, args.workers, args.output_dir)
+        print(f"Rendered dial gauges for {rendered} of {len(product_ids)} products")
+        return rendered
+
+
+def render_gauges(results_file, **options):
+    # Python entry point; options use the command line flag names, e.g. render_gauges('x.csv', all=True)
+    parser = build_parser()
+    return run(check_args(parser, args_from_options(parser, results_file, options)))
+
+
+def main(argv=None):
+    # Keep the single-product behaviour of exiting with an error when nothing was found
+    if not run(parse_args(argv)):
         sys.exit(1)
 
-    csv_file_path = sys.argv[1]
-    product_id = sys.argv[2]
-    main(csv_file_path, product_id)
\ No newline at end of file
+
+if __name__ == "__main__":
+    main()
@@ -1,5 +1,7 @@
 from django.contrib import admin
-from .models import Product, CustomUser
+from .models import Product, CustomUser, AnalysisRun, ProductTopicScore
 
 admin.site.register(Product)
-admin.site.register(CustomUser)
\ No newline at end of file
+admin.site.register(CustomUser)
+admin.site.register(AnalysisRun)
+admin.site.register(ProductTopicScore)
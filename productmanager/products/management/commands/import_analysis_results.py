@@ -0,0 +1,107 @@
+import csv
+import os
+import sys
+import time
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from django.db.models import Avg, Count, Max
+from products.models import AnalysisRun, ProductTopicScore, Review, TopicAssignment
+
+# Label column written by each kind of results file, in the order they are looked for
+LABEL_COLUMNS = [
+    ('topic_name', 'topics'),
+    ('aspect', 'aspects'),
+    ('cluster_name', 'clusters'),
+]
+
+
+def open_results(path):
+    # The scripts write .csv by default; anything else is read as the tab-separated review dumps
+    csv.field_size_limit(sys.maxsize)
+    f = open(path, newline='', encoding='utf-8')
+    return f, csv.DictReader(f, delimiter=',' if path.lower().endswith('.csv') else '\t')
+
+
+def label_column(fieldnames):
+    for column, analysis in LABEL_COLUMNS:
+        if column in fieldnames:
+            return column, analysis
+    raise CommandError(f"No {', '.join(column for column, _ in LABEL_COLUMNS)} column in the results file")
+
+
+def parse_rating(value):
+    try:
+        rating = float(value)
+    except (TypeError, ValueError):
+        return None
+    return None if rating != rating else int(round(rating))
+
+
+def load_batch(run, rows, label):
+    reviews = Review.objects.bulk_create([
+        Review(run=run, asin=row['product_id'][:20], product_title=(row.get('product_title') or '')[:500],
+               review_body=row.get('review_body') or '', star_rating=parse_rating(row.get('star_rating')))
+        for row in rows])
+    TopicAssignment.objects.bulk_create([
+        TopicAssignment(run=run, review=review, asin=review.asin, topic=row[label][:200],
+                        star_rating=review.star_rating, sentiment=(row.get('sentiment') or '')[:20])
+        for review, row in zip(reviews, rows) if row.get(label)])
+
+
+def store_topic_scores(run, batch_size):
+    # The rating matrix served by research, averaged in SQL from the assignments just loaded
+    titles = dict(Review.objects.filter(run=run).values('asin').annotate(title=Max('product_title'))
+                  .values_list('asin', 'title'))
+    scores = (TopicAssignment.objects.filter(run=run, star_rating__isnull=False).values('asin', 'topic')
+              .annotate(avg_rating=Avg('star_rating'), review_count=Count('id')))
+    return len(ProductTopicScore.objects.bulk_create(
+        (ProductTopicScore(run=run, asin=score['asin'], product_title=titles.get(score['asin'], ''),
+                           topic=score['topic'], avg_rating=round(score['avg_rating'], 2),
+                           review_count=score['review_count'])
+         for score in scores.iterator()),
+        batch_size=batch_size))
+
+
+class Command(BaseCommand):
+    help = 'Import a topic/aspect results file as a new analysis run with its reviews, assignments and ratings'
+
+    def add_arguments(self, parser):
+        parser.add_argument('results_file', help='Results CSV written by one of the modeling scripts')
+        parser.add_argument('--batch-size', type=int, default=5000, help='Rows per bulk insert')
+
+    def handle(self, *args, **options):
+        path = options['results_file']
+        batch_size = options['batch_size']
+        if not os.path.isfile(path):
+            raise CommandError(f"File '{path}' does not exist")
+
+        start_time = time.perf_counter()
+        f, reader = open_results(path)
+        # One transaction for the whole file: a failed import leaves no half-loaded run behind
+        with f, transaction.atomic():
+            label, analysis = label_column(reader.fieldnames or [])
+            run = AnalysisRun.objects.create(source_file=os.path.basename(path), analysis=analysis)
+
+            # Only one batch of rows is held in memory at a time
+            rows = 0
+            batch = []
+            for row in reader:
+                if not row.get('product_id'):
+                    continue
+                batch.append(row)
+                if len(batch) == batch_size:
+                    load_batch(run, batch, label)
+                    rows += len(batch)
+                    batch = []
+            if batch:
+                load_batch(run, batch, label)
+                rows += len(batch)
+
+            run.review_count = rows
+            run.save(update_fields=['review_count'])
+            n_scores = store_topic_scores(run, batch_size)
+
+        elapsed = time.perf_counter() - start_time
+        self.stdout.write(self.style.SUCCESS(
+            f"Imported run {run.id}: {rows} reviews and {n_scores} product topic scores "
+            f"in {elapsed:.1f}s ({rows / elapsed if elapsed else 0:.0f} rows/s)"))
@@ -0,0 +1,80 @@
+import csv
+import os
+import time
+from decimal import Decimal, InvalidOperation
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from products.models import Product
+from products.research import invalidate_research
+
+UPDATE_FIELDS = ['name', 'brand', 'price', 'image_url']
+
+
+def parse_price(value):
+    try:
+        price = Decimal(value).quantize(Decimal('0.01'))
+    except (TypeError, InvalidOperation):
+        return None
+    # Anything that does not fit the price column is treated as unknown
+    return price if price.is_finite() and abs(price) < 10 ** 8 else None
+
+
+def product_from_row(row):
+    return Product(asin=row['asin'].strip()[:20], name=(row.get('product_title') or '')[:200],
+                   brand=(row.get('brand') or '')[:100], price=parse_price(row.get('price')),
+                   image_url=(row.get('image') or '')[:500])
+
+
+def upsert(batch):
+    # The last row wins when an asin repeats within a batch; the database would reject the duplicate otherwise
+    products = list({product.asin: product for product in batch}.values())
+    with transaction.atomic():
+        Product.objects.bulk_create(products, update_conflicts=True, unique_fields=['asin'],
+                                    update_fields=UPDATE_FIELDS)
+    return len(products)
+
+
+class Command(BaseCommand):
+    help = 'Create or update products from an ASIN master CSV (asin, brand, product_title, price, image)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('asin_master', nargs='?', default=os.path.join(settings.BASE_DIR, 'asinmaster.csv'),
+                            help='ASIN master CSV (default: asinmaster.csv next to manage.py)')
+        parser.add_argument('--batch-size', type=int, default=2000, help='Products per upsert')
+
+    def handle(self, *args, **options):
+        path = options['asin_master']
+        batch_size = options['batch_size']
+        if not os.path.isfile(path):
+            raise CommandError(f"File '{path}' does not exist")
+
+        start_time = time.perf_counter()
+        rows = 0
+        upserted = 0
+        # The file is read row by row and written a batch at a time, so memory is bounded by the batch size
+        with open(path, newline='', encoding='utf-8') as f:
+            reader = csv.DictReader(f)
+            if 'asin' not in (reader.fieldnames or []):
+                raise CommandError(f"No asin column in '{path}'")
+            batch = []
+            for row in reader:
+                rows += 1
+                if not (row.get('asin') or '').strip():
+                    continue
+                batch.append(product_from_row(row))
+                if len(batch) == batch_size:
+                    upserted += upsert(batch)
+                    batch = []
+                    if options['verbosity'] > 1:
+                        self.stdout.write(f"{rows} rows, {rows / (time.perf_counter() - start_time):.0f} rows/s")
+            if batch:
+                upserted += upsert(batch)
+
+        # Research matches products to results by asin, which may just have been set
+        invalidate_research()
+
+        elapsed = time.perf_counter() - start_time
+        self.stdout.write(self.style.SUCCESS(
+            f"Upserted {upserted} products from {rows} rows in {elapsed:.1f}s "
+            f"({rows / elapsed if elapsed else 0:.0f} rows/s)"))
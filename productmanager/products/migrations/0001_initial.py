@@ -0,0 +1,59 @@
+# Generated by Django 5.2.18 on 2026-10-17 18:11
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    initial = True
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='AnalysisRun',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('source_file', models.CharField(max_length=500)),
+                ('analysis', models.CharField(choices=[('topics', 'Topics'), ('aspects', 'Aspects'), ('clusters', 'Clusters')], max_length=20)),
+                ('review_count', models.PositiveIntegerField(default=0)),
+                ('imported_at', models.DateTimeField(auto_now_add=True)),
+            ],
+        ),
+        migrations.CreateModel(
+            name='Product',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=200)),
+                ('review_image', models.ImageField(upload_to='reviews/')),
+            ],
+        ),
+        migrations.CreateModel(
+            name='CustomUser',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('telephone', models.CharField(max_length=15)),
+                ('user', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, to=settings.AUTH_USER_MODEL)),
+                ('products', models.ManyToManyField(blank=True, to='products.product')),
+            ],
+        ),
+        migrations.CreateModel(
+            name='ProductTopicScore',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('asin', models.CharField(max_length=20)),
+                ('product_title', models.CharField(max_length=500)),
+                ('topic', models.CharField(max_length=200)),
+                ('avg_rating', models.FloatField()),
+                ('review_count', models.PositiveIntegerField()),
+                ('run', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='topic_scores', to='products.analysisrun')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['asin', 'run'], name='products_pr_asin_7212ff_idx'), models.Index(fields=['product_title', 'run'], name='products_pr_product_065fc3_idx')],
+            },
+        ),
+    ]
@@ -0,0 +1,49 @@
+# Generated by Django 5.2.18 on 2026-10-17 18:11
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('products', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Review',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('asin', models.CharField(max_length=20)),
+                ('product_title', models.CharField(max_length=500)),
+                ('review_body', models.TextField()),
+                ('star_rating', models.PositiveSmallIntegerField(null=True)),
+                ('run', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='reviews', to='products.analysisrun')),
+            ],
+        ),
+        migrations.CreateModel(
+            name='TopicAssignment',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('asin', models.CharField(max_length=20)),
+                ('topic', models.CharField(max_length=200)),
+                ('star_rating', models.PositiveSmallIntegerField(null=True)),
+                ('sentiment', models.CharField(blank=True, max_length=20)),
+                ('review', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='assignments', to='products.review')),
+                ('run', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='assignments', to='products.analysisrun')),
+            ],
+        ),
+        migrations.AddIndex(
+            model_name='review',
+            index=models.Index(fields=['asin', 'run'], name='products_re_asin_fe8b06_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='topicassignment',
+            index=models.Index(fields=['asin', 'run', 'topic'], name='products_to_asin_1779ce_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='topicassignment',
+            index=models.Index(fields=['run', 'topic'], name='products_to_run_id_ac0796_idx'),
+        ),
+    ]
@@ -0,0 +1,38 @@
+# Generated by Django 5.2.18 on 2026-10-17 18:11
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('products', '0002_review_topicassignment'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='product',
+            name='asin',
+            field=models.CharField(blank=True, max_length=20, null=True, unique=True),
+        ),
+        migrations.AddField(
+            model_name='product',
+            name='brand',
+            field=models.CharField(blank=True, max_length=100),
+        ),
+        migrations.AddField(
+            model_name='product',
+            name='image_url',
+            field=models.URLField(blank=True, max_length=500),
+        ),
+        migrations.AddField(
+            model_name='product',
+            name='price',
+            field=models.DecimalField(blank=True, decimal_places=2, max_digits=10, null=True),
+        ),
+        migrations.AlterField(
+            model_name='product',
+            name='review_image',
+            field=models.ImageField(blank=True, upload_to='reviews/'),
+        ),
+    ]
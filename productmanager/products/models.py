@@ -1,17 +1,88 @@
 from django.db import models
 from django.contrib.auth.models import User
 
+
 class Product(models.Model):
     name = models.CharField(max_length=200)
-    review_image = models.ImageField(upload_to='reviews/')
+    review_image = models.ImageField(upload_to='reviews/', blank=True)
+    asin = models.CharField(max_length=20, unique=True, null=True, blank=True)
+    brand = models.CharField(max_length=100, blank=True)
+    price = models.DecimalField(max_digits=10, decimal_places=2, null=True, blank=True)
+    image_url = models.URLField(max_length=500, blank=True)
 
     def __str__(self):
         return self.name
 
+
 class CustomUser(models.Model):
     user = models.OneToOneField(User, on_delete=models.CASCADE)
     telephone = models.CharField(max_length=15)
     products = models.ManyToManyField(Product, blank=True)
 
     def __str__(self):
-        return self.user.username
\ No newline at end of file
+        return self.user.username
+
+
+class AnalysisRun(models.Model):
+    ANALYSIS_CHOICES = [
+        ('topics', 'Topics'),
+        ('aspects', 'Aspects'),
+        ('clusters', 'Clusters'),
+    ]
+
+    source_file = models.CharField(max_length=500)
+    analysis = models.CharField(max_length=20, choices=ANALYSIS_CHOICES)
+    review_count = models.PositiveIntegerField(default=0)
+    imported_at = models.DateTimeField(auto_now_add=True)
+
+    def __str__(self):
+        return f'{self.analysis} from {self.source_file}'
+
+
+class ProductTopicScore(models.Model):
+    # One row of the per-product, per-topic rating matrix of an analysis run
+    run = models.ForeignKey(AnalysisRun, on_delete=models.CASCADE, related_name='topic_scores')
+    asin = models.CharField(max_length=20)
+    product_title = models.CharField(max_length=500)
+    topic = models.CharField(max_length=200)
+    avg_rating = models.FloatField()
+    review_count = models.PositiveIntegerField()
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['asin', 'run']),
+            models.Index(fields=['product_title', 'run']),
+        ]
+
+    def __str__(self):
+        return f'{self.asin} {self.topic}: {self.avg_rating}'
+
+
+class Review(models.Model):
+    run = models.ForeignKey(AnalysisRun, on_delete=models.CASCADE, related_name='reviews')
+    asin = models.CharField(max_length=20)
+    product_title = models.CharField(max_length=500)
+    review_body = models.TextField()
+    star_rating = models.PositiveSmallIntegerField(null=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['asin', 'run']),
+        ]
+
+
+class TopicAssignment(models.Model):
+    # The topic, aspect or cluster a run gave a review; product and rating are repeated here so the
+    # per-topic aggregates are answered from this table's index without joining the reviews
+    run = models.ForeignKey(AnalysisRun, on_delete=models.CASCADE, related_name='assignments')
+    review = models.ForeignKey(Review, on_delete=models.CASCADE, related_name='assignments')
+    asin = models.CharField(max_length=20)
+    topic = models.CharField(max_length=200)
+    star_rating = models.PositiveSmallIntegerField(null=True)
+    sentiment = models.CharField(max_length=20, blank=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['asin', 'run', 'topic']),
+            models.Index(fields=['run', 'topic']),
+        ]
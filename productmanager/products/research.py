@@ -0,0 +1,73 @@
+import time
+from django.core.cache import cache
+from .models import ProductTopicScore
+
+RESULTS_VERSION_KEY = 'research:results_version'
+RESEARCH_CACHE_TIMEOUT = 60 * 60 * 24
+
+# Cached for products without any analysis results, since None means a cache miss
+NO_RESULTS = {}
+
+
+def results_version():
+    # Part of every research key, so bumping it moves all products to new keys. It only ever grows: a version
+    # derived from the data could repeat after a run is deleted or products change, reviving stale entries
+    version = cache.get(RESULTS_VERSION_KEY)
+    if version is None:
+        # Start from the clock, so a lost key never restarts below a version still cached
+        cache.add(RESULTS_VERSION_KEY, time.time_ns(), None)
+        version = cache.get(RESULTS_VERSION_KEY)
+    return version
+
+
+def invalidate_research():
+    try:
+        cache.incr(RESULTS_VERSION_KEY)
+    except ValueError:
+        # No version yet; the next lookup starts a new one
+        pass
+
+
+def research_key(product_pk):
+    return f'research:{product_pk}:{results_version()}'
+
+
+def invalidate_product_research(product_pk):
+    # A single product's name or ASIN decides which results it matches, so only its own entry goes stale
+    cache.delete(research_key(product_pk))
+
+
+def product_scores(product):
+    # Scores from the most recent run that covered the product; products added by hand have no ASIN
+    if product.asin:
+        scores = ProductTopicScore.objects.filter(asin=product.asin)
+    else:
+        scores = ProductTopicScore.objects.filter(product_title=product.name)
+    run_id = scores.order_by('-run_id').values_list('run_id', flat=True).first()
+    if run_id is None:
+        return []
+    return list(scores.filter(run_id=run_id).order_by('topic').values_list('topic', 'avg_rating', 'review_count'))
+
+
+def build_research(product):
+    scores = product_scores(product)
+    if not scores:
+        return NO_RESULTS
+    topics, ratings, counts = zip(*scores)
+    return {
+        'features': list(topics),
+        'brands': [product.name],
+        'ratings': [list(ratings)],
+        'review_counts': [list(counts)],
+    }
+
+
+def product_research(product):
+    key = research_key(product.pk)
+    result = cache.get(key)
+    if result is None:
+        result = build_research(product)
+        cache.set(key, result, RESEARCH_CACHE_TIMEOUT)
+    if not result:
+        return None
+    return {'product_name': product.name, **result}
@@ -1,11 +1,25 @@
 from rest_framework import serializers
 from django.contrib.auth.models import User
-from .models import Product, CustomUser
+from .models import Product, CustomUser, AnalysisRun
 
-class ProductSerializer(serializers.ModelSerializer):
+
+class SparseFieldsMixin:
+    # ?fields=id,name limits the response to the listed fields
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        request = self.context.get('request')
+        fields = request.query_params.get('fields') if request is not None else None
+        if fields:
+            requested = set(fields.split(','))
+            for name in set(self.fields) - requested:
+                self.fields.pop(name)
+
+
+class ProductSerializer(SparseFieldsMixin, serializers.ModelSerializer):
     class Meta:
         model = Product
-        fields = ['id', 'name', 'review_image']
+        fields = ['id', 'name', 'review_image', 'asin', 'brand', 'price', 'image_url']
+
 
 class UserSerializer(serializers.ModelSerializer):
     class Meta:
@@ -17,7 +31,8 @@ class UserSerializer(serializers.ModelSerializer):
         user = User.objects.create_user(**validated_data)
         return user
 
-class CustomUserSerializer(serializers.ModelSerializer):
+
+class CustomUserSerializer(SparseFieldsMixin, serializers.ModelSerializer):
     user = UserSerializer()
     products = ProductSerializer(many=True, read_only=True)
 
@@ -29,4 +44,10 @@ class CustomUserSerializer(serializers.ModelSerializer):
         user_data = validated_data.pop('user')
         user = User.objects.create_user(**user_data)
         custom_user = CustomUser.objects.create(user=user, **validated_data)
-        return custom_user
\ No newline at end of file
+        return custom_user
+
+
+class AnalysisRunSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = AnalysisRun
+        fields = ['id', 'source_file', 'analysis', 'review_count', 'imported_at']
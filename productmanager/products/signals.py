@@ -0,0 +1,21 @@
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+from .models import AnalysisRun, Product
+from .research import invalidate_product_research, invalidate_research
+
+
+@receiver(post_save, sender=AnalysisRun)
+@receiver(post_delete, sender=AnalysisRun)
+def analysis_run_changed(sender, **kwargs):
+    # Wait for the import's transaction, so no request caches a run whose scores are not written yet
+    transaction.on_commit(invalidate_research)
+
+
+@receiver(post_save, sender=Product)
+@receiver(post_delete, sender=Product)
+def product_changed(sender, instance, **kwargs):
+    # Edits through the admin, the API or the ORM; import_asin_master bulk-upserts without signals and
+    # invalidates everything itself
+    pk = instance.pk
+    transaction.on_commit(lambda: invalidate_product_research(pk))
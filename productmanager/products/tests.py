@@ -1,3 +1,131 @@
-from django.test import TestCase
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.db import connection
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from rest_framework.test import APIClient
+from .models import Product, CustomUser, AnalysisRun, ProductTopicScore
+from .research import product_research
 
-# Create your tests here.
+
+class CustomUserListTests(TestCase):
+    def setUp(self):
+        admin = User.objects.create_superuser('admin', 'admin@example.com', 'password')
+        self.client = APIClient()
+        self.client.force_authenticate(admin)
+        self.products = [Product.objects.create(name=f'Product {i}') for i in range(3)]
+
+    def create_users(self, count):
+        start = CustomUser.objects.count()
+        for i in range(start, start + count):
+            user = User.objects.create_user(f'user{i}', f'user{i}@example.com', 'password')
+            custom_user = CustomUser.objects.create(user=user, telephone='555-0100')
+            custom_user.products.set(self.products)
+
+    def list_users(self, params=''):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(f'/api/users/{params}')
+        self.assertEqual(response.status_code, 200)
+        return response, len(queries)
+
+    def test_query_count_does_not_grow_with_users(self):
+        self.create_users(2)
+        _, few_users = self.list_users()
+        self.create_users(20)
+        response, many_users = self.list_users()
+
+        self.assertEqual(few_users, many_users)
+        self.assertEqual(len(response.data['results']), 22)
+        self.assertEqual(len(response.data['results'][0]['products']), 3)
+
+    def test_sparse_fieldset_skips_products(self):
+        self.create_users(5)
+        response, queries = self.list_users('?fields=id,telephone')
+        _, all_fields_queries = self.list_users()
+
+        self.assertEqual(set(response.data['results'][0]), {'id', 'telephone'})
+        self.assertLess(queries, all_fields_queries)
+
+    def test_users_are_paginated_by_cursor(self):
+        self.create_users(5)
+        response, _ = self.list_users('?page_size=2')
+
+        self.assertEqual(len(response.data['results']), 2)
+        next_page = self.client.get(response.data['next'])
+        self.assertEqual([user['id'] for user in next_page.data['results']],
+                         list(CustomUser.objects.order_by('id').values_list('id', flat=True)[2:4]))
+
+
+class TrackedProductsBulkTests(TestCase):
+    def setUp(self):
+        user = User.objects.create_user('user', 'user@example.com', 'password')
+        self.custom_user = CustomUser.objects.create(user=user, telephone='555-0100')
+        self.client = APIClient()
+        self.client.force_authenticate(user)
+        self.products = [Product.objects.create(name=f'Product {i}') for i in range(5)]
+
+    def test_add_products_reports_missing_ids(self):
+        ids = [product.id for product in self.products[:3]]
+        response = self.client.post('/api/users/add_products/', {'product_ids': ids + [9999, 'abc']}, format='json')
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data, {'added': ids, 'missing': [9999, 'abc']})
+        self.assertEqual(set(self.custom_user.products.values_list('id', flat=True)), set(ids))
+
+    def test_only_ints_and_digit_strings_are_ids(self):
+        product = self.products[0]
+        posted = [True, 'x', float(product.id), f' {product.id} ', str(product.id), 9999]
+        response = self.client.post('/api/users/add_products/', {'product_ids': posted}, format='json')
+
+        self.assertEqual(response.data, {'added': [product.id], 'missing': posted[:4] + [9999]})
+
+    def test_remove_products(self):
+        self.custom_user.products.set(self.products)
+        ids = [product.id for product in self.products[:2]]
+        response = self.client.post('/api/users/remove_products/', {'product_ids': ids}, format='json')
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data, {'removed': ids, 'missing': []})
+        self.assertEqual(self.custom_user.products.count(), 3)
+
+    def test_product_ids_must_be_a_list(self):
+        response = self.client.post('/api/users/add_products/', {'product_ids': 1}, format='json')
+        self.assertEqual(response.status_code, 400)
+
+
+@override_settings(CACHES={'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}})
+class ResearchCacheTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        run = AnalysisRun.objects.create(source_file='reviews.csv', analysis='topics')
+        for asin, rating in [('A1', 4.0), ('B2', 2.0)]:
+            ProductTopicScore.objects.create(run=run, asin=asin, product_title=asin, topic='battery',
+                                             avg_rating=rating, review_count=10)
+        self.product = Product.objects.create(name='Phone', asin='A1')
+
+    def test_invalidate_after_asin_change(self):
+        self.assertEqual(product_research(self.product)['ratings'], [[4.0]])
+        with self.captureOnCommitCallbacks(execute=True):
+            self.product.asin = 'B2'
+            self.product.save()
+        self.assertEqual(product_research(self.product)['ratings'], [[2.0]])
+
+    def test_invalidate_after_asin_change_through_api(self):
+        self.assertEqual(product_research(self.product)['ratings'], [[4.0]])
+        client = APIClient()
+        client.force_authenticate(User.objects.create_superuser('admin', 'admin@example.com', 'password'))
+        with self.captureOnCommitCallbacks(execute=True):
+            response = client.patch(f'/api/products/{self.product.pk}/', {'asin': 'B2'}, format='json')
+        self.assertEqual(response.status_code, 200)
+        self.product.refresh_from_db()
+        self.assertEqual(product_research(self.product)['ratings'], [[2.0]])
+
+    def test_deleting_latest_run_does_not_revive_old_entries(self):
+        self.assertIsNotNone(product_research(self.product))
+        with self.captureOnCommitCallbacks(execute=True):
+            latest = AnalysisRun.objects.create(source_file='more.csv', analysis='topics')
+        Product.objects.filter(pk=self.product.pk).update(asin='C3')
+        self.product.refresh_from_db()
+        with self.captureOnCommitCallbacks(execute=True):
+            latest.delete()
+        self.assertIsNone(product_research(self.product))
@@ -2,16 +2,27 @@ from rest_framework import viewsets, status
 from rest_framework.decorators import action
 from rest_framework.response import Response
 from rest_framework.permissions import IsAuthenticated, IsAdminUser
-from django.contrib.auth.models import User
-from .models import Product, CustomUser
-from .serializers import ProductSerializer, UserSerializer, CustomUserSerializer
-import random
+from django.db.models import Avg, Count
+from .models import Product, CustomUser, AnalysisRun, TopicAssignment
+from .serializers import ProductSerializer, CustomUserSerializer, AnalysisRunSerializer
+from .research import product_research
+from .pagination import IdCursorPagination
+
+
+def parse_product_id(value):
+    # Only ints and strings of digits; int() would also take True, 1.9 and " 3 "
+    if isinstance(value, int) and not isinstance(value, bool):
+        return value
+    if isinstance(value, str) and value.isascii() and value.isdigit():
+        return int(value)
+    return None
 
 
 class ProductViewSet(viewsets.ModelViewSet):
     queryset = Product.objects.all()
     serializer_class = ProductSerializer
     permission_classes = [IsAuthenticated]
+    pagination_class = IdCursorPagination
 
     def get_permissions(self):
         if self.action in ['create', 'update', 'partial_update', 'destroy']:
@@ -21,16 +32,9 @@ class ProductViewSet(viewsets.ModelViewSet):
     @action(detail=True, methods=['post'])
     def research(self, request, pk=None):
         product = self.get_object()
-        features = ['Quality', 'Price', 'Durability', 'Design', 'Performance']
-        brands = ['BrandA', 'BrandB', 'BrandC', 'BrandD', 'BrandE']
-
-        result = {
-            'product_name': product.name,
-            'features': features,
-            'brands': brands,
-            'ratings': [[random.randint(1, 5) for _ in range(5)] for _ in range(5)]
-        }
-
+        result = product_research(product)
+        if result is None:
+            return Response({'error': 'No analysis results for this product'}, status=status.HTTP_404_NOT_FOUND)
         return Response(result)
 
 
@@ -38,6 +42,15 @@ class CustomUserViewSet(viewsets.ModelViewSet):
     queryset = CustomUser.objects.all()
     serializer_class = CustomUserSerializer
     permission_classes = [IsAuthenticated]
+    pagination_class = IdCursorPagination
+
+    def get_queryset(self):
+        # One query for the users with their auth user joined in, and one for all of their products
+        queryset = super().get_queryset().select_related('user')
+        fields = self.request.query_params.get('fields')
+        if not fields or 'products' in fields.split(','):
+            queryset = queryset.prefetch_related('products')
+        return queryset
 
     def get_permissions(self):
         if self.action in ['create', 'update', 'partial_update', 'destroy', 'list']:
@@ -69,4 +82,61 @@ class CustomUserViewSet(viewsets.ModelViewSet):
             user.products.remove(product)
             return Response({'status': 'product removed'})
         except Product.DoesNotExist:
-            return Response({'error': 'Product not found'}, status=status.HTTP_404_NOT_FOUND)
\ No newline at end of file
+            return Response({'error': 'Product not found'}, status=status.HTTP_404_NOT_FOUND)
+
+    def _requested_products(self, request):
+        # Splits the posted product_ids into existing and missing ones with a single query
+        product_ids = request.data.get('product_ids')
+        if not isinstance(product_ids, list):
+            return None, None
+        requested = [parse_product_id(product_id) for product_id in product_ids]
+        found = set(Product.objects.filter(id__in=[pk for pk in requested if pk is not None])
+                    .values_list('id', flat=True))
+        # Missing ids are reported as posted and in the order they were posted
+        missing = [product_id for product_id, pk in zip(product_ids, requested) if pk not in found]
+        return sorted(found), missing
+
+    @action(detail=False, methods=['post'])
+    def add_products(self, request):
+        found, missing = self._requested_products(request)
+        if found is None:
+            return Response({'error': 'product_ids must be a list'}, status=status.HTTP_400_BAD_REQUEST)
+        # One M2M add for the whole list; products the user already tracks are skipped by Django
+        request.user.customuser.products.add(*found)
+        return Response({'added': found, 'missing': missing})
+
+    @action(detail=False, methods=['post'])
+    def remove_products(self, request):
+        found, missing = self._requested_products(request)
+        if found is None:
+            return Response({'error': 'product_ids must be a list'}, status=status.HTTP_400_BAD_REQUEST)
+        request.user.customuser.products.remove(*found)
+        return Response({'removed': found, 'missing': missing})
+
+
+class AnalysisRunViewSet(viewsets.ReadOnlyModelViewSet):
+    queryset = AnalysisRun.objects.order_by('-id')
+    serializer_class = AnalysisRunSerializer
+    permission_classes = [IsAuthenticated]
+
+    def _assignments(self, request):
+        # ?asin= narrows the aggregate to one product, served by the (asin, run, topic) index
+        assignments = TopicAssignment.objects.filter(run=self.get_object())
+        asin = request.query_params.get('asin')
+        if asin:
+            assignments = assignments.filter(asin=asin)
+        return assignments
+
+    @action(detail=True, methods=['get'])
+    def topics(self, request, pk=None):
+        # Average rating and review count per topic, computed by the database
+        topics = (self._assignments(request).values('topic')
+                  .annotate(avg_rating=Avg('star_rating'), review_count=Count('id')).order_by('topic'))
+        return Response(list(topics))
+
+    @action(detail=True, methods=['get'])
+    def products(self, request, pk=None):
+        # Average rating and review count per product and topic
+        scores = (self._assignments(request).values('asin', 'topic')
+                  .annotate(avg_rating=Avg('star_rating'), review_count=Count('id')).order_by('asin', 'topic'))
+        return Response(list(scores))
@@ -0,0 +1,198 @@
+import os
+
+import pandas as pd
+
+REVIEW_COLUMNS = ['review_body', 'star_rating', 'product_id', 'product_title']
+REQUIRED_COLUMNS = ['review_body', 'product_id', 'product_title']
+
+# Low-cardinality columns stored dictionary-encoded in Parquet/Arrow and loaded as pandas categoricals
+DICTIONARY_COLUMNS = ['product_id', 'product_title', 'topic_name', 'aspect', 'cluster_name']
+
+OUTPUT_FORMATS = ['csv', 'parquet', 'arrow']
+PARQUET_EXTENSIONS = ('.parquet', '.pq')
+ARROW_EXTENSIONS = ('.arrow', '.feather', '.ipc')
+
+DEFAULT_STREAM_CHUNK_SIZE = 100000
+
+
+def file_format(filename):
+    extension = os.path.splitext(filename)[1].lower()
+    if extension in PARQUET_EXTENSIONS:
+        return 'parquet'
+    if extension in ARROW_EXTENSIONS:
+        return 'arrow'
+    return 'csv'
+
+
+def _text_separator(filename):
+    # Everything that is not explicitly .csv is treated as the Amazon TSV dumps
+    return ',' if filename.lower().endswith('.csv') else '\t'
+
+
+def _dictionary_encode(df):
+    df = df.copy()
+    for column in DICTIONARY_COLUMNS:
+        if column in df.columns and not isinstance(df[column].dtype, pd.CategoricalDtype):
+            df[column] = df[column].astype('category')
+    return df
+
+
+def _with_dtypes(df, dtype):
+    # Columnar files keep their own types; only convert the columns that were asked for
+    if not dtype:
+        return df
+    return df.astype({column: column_type for column, column_type in dtype.items() if column in df.columns})
+
+
+def read_table(filename, columns=None, dtype=None):
+    fmt = file_format(filename)
+    if fmt == 'parquet':
+        return _with_dtypes(pd.read_parquet(filename, columns=columns), dtype)
+    if fmt == 'arrow':
+        from pyarrow import feather
+        # Memory-map the IPC file so only the requested columns are touched
+        return _with_dtypes(feather.read_table(filename, columns=columns, memory_map=True).to_pandas(), dtype)
+    return pd.read_csv(filename, sep=_text_separator(filename), usecols=columns, dtype=dtype)
+
+
+def iter_table_chunks(filename, columns=None, chunk_size=DEFAULT_STREAM_CHUNK_SIZE, dtype=None):
+    fmt = file_format(filename)
+    if fmt == 'parquet':
+        import pyarrow.parquet as pq
+        for batch in pq.ParquetFile(filename).iter_batches(batch_size=chunk_size, columns=columns):
+            yield _with_dtypes(batch.to_pandas(), dtype)
+    elif fmt == 'arrow':
+        from pyarrow import feather
+        table = feather.read_table(filename, columns=columns, memory_map=True)
+        for offset in range(0, table.num_rows, chunk_size):
+            yield _with_dtypes(table.slice(offset, chunk_size).to_pandas(), dtype)
+    else:
+        yield from pd.read_csv(filename, sep=_text_separator(filename), usecols=columns, chunksize=chunk_size,
+                               dtype=dtype)
+
+
+def write_table(df, filename):
+    fmt = file_format(filename)
+    if fmt == 'parquet':
+        _dictionary_encode(df).to_parquet(filename, index=False)
+    elif fmt == 'arrow':
+        from pyarrow import feather
+        # Uncompressed so readers can memory-map it without a copy
+        feather.write_feather(_dictionary_encode(df).reset_index(drop=True), filename, compression='uncompressed')
+    else:
+        df.to_csv(filename, index=False)
+
+
+def _drop_incomplete(df):
+    return df.dropna(subset=REQUIRED_COLUMNS).reset_index(drop=True)
+
+
+def load_reviews(input_filename):
+    df = read_table(input_filename, REVIEW_COLUMNS)
+    return _drop_incomplete(df)
+
+
+def iter_review_chunks(input_filename, chunk_size=DEFAULT_STREAM_CHUNK_SIZE):
+    # Read the input a fixed number of rows at a time so memory stays bounded by the chunk size
+    for chunk in iter_table_chunks(input_filename, REVIEW_COLUMNS, chunk_size):
+        chunk = _drop_incomplete(chunk)
+        if not chunk.empty:
+            yield chunk
+
+
+class ResultWriter:
+    def __init__(self, output_filename, columns):
+        self.output_filename = output_filename
+        self.columns = columns
+        self.format = file_format(output_filename)
+        self.rows_written = 0
+        self._schema = None
+        self._writer = None
+        self._dictionaries = {}
+
+    @staticmethod
+    def _is_text(arrow_type):
+        import pyarrow as pa
+        if pa.types.is_dictionary(arrow_type):
+            arrow_type = arrow_type.value_type
+        # pandas 3 hands string columns to Arrow as large_string
+        return pa.types.is_string(arrow_type) or pa.types.is_large_string(arrow_type)
+
+    def _arrow_schema(self, table):
+        import pyarrow as pa
+        fields = [pa.field(field.name, pa.dictionary(pa.int32(), pa.string()))
+                  if field.name in DICTIONARY_COLUMNS and self._is_text(field.type) else field
+                  for field in table.schema]
+        return pa.schema(fields)
+
+    def _encode(self, name, values):
+        # Every chunk is encoded against one dictionary that only grows, so later chunks are written as deltas of
+        # it; the Arrow IPC file format does not allow a chunk to replace the dictionary
+        import pyarrow as pa
+        dictionary = self._dictionaries.setdefault(name, {})
+        for value in pd.unique(values.dropna().astype(str)):
+            dictionary.setdefault(value, len(dictionary))
+        missing = values.isna().to_numpy()
+        indices = values.astype(str).map(dictionary).where(~missing, 0).to_numpy(dtype='int32')
+        return pa.DictionaryArray.from_arrays(pa.array(indices, mask=missing, type=pa.int32()),
+                                              pa.array(list(dictionary), type=pa.string()))
+
+    def _write_arrow(self, df):
+        import pyarrow as pa
+        table = pa.Table.from_pandas(df, preserve_index=False)
+        if self._writer is None:
+            self._schema = self._arrow_schema(table)
+            if self.format == 'parquet':
+                import pyarrow.parquet as pq
+                self._writer = pq.ParquetWriter(self.output_filename, self._schema)
+            else:
+                self._writer = pa.ipc.new_file(self.output_filename, self._schema,
+                                               options=pa.ipc.IpcWriteOptions(emit_dictionary_deltas=True))
+        for i, field in enumerate(self._schema):
+            if pa.types.is_dictionary(field.type) and field.name in DICTIONARY_COLUMNS:
+                table = table.set_column(i, field, self._encode(field.name, df[field.name]))
+        self._writer.write_table(table.cast(self._schema))
+
+    def write(self, df):
+        df = df[self.columns]
+        if self.format == 'csv':
+            # The first chunk creates the file with a header, later chunks are appended
+            df.to_csv(self.output_filename, mode='a' if self.rows_written else 'w',
+                      header=not self.rows_written, index=False)
+        else:
+            self._write_arrow(df)
+        self.rows_written += len(df)
+
+    def close(self):
+        if self._writer is not None:
+            self._writer.close()
+            self._writer = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+        return False
+
+
+def add_streaming_arguments(parser):
+    parser.add_argument('--stream', action='store_true',
+                        help='Read, process and write the input in chunks to keep memory bounded')
+    parser.add_argument('--stream-chunk-size', type=int, default=DEFAULT_STREAM_CHUNK_SIZE,
+                        help='Rows per chunk in --stream mode (default: %(default)s)')
+
+
+def add_output_format_argument(parser):
+    parser.add_argument('--output-format', choices=OUTPUT_FORMATS, default='csv',
+                        help='Format of the results file (default: %(default)s)')
+
+
+def args_from_options(parser, input_filename, options):
+    # Lets the pipelines be called from Python with keyword options named like their command line flags
+    args = parser.parse_args([input_filename])
+    for key, value in options.items():
+        if not hasattr(args, key):
+            raise TypeError(f"Unknown option: {key}")
+        setattr(args, key, value)
+    return args
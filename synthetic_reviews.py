@@ -0,0 +1,144 @@
+import argparse
+import os
+
+import numpy as np
+import pandas as pd
+
+# Column layout of giftsample.csv, which every analysis script reads
+REVIEW_COLUMNS = ['marketplace', 'customer_id', 'review_id', 'product_id', 'product_parent', 'product_title',
+                  'product_category', 'star_rating', 'helpful_votes', 'total_votes', 'vine', 'verified_purchase',
+                  'review_headline', 'review_body', 'review_date']
+
+DEFAULT_ASIN_MASTER = os.path.join('productmanager', 'asinmaster.csv')
+DEFAULT_CHUNK_SIZE = 100000
+
+NOUNS = ['battery', 'screen', 'camera', 'signal', 'charger', 'case', 'price', 'delivery', 'sound', 'speaker',
+         'button', 'design', 'quality', 'software', 'keyboard', 'card', 'gift', 'packaging', 'display', 'color']
+POSITIVE_ADJECTIVES = ['great', 'excellent', 'good', 'amazing', 'perfect', 'reliable', 'fast', 'beautiful',
+                       'sturdy', 'bright', 'clear', 'happy', 'solid', 'nice', 'easy']
+NEGATIVE_ADJECTIVES = ['bad', 'poor', 'terrible', 'slow', 'cheap', 'flimsy', 'broken', 'disappointing', 'weak',
+                       'awful', 'noisy', 'dim', 'useless', 'faulty', 'hard']
+NEUTRAL_ADJECTIVES = ['okay', 'average', 'decent', 'fine', 'standard', 'normal', 'small', 'large', 'new', 'basic']
+SENTENCE_TEMPLATES = ['The {noun} is {adjective}.', 'Really {adjective} {noun}.', 'I found the {noun} {adjective}.',
+                      '{adjective} {noun} for the money.', 'My {noun} was {adjective} after a week.']
+
+# Share of positive/neutral/negative words for star ratings 1..5
+SENTIMENT_MIX = np.array([[0.1, 0.2, 0.7], [0.2, 0.3, 0.5], [0.3, 0.4, 0.3], [0.6, 0.3, 0.1], [0.75, 0.2, 0.05]])
+RATING_WEIGHTS = np.array([0.08, 0.06, 0.1, 0.2, 0.56])
+
+
+def load_products(asin_master_path=DEFAULT_ASIN_MASTER):
+    products = pd.read_csv(asin_master_path, usecols=['asin', 'brand', 'product_title', 'price', 'image'])
+    return products.dropna(subset=['asin', 'product_title']).drop_duplicates('asin').reset_index(drop=True)
+
+
+def _review_texts(rng, ratings):
+    adjectives = [POSITIVE_ADJECTIVES, NEUTRAL_ADJECTIVES, NEGATIVE_ADJECTIVES]
+    n_sentences = rng.integers(1, 5, size=len(ratings))
+    texts = []
+    for rating, count in zip(ratings, n_sentences):
+        sentiments = rng.choice(3, size=count, p=SENTIMENT_MIX[rating - 1])
+        nouns = rng.integers(0, len(NOUNS), size=count)
+        templates = rng.integers(0, len(SENTENCE_TEMPLATES), size=count)
+        sentences = []
+        for sentiment, noun, template in zip(sentiments, nouns, templates):
+            words = adjectives[sentiment]
+            sentences.append(SENTENCE_TEMPLATES[template].format(
+                noun=NOUNS[noun], adjective=words[rng.integers(0, len(words))]).capitalize())
+        texts.append(' '.join(sentences))
+    return texts
+
+
+def generate_chunk(rng, products, start, n_rows, category='Wireless'):
+    # Rows start..start + n_rows of a synthetic review dump in the giftsample.csv layout
+    product_index = rng.zipf(1.3, size=n_rows) % len(products)
+    ratings = rng.choice(5, size=n_rows, p=RATING_WEIGHTS) + 1
+    helpful_votes = rng.geometric(0.6, size=n_rows) - 1
+    dates = pd.Timestamp('2015-01-01') + pd.to_timedelta(rng.integers(0, 3 * 365, size=n_rows), unit='D')
+    bodies = _review_texts(rng, ratings)
+
+    chunk = pd.DataFrame({
+        'marketplace': 'US',
+        'customer_id': rng.integers(10 ** 7, 10 ** 8, size=n_rows),
+        'review_id': [f'R{i:013d}' for i in range(start, start + n_rows)],
+        'product_id': products['asin'].to_numpy()[product_index],
+        'product_parent': rng.integers(10 ** 8, 10 ** 9, size=n_rows),
+        'product_title': products['product_title'].to_numpy()[product_index],
+        'product_category': category,
+        'star_rating': ratings,
+        'helpful_votes': helpful_votes,
+        'total_votes': helpful_votes + rng.geometric(0.7, size=n_rows) - 1,
+        'vine': 'N',
+        'verified_purchase': np.where(rng.random(n_rows) < 0.85, 'Y', 'N'),
+        'review_headline': [body.split('.')[0] for body in bodies],
+        'review_body': bodies,
+        'review_date': dates.strftime('%Y-%m-%d'),
+    })
+    return chunk[REVIEW_COLUMNS]
+
+
+def write_reviews(output_file, n_rows, products, seed=42, chunk_size=DEFAULT_CHUNK_SIZE, category='Wireless'):
+    # Written chunk by chunk so 10M-row files never have to fit in memory
+    rng = np.random.default_rng(seed)
+    for start in range(0, n_rows, chunk_size):
+        chunk = generate_chunk(rng, products, start, min(chunk_size, n_rows - start), category)
+        chunk.to_csv(output_file, sep='\t', index=False, mode='w' if start == 0 else 'a', header=start == 0)
+    print(f"Wrote {n_rows} synthetic reviews to {output_file}")
+
+
+def write_format_inputs(review_file, item_file, n_rows, products, seed=42, chunk_size=DEFAULT_CHUNK_SIZE):
+    # Raw review and item files in the layout FormatReviewData.py converts from
+    rng = np.random.default_rng(seed)
+    for start in range(0, n_rows, chunk_size):
+        chunk = generate_chunk(rng, products, start, min(chunk_size, n_rows - start))
+        raw = pd.DataFrame({
+            'asin': chunk['product_id'],
+            'name': chunk['customer_id'].astype(str),
+            'rating': chunk['star_rating'],
+            'date': chunk['review_date'],
+            'verified': chunk['verified_purchase'] == 'Y',
+            'title': chunk['review_headline'],
+            'body': chunk['review_body'],
+            'helpfulVotes': chunk['helpful_votes'],
+        })
+        raw.to_csv(review_file, index=False, mode='w' if start == 0 else 'a', header=start == 0)
+
+    items = products.rename(columns={'product_title': 'title'})
+    items['url'] = 'https://www.amazon.com/dp/' + items['asin']
+    items['rating'] = rng.uniform(1, 5, size=len(items)).round(1)
+    items['reviewUrl'] = 'https://www.amazon.com/product-reviews/' + items['asin']
+    items['totalReviews'] = rng.integers(1, 5000, size=len(items))
+    items.to_csv(item_file, index=False)
+    print(f"Wrote {n_rows} raw reviews to {review_file} and {len(items)} items to {item_file}")
+
+
+def parse_rows(value):
+    # Accepts plain counts or 10k / 1m style suffixes
+    value = value.lower()
+    multiplier = {'k': 10 ** 3, 'm': 10 ** 6}.get(value[-1], 1)
+    return int(float(value[:-1] if multiplier > 1 else value) * multiplier)
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Generate synthetic Amazon-format review files for benchmarking.")
+    parser.add_argument('output_file', help='Review TSV to write')
+    parser.add_argument('--rows', type=parse_rows, default=10000, help='Number of reviews, e.g. 10k, 1m, 10m')
+    parser.add_argument('--seed', type=int, default=42, help='Random seed (default: %(default)s)')
+    parser.add_argument('--asin-master', default=DEFAULT_ASIN_MASTER,
+                        help='Products to draw reviews for (default: %(default)s)')
+    parser.add_argument('--category', default='Wireless', help='product_category value (default: %(default)s)')
+    parser.add_argument('--format-inputs', nargs=2, metavar=('REVIEW_FILE', 'ITEM_FILE'),
+                        help='Also write raw review/item CSVs for FormatReviewData.py')
+    return parser.parse_args()
+
+
+def main():
+    args = parse_args()
+    products = load_products(args.asin_master)
+    write_reviews(args.output_file, args.rows, products, seed=args.seed, category=args.category)
+    if args.format_inputs:
+        write_format_inputs(args.format_inputs[0], args.format_inputs[1], args.rows, products, seed=args.seed)
+
+
+if __name__ == "__main__":
+    main()
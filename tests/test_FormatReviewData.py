@@ -0,0 +1,12 @@
+import pandas as pd
+
+from FormatReviewData import format_dates
+
+
+def test_format_dates_handles_mixed_formats():
+    dates = pd.Series(['2019-10-05', 'October 6, 2019', '10/07/2019', '2019-10-05', 'not a date', None],
+                      dtype='category')
+
+    formatted = format_dates(dates)
+    assert formatted[:5].tolist() == ['2019-10-05', '2019-10-06', '2019-10-07', '2019-10-05', 'not a date']
+    assert pd.isna(formatted[5])
@@ -0,0 +1,29 @@
+import importlib
+import json
+
+from batch_driver import ANALYSES, analysis_options, load_manifest
+from review_io import args_from_options
+
+
+def test_manifest_example_options_are_real_flags(tmp_path):
+    manifest = tmp_path / 'manifest.json'
+    manifest.write_text(json.dumps({'datasets': [{'input': 'wireless.tsv', 'name': 'wireless',
+                                                  'analyses': ['lda', 'gauges'],
+                                                  'options': {'lda': {'max_iter': 20}}}]}))
+    defaults, datasets = load_manifest(manifest)
+
+    module = importlib.import_module(ANALYSES['lda'])
+    parser = module.build_parser()
+    options = analysis_options('lda', parser, datasets[0], defaults, 'reports', False)
+    assert args_from_options(parser, 'wireless.tsv', options).max_iter == 20
+
+
+def test_each_dataset_gets_its_own_gauge_directory():
+    module = importlib.import_module(ANALYSES['gauges'])
+    output_dirs = set()
+    for name in ['wireless', 'gifts']:
+        dataset = {'input': f'{name}.tsv', 'name': name, 'analyses': ['lda', 'gauges']}
+        parser = module.build_parser()
+        options = analysis_options('gauges', parser, dataset, {}, 'reports', False)
+        output_dirs.add(args_from_options(parser, 'results.csv', options).output_dir)
+    assert len(output_dirs) == 2
@@ -0,0 +1,53 @@
+import json
+
+import pytest
+from sklearn.cluster import MiniBatchKMeans
+from sklearn.feature_extraction.text import TfidfVectorizer
+
+import datacleaning
+from datacleaning import assign_in_parallel, load_artifacts, resolve_model_version, save_artifacts
+
+TEXTS = ['great battery long battery', 'battery drains fast', 'sharp bright screen', 'screen cracked easily',
+         'loud clear speaker', 'speaker sound tinny'] * 5
+
+
+def fit():
+    tfidf_model = TfidfVectorizer()
+    km = MiniBatchKMeans(n_clusters=3, random_state=42, n_init=3).fit(tfidf_model.fit_transform(TEXTS))
+    return tfidf_model, km
+
+
+def test_fit_save_load_and_score(tmp_path):
+    tfidf_model, km = fit()
+    names = {0: 'battery', 1: 'screen', 2: 'speaker'}
+    version_dir = save_artifacts(str(tmp_path), tfidf_model, km, names, len(TEXTS))
+
+    assert resolve_model_version(str(tmp_path)) == version_dir
+    metadata, loaded_tfidf, loaded_km, cluster_names, word_vectors = load_artifacts(version_dir)
+    assert metadata['n_reviews'] == len(TEXTS)
+    assert cluster_names == names
+    assert word_vectors is None
+
+    expected = km.predict(tfidf_model.transform(TEXTS))
+    in_process = assign_in_parallel(TEXTS, version_dir, loaded_tfidf, loaded_km, workers=1)
+    # Workers load the models from the version directory instead of receiving them with each chunk
+    in_workers = assign_in_parallel(TEXTS, version_dir, None, None, workers=2, chunk_size=7)
+    assert in_process.tolist() == expected.tolist()
+    assert in_workers.tolist() == expected.tolist()
+
+
+def test_fits_in_the_same_second_get_their_own_version(tmp_path, monkeypatch):
+    monkeypatch.setattr(datacleaning.time, 'strftime', lambda fmt: '20240101-000000')
+    tfidf_model, km = fit()
+    first = save_artifacts(str(tmp_path), tfidf_model, km, {0: 'first'}, 1)
+    second = save_artifacts(str(tmp_path), tfidf_model, km, {0: 'second'}, 2)
+
+    assert first != second
+    with open(f'{first}/cluster_names.json') as f:
+        assert json.load(f) == {'0': 'first'}
+    assert resolve_model_version(str(tmp_path)) == second
+
+
+def test_missing_version_exits(tmp_path):
+    with pytest.raises(SystemExit):
+        resolve_model_version(str(tmp_path), 'nope')
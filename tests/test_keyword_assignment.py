@@ -0,0 +1,61 @@
+import numpy as np
+import pandas as pd
+
+from keyword_assignment import best_keyword_match, keyword_overlap_scores
+from ollama_topic_modeling import assign_topic_to_review, assign_topics
+from openai_aspect_modeling_script import assign_aspect_to_review, assign_aspects
+
+# Nested, overlapping, repeated, empty and regex-special keywords
+TOPICS = [
+    {'name': 'charging', 'keywords': ['charge', 'charger', 'charge', 'arg']},
+    {'name': 'screen', 'keywords': ['screen', 'scr', 'een b']},
+    {'name': 'odd', 'keywords': ['c++', 'a.b', '(x', '']},
+    {'name': 'none', 'keywords': []},
+]
+WORDS = ['charger', 'charge', 'chargers', 'screen', 'screens', 'bright', 'c++', 'a.b', 'axb', '(x', 'good', 'bad',
+         'Charger', 'SCREEN', 'great', 'worst', 'argh']
+
+
+def random_texts(count, seed=0):
+    rng = np.random.default_rng(seed)
+    return pd.Series([' '.join(rng.choice(WORDS, size=rng.integers(0, 8))) for _ in range(count)],
+                     index=rng.permutation(count) + 100)
+
+
+def reference_scores(texts, keyword_lists):
+    return np.array([[sum(1 for keyword in keywords if keyword in text) for keywords in keyword_lists]
+                     for text in texts], dtype=np.int32).reshape(len(texts), len(keyword_lists))
+
+
+def test_scores_match_substring_counts():
+    texts = random_texts(500)
+    keyword_lists = [topic['keywords'] for topic in TOPICS]
+    np.testing.assert_array_equal(keyword_overlap_scores(texts, keyword_lists), reference_scores(texts, keyword_lists))
+
+
+def test_scores_without_keywords():
+    texts = random_texts(5)
+    assert keyword_overlap_scores(texts, [[], []]).shape == (5, 2)
+    assert not keyword_overlap_scores(texts, [[], []]).any()
+    assert best_keyword_match(texts, [])[0].tolist() == [0] * 5
+
+
+def test_assign_topics_matches_per_review_loop():
+    df = pd.DataFrame({'processed_text': random_texts(500, seed=1)})
+    assign_topics(df, TOPICS)
+    assert df['topic'].tolist() == [assign_topic_to_review(text, TOPICS) for text in df['processed_text']]
+
+
+def test_assign_aspects_matches_per_review_loop():
+    df = pd.DataFrame({'processed_text': random_texts(500, seed=2)})
+    aspects = [{'name': 'battery', 'keywords': ['Charge', 'charger'], 'sentiment': 'neutral'},
+               {'name': 'display', 'keywords': ['screen', 'BRIGHT'], 'sentiment': 'positive'},
+               {'name': 'price', 'keywords': ['c++'], 'sentiment': 'negative'}]
+    assign_aspects(df, aspects)
+
+    expected = [assign_aspect_to_review(text, aspects) for text in df['processed_text']]
+    assert df['aspect'].tolist() == [aspect for aspect, _, _ in expected]
+    assert df['sentiment'].tolist() == [sentiment for _, _, sentiment in expected]
+    matched = df['aspect'].ne('phone')
+    assert (df.loc[matched, 'keywords'].tolist()
+            == [', '.join(keywords) for (_, keywords, _), hit in zip(expected, matched) if hit])
@@ -0,0 +1,68 @@
+import numpy as np
+from scipy.sparse import csr_matrix
+from sklearn.decomposition import LatentDirichletAllocation
+
+from lda_topic_modeling import fit_online
+
+
+def make_dtm():
+    rng = np.random.default_rng(0)
+    return csr_matrix(rng.poisson(1.0, size=(60, 30)))
+
+
+def make_lda():
+    return LatentDirichletAllocation(n_components=3, learning_method='online', random_state=42, total_samples=60)
+
+
+def test_fit_online_without_evaluation_skips_perplexity(capsys):
+    lda = fit_online(make_lda(), make_dtm(), max_iter=3, evaluate_every=-1, perp_tol=0.1)
+    assert lda.n_batch_iter_ > 1
+    assert 'perplexity' not in capsys.readouterr().out
+
+
+def test_fit_online_evaluates_and_stops_early(capsys):
+    fit_online(make_lda(), make_dtm(), max_iter=50, evaluate_every=1, perp_tol=1e6)
+    out = capsys.readouterr().out
+    # The second check is within the tolerance of the first, so training stops there
+    assert out.count('perplexity') == 2
+    assert 'stopping early' in out
+
+
+def test_update_keeps_topic_ids_and_names(tmp_path, monkeypatch):
+    import joblib
+    import pandas as pd
+    import lda_topic_modeling
+
+    # Tagging needs the NLTK data; lower-casing is enough to exercise the model update
+    monkeypatch.setattr(lda_topic_modeling, 'preprocess_series',
+                        lambda series, *args, **kwargs: series.str.lower())
+    monkeypatch.chdir(tmp_path)
+    words = ['battery charge power', 'screen display bright', 'camera photo lens', 'sound speaker loud',
+             'price value cheap', 'keyboard keys typing', 'delivery shipping box', 'wifi signal network',
+             'case cover grip', 'software update app']
+
+    def write_reviews(filename, repeat):
+        reviews = [f'{topic} {topic.split()[0]} {i}' for i in range(repeat) for topic in words]
+        pd.DataFrame({'review_body': reviews, 'star_rating': 5, 'product_id': 'P1',
+                      'product_title': 'Phone'}).to_csv(filename, index=False)
+
+    write_reviews('first.csv', 6)
+    write_reviews('new.csv', 2)
+    options = {'no_cache': True, 'no_run_report': True, 'max_iter': 5}
+
+    lda_topic_modeling.model_topics('first.csv', **options)
+    fitted = joblib.load(lda_topic_modeling.DEFAULT_MODEL_PATH)
+    output_filename = lda_topic_modeling.model_topics('new.csv', update=True, **options)
+    updated = joblib.load(lda_topic_modeling.DEFAULT_MODEL_PATH)
+
+    assert updated['topic_names'] == fitted['topic_names']
+    assert list(updated['feature_names']) == list(fitted['feature_names'])
+    assert updated['lda'].components_.shape == fitted['lda'].components_.shape
+    assert updated['n_documents'] == fitted['n_documents'] + 20
+
+    results = pd.read_csv(output_filename)
+    assert len(results) == 20
+    # The update refines the topics it has rather than renumbering them
+    before = fitted['lda'].transform(fitted['vectorizer'].transform(results['review_body'].str.lower()))
+    assert results['topic'].tolist() == before.argmax(axis=1).tolist()
+    assert (results['topic_name'] == results['topic'].map(fitted['topic_names'])).all()
@@ -0,0 +1,157 @@
+import asyncio
+import json
+
+import pytest
+from aiohttp import web
+from aiohttp.test_utils import TestServer
+
+import llm_rate_limiting
+from ollama_client import AsyncOllamaClient, IncrementalJSONParser, OllamaError
+
+
+@pytest.fixture(autouse=True)
+def no_backoff(monkeypatch):
+    monkeypatch.setattr(llm_rate_limiting, 'backoff_delay', lambda *args: 0)
+
+
+class StubOllama:
+    # /api/generate answering with queued (status, tokens, delay) replies, streamed as Ollama does
+    def __init__(self, replies=None, default=(200, ['{"topics": []}'], 0)):
+        self.replies = list(replies or [])
+        self.default = default
+        self.requests = []
+        self.in_flight = 0
+        self.max_in_flight = 0
+
+    async def generate(self, request):
+        self.requests.append(await request.json())
+        status, tokens, delay = self.replies.pop(0) if self.replies else self.default
+        self.in_flight += 1
+        self.max_in_flight = max(self.max_in_flight, self.in_flight)
+        try:
+            await asyncio.sleep(delay)
+            if status != 200:
+                return web.Response(status=status, text='overloaded')
+            response = web.StreamResponse()
+            await response.prepare(request)
+            for token in tokens:
+                await response.write(json.dumps({'response': token, 'done': False}).encode() + b'\n')
+            await response.write(json.dumps({'response': '', 'done': True}).encode() + b'\n')
+            return response
+        finally:
+            self.in_flight -= 1
+
+
+def run_with_stub(stub, use_client, **client_options):
+    async def main():
+        app = web.Application()
+        app.router.add_post('/api/generate', stub.generate)
+        async with TestServer(app) as server:
+            async with AsyncOllamaClient(str(server.make_url('')), **client_options) as client:
+                return await use_client(client)
+    return asyncio.run(main())
+
+
+def test_parser_finds_object_split_across_tokens():
+    parser = IncrementalJSONParser()
+    assert parser.feed('Here you go: {"name": "a {brace}", ') is None
+    assert parser.feed('"nested": {"x": "\\"}"}') is None
+    assert parser.feed('} and some trailing text') == {'name': 'a {brace}', 'nested': {'x': '"}'}}
+
+
+def test_generate_json_parses_streamed_response():
+    stub = StubOllama([(200, ['Sure! {"topics": [{"name": "Bat', 'tery"}]}', ' Anything else?'], 0)])
+    result = run_with_stub(stub, lambda client: client.generate_json('prompt'))
+
+    assert result == {'topics': [{'name': 'Battery'}]}
+    assert stub.requests[0]['prompt'] == 'prompt'
+    assert stub.requests[0]['stream'] is True
+
+
+def test_unparsable_response_is_not_retried():
+    stub = StubOllama([(200, ['no json here'], 0)])
+    with pytest.raises(ValueError):
+        run_with_stub(stub, lambda client: client.generate_json('prompt'))
+    assert len(stub.requests) == 1
+
+
+def test_server_errors_are_retried():
+    stub = StubOllama([(503, [], 0), (500, [], 0), (200, ['{"topics": ["ok"]}'], 0)])
+    result = run_with_stub(stub, lambda client: client.generate_json('prompt'), max_retries=3)
+
+    assert result == {'topics': ['ok']}
+    assert len(stub.requests) == 3
+
+
+def test_gives_up_after_max_retries():
+    stub = StubOllama(default=(500, [], 0))
+    with pytest.raises(OllamaError) as error:
+        run_with_stub(stub, lambda client: client.generate_json('prompt'), max_retries=2)
+    assert error.value.status == 500
+    assert len(stub.requests) == 3
+
+
+def test_client_errors_are_not_retried():
+    stub = StubOllama([(404, [], 0)])
+    with pytest.raises(OllamaError):
+        run_with_stub(stub, lambda client: client.generate_json('prompt'), max_retries=3)
+    assert len(stub.requests) == 1
+
+
+def test_timeouts_are_retried():
+    stub = StubOllama([(200, ['{"topics": []}'], 2)], default=(200, ['{"topics": ["ok"]}'], 0))
+    result = run_with_stub(stub, lambda client: client.generate_json('prompt'), timeout=0.5, max_retries=1)
+
+    assert result == {'topics': ['ok']}
+    assert len(stub.requests) == 2
+
+
+def test_generate_json_many_limits_concurrency():
+    stub = StubOllama(default=(200, ['{"topics": []}'], 0.1))
+    results = run_with_stub(stub, lambda client: client.generate_json_many([f'prompt {i}' for i in range(8)], 2))
+
+    assert results == [{'topics': []}] * 8
+    assert stub.max_in_flight == 2
+
+
+def test_connection_pool_limits_concurrency():
+    stub = StubOllama(default=(200, ['{"topics": []}'], 0.1))
+    results = run_with_stub(stub, lambda client: client.generate_json_many([f'prompt {i}' for i in range(8)], 8),
+                            max_connections=3)
+
+    assert len(results) == 8
+    assert stub.max_in_flight == 3
+
+
+def test_generate_json_many_returns_failures_in_place():
+    stub = StubOllama([(200, ['{"topics": ["first"]}'], 0), (404, [], 0)])
+
+    async def use_client(client):
+        # Sequential, so the queued replies are matched to the prompts in order
+        return await client.generate_json_many(['first', 'second'], 1)
+
+    first, second = run_with_stub(stub, use_client)
+    assert first == {'topics': ['first']}
+    assert isinstance(second, OllamaError)
+
+
+def test_cache_keeps_only_accepted_responses(tmp_path):
+    from llm_cache import LLMCache
+    from ollama_topic_modeling import has_topics
+
+    stub = StubOllama([(200, ['{"answer": "no topics"}'], 0), (200, ['{"topics": ["ok"]}'], 0)])
+    cache = LLMCache(str(tmp_path / 'llm_cache.sqlite3'))
+
+    async def use_client(client):
+        client.cache = cache
+        first = await client.generate_json('prompt', accept=has_topics)
+        second = await client.generate_json('prompt', accept=has_topics)
+        third = await client.generate_json('prompt', accept=has_topics)
+        return first, second, third
+
+    try:
+        assert run_with_stub(stub, use_client) == ({'answer': 'no topics'}, {'topics': ['ok']}, {'topics': ['ok']})
+        # The response without topics was asked for again; the one with topics came from the cache
+        assert len(stub.requests) == 2
+    finally:
+        cache.close()
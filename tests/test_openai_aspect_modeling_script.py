@@ -0,0 +1,171 @@
+import json
+
+import pandas as pd
+import pytest
+
+from openai_aspect_modeling_script import PROMPT_SAMPLE_SIZE, build_aspect_prompt, parse_args, partition_reviews
+
+
+def test_batch_size_is_capped_at_prompt_sample_size(capsys):
+    assert parse_args(['reviews.tsv', '--batch-size', str(PROMPT_SAMPLE_SIZE)]).batch_size == PROMPT_SAMPLE_SIZE
+    for batch_size in [PROMPT_SAMPLE_SIZE + 1, 0]:
+        with pytest.raises(SystemExit) as error:
+            parse_args(['reviews.tsv', '--batch-mode', 'fixed', '--batch-size', str(batch_size)])
+        assert error.value.code == 2
+    assert '--batch-size must be between' in capsys.readouterr().err
+
+
+@pytest.mark.parametrize('batch_mode', ['fixed', 'product'])
+def test_every_review_of_a_batch_is_in_its_prompt(batch_mode):
+    df = pd.DataFrame({'processed_text': [f'review{i:04d}' for i in range(250)],
+                       'product_id': [f'P{i % 3}' for i in range(250)]})
+    batches = partition_reviews(df, batch_mode, parse_args(['reviews.tsv']).batch_size)
+
+    prompted = set()
+    for batch in batches:
+        prompt = build_aspect_prompt(batch)
+        prompted.update(review for review in batch if review in prompt)
+    assert prompted == set(df['processed_text'])
+
+
+def test_replay_needs_no_api_key(tmp_path, monkeypatch):
+    from llm_cache import LLMCache
+    from openai_aspect_modeling_script import OPENAI_MODEL, OPENAI_TEMPERATURE, get_aspects_from_openai_batched
+
+    monkeypatch.delenv('OPENAI_API_KEY', raising=False)
+    df = pd.DataFrame({'processed_text': [f'battery review {i}' for i in range(6)], 'product_id': ['P1'] * 6})
+    answer = json.dumps({'aspects': [{'name': 'battery', 'keywords': ['battery'], 'sentiment': 'positive'}]})
+    path = str(tmp_path / 'llm_cache.sqlite3')
+    recorder = LLMCache(path)
+    for batch in partition_reviews(df, 'fixed', 3):
+        recorder.put('openai', OPENAI_MODEL, OPENAI_TEMPERATURE, build_aspect_prompt(batch), answer)
+    recorder.close()
+
+    cache = LLMCache(path, replay=True)
+    try:
+        assert get_aspects_from_openai_batched(df, 'fixed', 3, cache=cache) == json.loads(answer)['aspects']
+        # A prompt that was never recorded fails on its own, without trying to reach OpenAI
+        assert get_aspects_from_openai_batched(df, 'fixed', 2, cache=cache) == []
+    finally:
+        cache.close()
+    # Without the cache the client cannot be created, which fails the batches instead of the run
+    assert get_aspects_from_openai_batched(df, 'fixed', 3) == []
+
+
+class StubOpenAI:
+    # /v1/chat/completions in a background thread, answering each prompt with answer(prompt) after the queued
+    # error statuses have been returned
+    def __init__(self, answer, errors=()):
+        self.answer = answer
+        self.errors = list(errors)
+        self.requests = []
+
+    async def completions(self, request):
+        import time
+        from aiohttp import web
+
+        prompt = (await request.json())['messages'][-1]['content']
+        self.requests.append((time.monotonic(), prompt))
+        if self.errors:
+            return web.json_response({'error': {'message': 'slow down', 'type': 'rate_limit'}},
+                                     status=self.errors.pop(0), headers={'Retry-After': '0'})
+        return web.json_response({
+            'id': 'chatcmpl-stub', 'object': 'chat.completion', 'created': 0, 'model': 'stub',
+            'choices': [{'index': 0, 'finish_reason': 'stop',
+                         'message': {'role': 'assistant', 'content': json.dumps(self.answer(prompt))}}],
+        })
+
+
+@pytest.fixture
+def openai_stub(monkeypatch):
+    import asyncio
+    import threading
+    from aiohttp import web
+
+    import llm_rate_limiting
+
+    monkeypatch.setenv('OPENAI_API_KEY', 'test')
+    monkeypatch.setattr(llm_rate_limiting, 'backoff_delay', lambda *args: 0)
+    loop = asyncio.new_event_loop()
+    thread = threading.Thread(target=loop.run_forever, daemon=True)
+    thread.start()
+    runners = []
+
+    def start(stub):
+        async def serve():
+            app = web.Application()
+            app.router.add_post('/v1/chat/completions', stub.completions)
+            runner = web.AppRunner(app)
+            await runner.setup()
+            await web.TCPSite(runner, '127.0.0.1', 0).start()
+            runners.append(runner)
+            host, port = runner.addresses[0][:2]
+            return f'http://{host}:{port}/v1'
+        return asyncio.run_coroutine_threadsafe(serve(), loop).result()
+
+    yield start
+    for runner in runners:
+        asyncio.run_coroutine_threadsafe(runner.cleanup(), loop).result()
+    loop.call_soon_threadsafe(loop.stop)
+    thread.join()
+
+
+def battery_answer(prompt):
+    # Battery reviews are praised, camera reviews add a negative camera aspect and a battery complaint
+    if 'camera review' in prompt:
+        return {'aspects': [{'name': 'camera', 'keywords': ['blurry', 'lens'], 'sentiment': 'negative'},
+                            {'name': 'battery', 'keywords': ['drain', 'charge'], 'sentiment': 'negative'}]}
+    return {'aspects': [{'name': 'Battery', 'keywords': ['charge', 'Lasts'], 'sentiment': 'positive'},
+                        {'name': 'other', 'keywords': ['x'], 'sentiment': 'positive'}]}
+
+
+def review_frame():
+    texts = [f'battery review {i}' for i in range(6)] + [f'camera review {i}' for i in range(2)]
+    return pd.DataFrame({'processed_text': texts, 'product_id': ['P1'] * 6 + ['P2'] * 2})
+
+
+def test_batched_aspects_are_merged(openai_stub):
+    from openai_aspect_modeling_script import get_aspects_from_openai_batched
+
+    stub = StubOpenAI(battery_answer)
+    aspects = get_aspects_from_openai_batched(review_frame(), 'product', 3, concurrency=4,
+                                              base_url=openai_stub(stub))
+
+    assert len(stub.requests) == 3
+    # Keywords are counted across batches; the sentiment vote is weighted by each batch's review count
+    assert aspects == [{'name': 'camera', 'keywords': ['blurry', 'lens'], 'sentiment': 'negative'},
+                       {'name': 'battery', 'keywords': ['charge', 'lasts', 'drain'], 'sentiment': 'positive'}]
+
+
+def test_rate_limited_requests_are_retried(openai_stub):
+    from openai_aspect_modeling_script import get_aspects_from_openai_batched
+
+    stub = StubOpenAI(battery_answer, errors=[429, 429, 500])
+    aspects = get_aspects_from_openai_batched(review_frame().head(3), 'fixed', 3, concurrency=1, max_retries=3,
+                                              base_url=openai_stub(stub))
+
+    assert len(stub.requests) == 4
+    assert [aspect['name'] for aspect in aspects] == ['battery']
+
+
+def test_requests_follow_the_rate_limit(openai_stub):
+    from openai_aspect_modeling_script import get_aspects_from_openai_batched
+
+    stub = StubOpenAI(battery_answer)
+    get_aspects_from_openai_batched(review_frame(), 'fixed', 2, concurrency=1, requests_per_minute=300,
+                                    base_url=openai_stub(stub))
+
+    # 300 a minute with a single token in the bucket is one request every 0.2 seconds
+    times = sorted(received for received, _ in stub.requests)
+    assert len(times) == 4
+    assert min(later - earlier for earlier, later in zip(times, times[1:])) > 0.15
+
+
+def test_sample_mode_uses_the_base_url(openai_stub):
+    from openai_aspect_modeling_script import get_aspects_from_openai
+
+    stub = StubOpenAI(battery_answer)
+    aspects = get_aspects_from_openai(['battery review'], base_url=openai_stub(stub))
+
+    assert len(stub.requests) == 1
+    assert aspects[0]['name'] == 'Battery'
@@ -0,0 +1,37 @@
+import subprocess
+import sys
+import time
+
+import pytest
+
+from pipeline_metrics import RssSampler, RunMetrics
+
+pytestmark = pytest.mark.skipif(not RssSampler.available(), reason='RSS sampling needs /proc')
+
+
+def test_stage_peaks_are_per_stage():
+    metrics = RunMetrics('test', save_report=False)
+    with metrics.stage('large'):
+        block = b'x' * (200 * 1024 ** 2)
+        time.sleep(0.2)
+        del block
+    with metrics.stage('small'):
+        time.sleep(0.2)
+
+    large, small = metrics.stages
+    assert large['peak_rss_mb'] - small['peak_rss_mb'] > 150
+    # The run's high-water mark still includes the earlier stage
+    assert small['cumulative_peak_rss_mb'] >= large['peak_rss_mb'] - 1
+
+
+def test_worker_peak_is_sampled():
+    metrics = RunMetrics('test', save_report=False)
+    with metrics.stage('workers'):
+        subprocess.run([sys.executable, '-c', 'import time; block = b"x" * (100 * 1024 ** 2); time.sleep(0.5)'],
+                       check=True)
+    with metrics.stage('no_workers'):
+        pass
+
+    workers, no_workers = metrics.stages
+    assert workers['worker_peak_rss_mb'] > 90
+    assert no_workers['worker_peak_rss_mb'] == 0
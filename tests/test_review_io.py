@@ -0,0 +1,37 @@
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+import pytest
+from pyarrow import feather
+
+from review_io import ResultWriter
+
+COLUMNS = ['review_body', 'product_id', 'product_title', 'topic', 'topic_name']
+
+
+def chunks():
+    yield pd.DataFrame({'review_body': ['good', 'bad'], 'product_id': ['P1', 'P2'], 'product_title': ['One', 'Two'],
+                        'topic': [0, 1], 'topic_name': ['battery', None]})
+    # Categorical columns with other categories, and a product only the second chunk has
+    yield pd.DataFrame({'review_body': ['fine'], 'product_id': pd.Categorical(['P3']),
+                        'product_title': pd.Categorical(['Three', 'Two'])[:1], 'topic': [1],
+                        'topic_name': pd.Categorical(['screen'])})
+
+
+@pytest.mark.parametrize('extension', ['parquet', 'arrow'])
+def test_streamed_columns_are_dictionary_encoded(tmp_path, extension):
+    path = str(tmp_path / f'results.{extension}')
+    with ResultWriter(path, COLUMNS) as writer:
+        for chunk in chunks():
+            writer.write(chunk)
+
+    schema = pq.read_schema(path) if extension == 'parquet' else feather.read_table(path).schema
+    for column in ['product_id', 'product_title', 'topic_name']:
+        assert pa.types.is_dictionary(schema.field(column).type), column
+    assert not pa.types.is_dictionary(schema.field('review_body').type)
+
+    df = pd.read_parquet(path) if extension == 'parquet' else feather.read_feather(path)
+    assert df['product_id'].astype(str).tolist() == ['P1', 'P2', 'P3']
+    assert df['product_title'].astype(str).tolist() == ['One', 'Two', 'Three']
+    assert df['topic_name'].isna().tolist() == [False, True, False]
+    assert df['topic'].tolist() == [0, 1, 1]
@@ -0,0 +1,33 @@
+import argparse
+from contextlib import nullcontext
+
+from preprocessing_cache import DEFAULT_CACHE_PATH, DEFAULT_MAX_MB, PreprocessingCache
+from text_preprocessing import add_preprocessing_arguments, open_cache
+
+
+def make_parser():
+    parser = argparse.ArgumentParser()
+    add_preprocessing_arguments(parser)
+    return parser
+
+
+def test_cache_flag_defaults():
+    args = make_parser().parse_args([])
+    assert args.cache_path == DEFAULT_CACHE_PATH
+    assert args.cache_max_mb == DEFAULT_MAX_MB
+    assert not args.no_cache
+
+
+def test_open_cache_opens_and_closes(tmp_path):
+    path = tmp_path / 'cache.sqlite3'
+    args = make_parser().parse_args(['--cache-path', str(path), '--cache-max-mb', '1'])
+    with open_cache(args) as cache:
+        assert isinstance(cache, PreprocessingCache)
+        cache.put_many([('key', 'value')])
+        assert cache.get_many(['key']) == {'key': 'value'}
+    assert path.exists()
+
+
+def test_no_cache():
+    args = make_parser().parse_args(['--no-cache'])
+    assert isinstance(open_cache(args), nullcontext)
@@ -0,0 +1,31 @@
+from vectorization import HashedTermIndex, make_hashing_vectorizer
+
+
+def test_streamed_index_is_bounded_and_keeps_frequent_terms():
+    vectorizer = make_hashing_vectorizer(n_features=16)
+    term_index = HashedTermIndex(vectorizer, terms_per_feature=2)
+
+    # Many chunks of one-off terms, as a long stream would bring, with a frequent term arriving only late
+    for chunk in range(50):
+        term_index.update([f'rare{chunk}x{i} battery' for i in range(20)])
+    for chunk in range(5):
+        term_index.update(['zoom lens zoom'] * 100)
+
+    assert all(len(terms) <= 2 for terms in term_index.features.values())
+    assert sum(len(terms) for terms in term_index.features.values()) <= 16 * 2
+
+    names = term_index.feature_names()
+    for term in ['battery', 'zoom', 'lens']:
+        assert names[vectorizer.transform([term]).indices[0]] == term
+
+
+def test_parallel_transform_matches_serial():
+    texts = [f'battery life {i} screen' if i % 3 else 'zoom lens' for i in range(40)]
+    serial = HashedTermIndex(make_hashing_vectorizer(n_features=64, norm=None))
+    parallel = HashedTermIndex(make_hashing_vectorizer(n_features=64, norm=None))
+
+    expected = serial.transform(texts, workers=1)
+    matrix = parallel.transform(texts, workers=2, chunk_size=15)
+
+    assert (matrix != expected).nnz == 0
+    assert list(parallel.feature_names()) == list(serial.feature_names())
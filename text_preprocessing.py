@@ -0,0 +1,146 @@
+import multiprocessing
+from contextlib import nullcontext
+from functools import partial
+
+import pandas as pd
+from preprocessing_cache import DEFAULT_CACHE_PATH, DEFAULT_MAX_MB, PreprocessingCache, cache_key
+
+# Preprocessing modes shared by the analysis scripts
+ADJECTIVES = 'adjectives'
+ADJECTIVES_AND_NOUNS = 'adjectives_and_nouns'
+
+DEFAULT_CHUNK_SIZE = 2000
+
+# Bump whenever the tokenize/tag/filter/lemmatize logic changes so cached results are not reused
+PREPROCESSING_VERSION = 1
+
+# NLTK data the tokenizer, tagger, lemmatizer and stop word filter need, by nltk.data path
+NLTK_RESOURCES = {
+    'punkt': 'tokenizers/punkt',
+    'averaged_perceptron_tagger': 'taggers/averaged_perceptron_tagger',
+    'wordnet': 'corpora/wordnet',
+    'stopwords': 'corpora/stopwords',
+}
+
+# Per-process state, built once in each worker (or lazily in the parent)
+_lemmatizer = None
+_stop_words = None
+_tagger = None
+_nltk_checked = False
+
+
+def ensure_nltk_resources():
+    # Only download what is missing, and only check once per process
+    global _nltk_checked
+    if _nltk_checked:
+        return
+    import nltk
+    for resource, path in NLTK_RESOURCES.items():
+        try:
+            nltk.data.find(path)
+        except LookupError:
+            nltk.download(resource, quiet=True)
+    _nltk_checked = True
+
+
+def _init_worker():
+    global _lemmatizer, _stop_words, _tagger
+    ensure_nltk_resources()
+    from nltk.corpus import stopwords
+    from nltk.stem import WordNetLemmatizer
+    from nltk.tag import PerceptronTagger
+    _lemmatizer = WordNetLemmatizer()
+    _stop_words = set(stopwords.words('english'))
+    # nltk.pos_tag_sents unpickles a new tagger on every call; keep one per process instead
+    _tagger = PerceptronTagger()
+
+
+def warm_up():
+    # Load the tagger, lemmatizer and tokenizer now, so a long-lived process pays for them only once
+    preprocess_batch(['Warming up the tagger.'])
+
+
+def _keep_word(word, tag, mode):
+    if mode == ADJECTIVES:
+        return tag.startswith('JJ')
+    return (tag.startswith('JJ') or tag.startswith('NN')) and word not in _stop_words
+
+
+def preprocess_batch(texts, mode=ADJECTIVES_AND_NOUNS):
+    import nltk
+    if _lemmatizer is None:
+        _init_worker()
+
+    # Tokenize every review, then tag them with this process's tagger
+    tokenized = [nltk.word_tokenize(str(text).lower()) if not pd.isna(text) else [] for text in texts]
+    tagged_reviews = [_tagger.tag(tokens) for tokens in tokenized]
+
+    return [' '.join(_lemmatizer.lemmatize(word) for word, tag in tagged_words if _keep_word(word, tag, mode))
+            for tagged_words in tagged_reviews]
+
+
+def _chunks(items, chunk_size):
+    for start in range(0, len(items), chunk_size):
+        yield items[start:start + chunk_size]
+
+
+def _preprocess_texts(texts, mode, workers, chunk_size):
+    workers = workers or multiprocessing.cpu_count()
+
+    # Small inputs are not worth the cost of starting a pool
+    if workers == 1 or len(texts) <= chunk_size:
+        results = preprocess_batch(texts, mode)
+    else:
+        # Check the NLTK data in the parent so the workers don't all race to download it
+        ensure_nltk_resources()
+        results = []
+        with multiprocessing.Pool(workers, initializer=_init_worker) as pool:
+            for processed in pool.imap(partial(preprocess_batch, mode=mode), _chunks(texts, chunk_size)):
+                results.extend(processed)
+    return results
+
+
+def _preprocess_texts_cached(texts, mode, workers, chunk_size, cache):
+    config = f"{mode}:{PREPROCESSING_VERSION}"
+    keys = [cache_key(text, config) if not pd.isna(text) else None for text in texts]
+    found = cache.get_many(list({key for key in keys if key is not None}))
+
+    # Only tag reviews we have not seen before, once per distinct text
+    missing = {}
+    for key, text in zip(keys, texts):
+        if key is not None and key not in found and key not in missing:
+            missing[key] = text
+    if missing:
+        processed = _preprocess_texts(list(missing.values()), mode, workers, chunk_size)
+        new_items = dict(zip(missing.keys(), processed))
+        cache.put_many(new_items.items())
+        found.update(new_items)
+
+    return [found[key] if key is not None else "" for key in keys]
+
+
+def preprocess_series(series, mode=ADJECTIVES_AND_NOUNS, workers=None, chunk_size=DEFAULT_CHUNK_SIZE, cache=None):
+    texts = series.tolist()
+    if cache is None:
+        results = _preprocess_texts(texts, mode, workers, chunk_size)
+    else:
+        results = _preprocess_texts_cached(texts, mode, workers, chunk_size, cache)
+    return pd.Series(results, index=series.index, dtype=object)
+
+
+def open_cache(args):
+    if args.no_cache:
+        return nullcontext()
+    return PreprocessingCache(args.cache_path, max_mb=args.cache_max_mb)
+
+
+def add_preprocessing_arguments(parser):
+    parser.add_argument('--workers', type=int, default=None,
+                        help='Number of preprocessing processes (default: number of CPUs)')
+    parser.add_argument('--chunk-size', type=int, default=DEFAULT_CHUNK_SIZE,
+                        help='Number of reviews tagged per batch (default: %(default)s)')
+    parser.add_argument('--cache-path', default=DEFAULT_CACHE_PATH,
+                        help='SQLite file caching preprocessed reviews (default: %(default)s)')
+    parser.add_argument('--cache-max-mb', type=float, default=DEFAULT_MAX_MB,
+                        help='Evict least recently used entries above this size (default: %(default)s)')
+    parser.add_argument('--no-cache', action='store_true', help="Don't read or write the preprocessing cache")
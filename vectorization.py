@@ -0,0 +1,92 @@
+import multiprocessing
+from collections import Counter
+from functools import partial
+
+import numpy as np
+
+DEFAULT_N_FEATURES = 2 ** 16
+VECTORIZERS = ['vocabulary', 'hashing']
+TRANSFORM_CHUNK_SIZE = 50000
+TERMS_PER_FEATURE = 4
+
+
+def make_hashing_vectorizer(n_features=DEFAULT_N_FEATURES, norm='l2', dtype=np.float64):
+    from sklearn.feature_extraction.text import HashingVectorizer
+    return HashingVectorizer(n_features=n_features, alternate_sign=False, norm=norm, stop_words='english',
+                             dtype=dtype)
+
+
+def matrix_dtype(args):
+    return np.float32 if args.float32 else np.float64
+
+
+def _transform_and_index(vectorizer, terms_per_feature, texts):
+    term_index = HashedTermIndex(vectorizer, terms_per_feature)
+    term_index.update(texts)
+    return vectorizer.transform(texts), term_index.features
+
+
+class HashedTermIndex:
+    # HashingVectorizer keeps no vocabulary, so remember the most frequent terms of each feature to label it
+    # afterwards. Only a few terms are kept per feature, so the index stays bounded however long the stream is
+    def __init__(self, vectorizer, terms_per_feature=TERMS_PER_FEATURE):
+        self.vectorizer = vectorizer
+        self.analyzer = vectorizer.build_analyzer()
+        self.terms_per_feature = terms_per_feature
+        self.features = {}
+
+    def update(self, texts):
+        counts = Counter()
+        for text in texts:
+            counts.update(self.analyzer(text))
+        if not counts:
+            return
+        terms = list(counts)
+        matrix = self.vectorizer.transform(terms).tocsr()
+        for row, term in enumerate(terms):
+            for column in matrix.indices[matrix.indptr[row]:matrix.indptr[row + 1]]:
+                self._add(int(column), term, counts[term])
+
+    def transform(self, texts, workers=None, chunk_size=TRANSFORM_CHUNK_SIZE):
+        # Hash the texts and index their terms in one pass. A stateless vectorizer can transform chunks
+        # independently, so each process tokenizes its own chunk and only the bounded indexes are merged here
+        texts = list(texts)
+        chunks = [texts[start:start + chunk_size] for start in range(0, len(texts), chunk_size)]
+        workers = min(workers or multiprocessing.cpu_count(), len(chunks))
+        if workers <= 1:
+            self.update(texts)
+            return self.vectorizer.transform(texts)
+        import scipy.sparse as sp
+        with multiprocessing.Pool(workers) as pool:
+            results = pool.map(partial(_transform_and_index, self.vectorizer, self.terms_per_feature), chunks)
+        for _, features in results:
+            for column, terms in features.items():
+                for term, count in terms.items():
+                    self._add(column, term, count)
+        return sp.vstack([matrix for matrix, _ in results], format='csr')
+
+    def _add(self, column, term, count):
+        terms = self.features.setdefault(column, {})
+        if term in terms or len(terms) < self.terms_per_feature:
+            terms[term] = terms.get(term, 0) + count
+            return
+        # Space-saving: a new term takes over the rarest slot and inherits its count, so a frequent term that
+        # first turns up late in the stream still reaches the top
+        rarest = min(terms, key=terms.get)
+        terms[term] = terms.pop(rarest) + count
+
+    def feature_names(self):
+        names = np.full(self.vectorizer.n_features, '', dtype=object)
+        for column, terms in self.features.items():
+            names[column] = max(terms, key=terms.get)
+        return names
+
+
+def add_vectorizer_arguments(parser):
+    parser.add_argument('--vectorizer', choices=VECTORIZERS, default='vocabulary',
+                        help='Learn a vocabulary, or hash terms into a fixed number of features with no vocabulary '
+                             'kept in memory (default: %(default)s)')
+    parser.add_argument('--n-features', type=int, default=DEFAULT_N_FEATURES,
+                        help='Number of hashed features for --vectorizer hashing (default: %(default)s)')
+    parser.add_argument('--float32', action='store_true',
+                        help='Build the document-term matrix in single precision to halve its size')